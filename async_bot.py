@@ -0,0 +1,703 @@
+"""
+Асинхронный режим бота на AsyncTeleBot.
+
+Запросы к Telegram выполняются в одном цикле событий без отдельного потока на каждый запрос,
+а SQLite работает в выделенном пуле потоков (utils.async_database).
+Запуск: python async_bot.py или RUNTIME=async python bot.py.
+"""
+# Отсчёт времени запуска начинается до импорта telebot и модулей бота
+from utils import startup
+import asyncio
+import functools
+import io
+import logging
+import threading
+import time
+import weakref
+from telebot import asyncio_helper, types, util
+from telebot.async_telebot import AsyncTeleBot
+from telebot.asyncio_helper import ApiTelegramException
+from utils import async_database as db
+from utils import metrics
+from utils.broadcast import AsyncBroadcaster
+from utils.callbacks import (
+    CallbackRouter, ANSWER, HINT, ADMIN, DELETE_QUESTION, ADD_QUESTION, QUESTIONS_PAGE, USERS_PAGE,
+    START_QUIZ, BROADCAST_CANCEL, PAGE_BEFORE, ADMIN_ACTIONS, new_nonce, is_stale_nonce
+)
+from utils.config import (
+    BOT_TOKEN, API_CONNECTIONS, is_admin,
+    API_GLOBAL_RATE, API_CHAT_RATE, API_CHAT_BURST, API_MAX_RETRIES,
+    SESSION_STORE, SESSION_TTL, SESSION_FLUSH_INTERVAL,
+    UPDATES_MODE, WEBHOOK_URL, WEBHOOK_HOST, WEBHOOK_PORT, WEBHOOK_PATH, WEBHOOK_SECRET, WEBHOOK_QUEUE_SIZE,
+    METRICS_PORT, METRICS_FILE, METRICS_DUMP_INTERVAL, PREWARM, SHUFFLE_QUESTIONS, SHUFFLE_OPTIONS,
+    BROADCAST_RATE, BROADCAST_WORKERS, BROADCAST_CHUNK
+)
+from utils.images import is_file_id_rejected, prepare_image, prepared_image
+from utils.keyboards import (
+    ADMIN_PAGE_SIZE, generate_admin_menu, questions_keyboard, users_keyboard, back_keyboard, quizzes_keyboard,
+    broadcast_keyboard
+)
+from utils.log import setup_logging, log_action
+from utils.messages import messages, format_time, format_tops, format_page, quiz_header, format_broadcast
+from utils.ordering import (
+    QuestionOrder, order_from_session, order_to_session, first_question_id, question_number
+)
+from utils.outbound import AsyncRateLimitedBot, OutboundScheduler
+from utils.pagination import make_page
+from utils.payloads import question_payload
+from utils.question_io import detect_format, import_questions, get_or_create_quiz
+from utils.quizzes import DEFAULT_QUIZ_ID
+from utils.sessions import create_session_store, quiz_key, admin_key
+from utils.storage import get_storage
+
+# Одновременных соединений с Telegram API может быть намного больше, чем потоков в синхронном режиме
+asyncio_helper.REQUEST_LIMIT = API_CONNECTIONS
+
+bot = AsyncTeleBot(BOT_TOKEN)
+
+# Запросы к Telegram из обработчиков идут через планировщик с лимитами API и повторами после 429
+api = AsyncRateLimitedBot(bot, OutboundScheduler(
+    global_rate=API_GLOBAL_RATE, global_burst=int(API_GLOBAL_RATE),
+    chat_rate=API_CHAT_RATE, chat_burst=API_CHAT_BURST, max_retries=API_MAX_RETRIES,
+    # Рассылка занимает не больше BROADCAST_RATE сообщений в секунду, остальное остаётся квизу
+    low_rate=BROADCAST_RATE,
+))
+
+# Сессии (начатый квиз, состояние админ-диалога) переживают перезапуск бота
+sessions = create_session_store(SESSION_STORE, SESSION_TTL, SESSION_FLUSH_INTERVAL)
+
+# Нажатия кнопок: callback_data разбирается один раз и направляется в обработчик по коду действия
+callbacks = CallbackRouter()
+
+async def notify_broadcast_finished(broadcast):
+    if broadcast.created_by:
+        await api.send_message(int(broadcast.created_by), format_broadcast(broadcast))
+
+# Рассылки идут отдельными задачами с низким приоритетом отправки
+broadcaster = AsyncBroadcaster(db, api.background("send_message"), workers=BROADCAST_WORKERS,
+                               chunk_size=BROADCAST_CHUNK, on_finish=notify_broadcast_finished)
+
+# Блокировки пользователей: обновления одного пользователя обрабатываются по очереди
+_user_locks: "weakref.WeakValueDictionary[int, asyncio.Lock]" = weakref.WeakValueDictionary()
+
+def per_user(handler):
+    """
+    Не даёт обработчикам одного пользователя выполняться одновременно.
+    """
+    @functools.wraps(handler)
+    async def wrapper(update, *args):
+        user_id = update.from_user.id
+        lock = _user_locks.get(user_id)
+        if lock is None:
+            lock = asyncio.Lock()
+            _user_locks[user_id] = lock
+        async with lock:
+            return await handler(update, *args)
+    return wrapper
+
+async def is_stale(user_id, nonce):
+    """
+    Проверяет, что кнопка вопроса отправлена в прошлом прохождении квиза.
+    """
+    return nonce is not None and is_stale_nonce(await sessions.aget(quiz_key(user_id)), nonce)
+
+def admin_state(state):
+    """
+    Фильтр сообщений администратора, у которого админ-диалог в состоянии state.
+    Состояние читается без блокировки цикла событий.
+    """
+    async def check(message):
+        return is_admin(message.from_user.id) and await sessions.aget(admin_key(message.from_user.id)) == state
+    return check
+
+async def command_quiz(message):
+    """
+    Квиз, к которому относится команда: указанный после неё slug, квиз текущего прохождения
+    или основной квиз. Если квиза с указанным slug нет, сообщает об этом.
+
+    :return: Квиз, или None.
+    """
+    slug = util.extract_arguments(message.text or "")
+    if slug:
+        quiz = db.get_quiz_by_slug(slug)
+        if quiz is None:
+            await send_unknown_quiz(message.chat.id, slug)
+        return quiz
+    session = await sessions.aget(quiz_key(message.from_user.id))
+    quiz = db.get_quiz(session.get("quiz_id", DEFAULT_QUIZ_ID)) if session else None
+    return quiz or db.get_quiz(DEFAULT_QUIZ_ID)
+
+async def send_unknown_quiz(chat_id, slug):
+    slugs = ", ".join(quiz.slug for quiz in db.get_quizzes())
+    await api.send_message(chat_id, messages["unknown_quiz"].format(slug, slugs))
+
+def _read_bytes(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+async def read_file(path: str) -> bytes:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, _read_bytes, path)
+
+async def get_image(path: str):
+    """
+    Копия картинки для отправки. Картинка без готовой копии обрабатывается в пуле потоков,
+    чтобы не останавливать цикл событий.
+    """
+    image = prepared_image(path)
+    if image is None:
+        image = await asyncio.get_running_loop().run_in_executor(None, prepare_image, path)
+    return image
+
+async def send_question(chat_id, question, question_id, user_id, message_id=None):
+    """
+    Отправляет вопрос с вариантами ответов.
+    """
+    # Подпись, клавиатура и путь к картинке собраны заранее для текущей версии каталога
+    payload = question_payload(db.get_question_catalog(), question_id, question)
+    # В кнопки подставляется nonce текущего прохождения, а варианты ответа идут в порядке прохождения
+    session = await sessions.aget(quiz_key(user_id))
+    order = order_from_session(session)
+    reply_markup = payload.reply_markup_for(session.get("nonce", 0) if session else 0,
+                                            order.option_order(question_id) if order else None)
+    # Номер в подписи — место вопроса в прохождении, а не его ID
+    quiz = db.get_quiz(session.get("quiz_id", DEFAULT_QUIZ_ID) if session else DEFAULT_QUIZ_ID)
+    number = question_number(quiz, question_id, order) if quiz else None
+    caption = payload.caption_for(number, len(quiz.question_ids) if quiz else None)
+
+    if message_id:
+        try:
+            await api.delete_message(chat_id, message_id)
+        except Exception as e:
+            logging.error(f"Ошибка при удалении сообщения: {e}")
+
+    # Отправляется уменьшенная и пережатая копия картинки (utils.images).
+    # Если копия уже загружалась и не менялась, отправляем её по file_id
+    image_path = payload.image_path
+    image = await get_image(image_path)
+    file_id = await db.get_image_file_id(image_path, image.content_hash)
+    if file_id:
+        try:
+            await api.send_photo(chat_id, file_id, caption=caption, reply_markup=reply_markup,
+                                 parse_mode=payload.parse_mode)
+            return
+        except ApiTelegramException as e:
+            # Лимит или сбой Telegram не делает file_id неверным: его нельзя забывать
+            if not is_file_id_rejected(e):
+                raise
+            logging.error(f"file_id для {image_path} не принят, загружаем файл заново: {e}")
+            await db.forget_image_file_id(image_path)
+
+    photo = await read_file(image.path)
+    sent = await api.send_photo(chat_id, photo, caption=caption, reply_markup=reply_markup,
+                                parse_mode=payload.parse_mode)
+    await db.save_image_file_id(image_path, image.content_hash, sent.photo[-1].file_id)
+
+@bot.message_handler(commands=["start"])
+async def send_welcome(message):
+    """
+    Обработчик команды /start.
+    """
+    log_action("start", message.from_user.id)
+    await api.send_message(message.chat.id, messages["start"], parse_mode="Markdown", reply_markup=types.ReplyKeyboardRemove())
+
+@bot.message_handler(commands=["help"])
+async def show_help(message):
+    """
+    Обработчик команды /help.
+    """
+    log_action("help", message.from_user.id)
+    await api.send_message(message.chat.id, messages["help"], parse_mode="Markdown")
+
+@bot.message_handler(commands=["get_prize"])
+async def prize(message):
+    """
+    Обработчик команды /get_prize.
+    """
+    user_id = message.from_user.id
+    quiz = await command_quiz(message)
+    if quiz is None:
+        return
+    completed = await db.get_completed_questions(user_id, quiz.quiz_id)
+    total_questions = db.get_questions_count(quiz.quiz_id)
+    header = quiz_header(quiz, len(db.get_quizzes()))
+
+    if len(completed) == total_questions and total_questions > 0:
+        await api.send_message(message.chat.id, header + messages["prize_success"], parse_mode="Markdown")
+    else:
+        await api.send_message(message.chat.id, header + messages["prize_failure"].format(len(completed), total_questions), parse_mode="Markdown")
+
+@bot.message_handler(commands=["start_quiz"])
+@per_user
+async def start_quiz(message):
+    """
+    Обработчик команды /start_quiz [slug]. Если квизов несколько и квиз не указан, предлагает выбрать квиз.
+    """
+    if util.extract_arguments(message.text or ""):
+        quiz = await command_quiz(message)
+        if quiz is None:
+            return
+    else:
+        quizzes = db.get_quizzes()
+        if len(quizzes) > 1:
+            await api.send_message(message.chat.id, messages["choose_quiz"], parse_mode="Markdown",
+                                   reply_markup=quizzes_keyboard(quizzes))
+            return
+        quiz = quizzes[0] if quizzes else None
+    await begin_quiz(message.chat.id, message.from_user, quiz)
+
+@callbacks.register(START_QUIZ)
+@per_user
+async def choose_quiz(call, quiz_id):
+    """
+    Обработчик выбора квиза из списка.
+    """
+    await api.answer_callback_query(call.id)
+    await begin_quiz(call.message.chat.id, call.from_user, db.get_quiz(quiz_id))
+
+async def begin_quiz(chat_id, user, quiz):
+    """
+    Начинает квиз заново: сбрасывает прогресс пользователя по вопросам квиза и отправляет первый вопрос.
+    Порядок вопросов и вариантов ответа в прохождении задаёт seed, который хранится в сессии.
+    """
+    user_id = user.id
+    log_action("start_quiz", user_id, quiz.slug if quiz else "")
+
+    order = None
+    if SHUFFLE_QUESTIONS or SHUFFLE_OPTIONS:
+        order = QuestionOrder.new(quiz, SHUFFLE_QUESTIONS, SHUFFLE_OPTIONS)
+    question_id = first_question_id(quiz, order) if quiz else None
+    question = db.get_question(question_id) if question_id is not None else None
+    if not question:
+        await api.send_message(chat_id, messages["no_questions"], parse_mode="Markdown")
+        return
+
+    await db.delete_user_progress(user_id, quiz.quiz_id)
+    await db.add_user(user_id, user.username)
+
+    started_at = int(time.time())
+    session = {"started_at": started_at, "nonce": new_nonce(), "quiz_id": quiz.quiz_id}
+    if order is not None:
+        session["order"] = order_to_session(order)
+    sessions.set(quiz_key(user_id), session)
+    await db.add_user_progress(user_id, question_id, start_time=started_at)
+    await send_question(chat_id, question, question_id, user_id)
+
+@bot.message_handler(commands=["author"])
+async def author(message):
+    """
+    Обработчик команды /author.
+    """
+    await api.send_message(
+        message.chat.id,
+        messages["author"],
+        parse_mode="Markdown",
+        disable_web_page_preview=True
+    )
+
+@bot.message_handler(commands=["stats"])
+async def show_stats(message):
+    """
+    Обработчик команды /stats.
+    """
+    user_id = message.from_user.id
+    quiz = await command_quiz(message)
+    if quiz is None:
+        return
+    stats = await db.get_my_info(user_id, quiz.quiz_id)
+    completed = await db.get_completed_questions(user_id, quiz.quiz_id)
+
+    total_time = stats["total_time"]
+    formatted_time = format_time(total_time) if total_time != "Нет данных" else "Нет данных"
+
+    await api.send_message(message.chat.id, quiz_header(quiz, len(db.get_quizzes())) + messages["stats"].format(
+        len(completed),
+        formatted_time,
+        stats["place"] if stats["place"] != "Нет данных" else "🚫"
+    ), parse_mode="Markdown")
+
+@bot.message_handler(commands=["admin"])
+async def admin_panel(message):
+    """
+    Обработчик команды /admin.
+    """
+    if not is_admin(message.from_user.id):
+        await api.send_message(message.chat.id, messages["admin"]["access_denied"], parse_mode="Markdown")
+        return
+
+    log_action("admin", message.from_user.id)
+    await api.send_message(
+        message.chat.id,
+        messages["admin"]["panel"],
+        parse_mode="Markdown",
+        reply_markup=generate_admin_menu()
+    )
+
+async def show_questions(call, page=0, backward=False, cursor=0):
+    """
+    Показывает страницу списка вопросов после курсора (или перед ним при листании назад).
+    """
+    if backward:
+        rows = await db.get_questions_page(limit=ADMIN_PAGE_SIZE + 1, before_id=cursor)
+    else:
+        rows = await db.get_questions_page(cursor, ADMIN_PAGE_SIZE + 1)
+    current = make_page(rows, ADMIN_PAGE_SIZE, page, backward)
+    if not current.items and cursor:
+        # Страница опустела после удалений — показываем начало списка
+        return await show_questions(call)
+    await api.edit_message_text(
+        chat_id=call.message.chat.id,
+        message_id=call.message.message_id,
+        text=format_page(messages["admin"]["questions_list"], current, db.get_questions_count(), ADMIN_PAGE_SIZE),
+        reply_markup=questions_keyboard(current)
+    )
+
+async def show_users(call, page=0, backward=False, cursor=None):
+    """
+    Показывает страницу списка пользователей после курсора (или перед ним при листании назад).
+    """
+    if backward:
+        rows = await db.get_users_page(limit=ADMIN_PAGE_SIZE + 1, before_id=cursor)
+    else:
+        rows = await db.get_users_page(cursor, ADMIN_PAGE_SIZE + 1)
+    current = make_page(rows, ADMIN_PAGE_SIZE, page, backward)
+    if not current.items and cursor:
+        return await show_users(call)
+    await api.edit_message_text(
+        chat_id=call.message.chat.id,
+        message_id=call.message.message_id,
+        text=format_page(messages["admin"]["users_list"], current, await db.get_users_count(), ADMIN_PAGE_SIZE),
+        reply_markup=users_keyboard(current)
+    )
+
+@callbacks.register(ADMIN)
+async def handle_admin_actions(call, action_index):
+    """
+    Обработчик действий администратора.
+    """
+    user_id = call.from_user.id
+    if not is_admin(user_id):
+        await api.answer_callback_query(call.id, messages["admin"]["access_denied"])
+        return
+
+    action = ADMIN_ACTIONS[action_index] if action_index < len(ADMIN_ACTIONS) else None
+
+    if action == "questions":
+        await show_questions(call)
+
+    elif action == "users":
+        await show_users(call)
+
+    elif action == "stats":
+        await api.edit_message_text(
+            chat_id=call.message.chat.id,
+            message_id=call.message.message_id,
+            # Сообщение Telegram — не больше 4096 символов
+            text=format_tops([(quiz, await db.get_top(quiz_id=quiz.quiz_id)) for quiz in db.get_quizzes()])[:4096],
+            reply_markup=back_keyboard()
+        )
+
+    elif action == "back":
+        await api.edit_message_text(
+            chat_id=call.message.chat.id,
+            message_id=call.message.message_id,
+            text=messages["admin"]["panel"],
+            reply_markup=generate_admin_menu()
+        )
+
+    elif action == "close":
+        await api.delete_message(call.message.chat.id, call.message.message_id)
+
+    elif action == "broadcast":
+        sessions.set(admin_key(user_id), "waiting_broadcast")
+        await api.send_message(call.message.chat.id, messages["admin"]["broadcast_instruction"])
+
+@callbacks.register(DELETE_QUESTION)
+async def delete_question_callback(call, question_id, page=0, cursor=0):
+    """
+    Обработчик удаления вопроса. Кнопки старого формата передают только ID вопроса,
+    тогда список открывается с первой страницы.
+    """
+    if not is_admin(call.from_user.id):
+        await api.answer_callback_query(call.id, messages["admin"]["access_denied"])
+        return
+
+    if await db.delete_question(question_id):
+        await api.answer_callback_query(call.id, messages["admin"]["question_deleted"])
+        # Обновляем ту же страницу списка вопросов
+        await show_questions(call, page, cursor=cursor)
+    else:
+        await api.answer_callback_query(call.id, messages["admin"]["error"])
+
+@callbacks.register(QUESTIONS_PAGE)
+async def questions_page_callback(call, page, direction, cursor):
+    """
+    Обработчик листания списка вопросов.
+    """
+    if not is_admin(call.from_user.id):
+        await api.answer_callback_query(call.id, messages["admin"]["access_denied"])
+        return
+    await show_questions(call, page, direction == PAGE_BEFORE, cursor)
+
+@callbacks.register(USERS_PAGE)
+async def users_page_callback(call, page, direction, cursor):
+    """
+    Обработчик листания списка пользователей.
+    """
+    if not is_admin(call.from_user.id):
+        await api.answer_callback_query(call.id, messages["admin"]["access_denied"])
+        return
+    await show_users(call, page, direction == PAGE_BEFORE, str(cursor))
+
+@callbacks.register(ADD_QUESTION)
+async def ask_new_question(call):
+    """
+    Обработчик добавления нового вопроса.
+    """
+    if not is_admin(call.from_user.id):
+        await api.answer_callback_query(call.id, messages["admin"]["access_denied"])
+        return
+
+    sessions.set(admin_key(call.from_user.id), "waiting_question")
+    await api.send_message(
+        call.message.chat.id,
+        messages["admin"]["add_question_instruction"]
+    )
+
+@bot.message_handler(func=admin_state("waiting_question"))
+async def add_new_question(message):
+    """
+    Обработчик добавления нового вопроса.
+    """
+    try:
+        data = message.text.split(";")
+        if len(data) != 6:
+            raise ValueError(messages["admin"]["invalid_format"])
+
+        await db.add_question(
+            data[0].strip(),
+            data[1].strip(),
+            data[2].strip(),
+            data[3].strip(),
+            data[4].strip(),
+            int(data[5].strip())
+        )
+        await api.send_message(message.chat.id, messages["admin"]["question_added"])
+        sessions.delete(admin_key(message.from_user.id))
+    except Exception as e:
+        await api.send_message(message.chat.id, f"❌ Ошибка: {e}")
+
+@bot.message_handler(content_types=["document"], func=admin_state("waiting_question"))
+async def import_questions_file(message):
+    """
+    Обработчик импорта вопросов из файла JSONL или CSV. В подписи к файлу можно указать
+    квиз для новых вопросов: «slug Название».
+    """
+    fmt = detect_format(message.document.file_name or "")
+    if fmt is None:
+        await api.send_message(message.chat.id, messages["admin"]["import_unsupported"])
+        return
+
+    try:
+        file_info = await api.get_file(message.document.file_id)
+        data = await api.download_file(file_info.file_path)
+        # Вопросы проверяются и записываются пачками в пуле потоков базы
+        stream = io.TextIOWrapper(io.BytesIO(data), encoding="utf-8-sig", newline="")
+        quiz_id = DEFAULT_QUIZ_ID
+        caption = (message.caption or "").strip()
+        if caption:
+            slug, _, title = caption.partition(" ")
+            quiz_id = (await db.run_db(get_or_create_quiz, get_storage(), slug, title.strip() or None)).quiz_id
+        report = await db.run_db(import_questions, get_storage(), stream, fmt, quiz_id=quiz_id)
+    except Exception as e:
+        await api.send_message(message.chat.id, f"❌ Ошибка: {e}")
+        return
+
+    log_action("import_questions", message.from_user.id, f"{report.written}/{report.rows}")
+    # Сообщение Telegram — не больше 4096 символов
+    await api.send_message(message.chat.id, messages["admin"]["import_done"].format(report.summary())[:4096])
+    sessions.delete(admin_key(message.from_user.id))
+
+@bot.message_handler(func=admin_state("waiting_broadcast"))
+async def start_broadcast(message):
+    """
+    Обработчик текста рассылки.
+    """
+    sessions.delete(admin_key(message.from_user.id))
+    broadcast = await broadcaster.start(message.text, message.from_user.id)
+    if broadcast is None:
+        await api.send_message(message.chat.id, messages["admin"]["error"])
+        return
+
+    log_action("broadcast", message.from_user.id, str(broadcast.broadcast_id))
+    await api.send_message(
+        message.chat.id,
+        messages["admin"]["broadcast_started"].format(broadcast.broadcast_id, await db.get_users_count()),
+        reply_markup=broadcast_keyboard(broadcast.broadcast_id)
+    )
+
+@callbacks.register(BROADCAST_CANCEL)
+async def cancel_broadcast(call, broadcast_id):
+    """
+    Обработчик остановки рассылки.
+    """
+    if not is_admin(call.from_user.id):
+        await api.answer_callback_query(call.id, messages["admin"]["access_denied"])
+        return
+
+    if broadcaster.cancel(broadcast_id):
+        log_action("broadcast_cancel", call.from_user.id, str(broadcast_id))
+        await api.answer_callback_query(call.id, messages["admin"]["broadcast_cancelling"])
+    else:
+        await api.answer_callback_query(call.id, messages["admin"]["broadcast_not_running"])
+
+@callbacks.register(ANSWER)
+@per_user
+async def handle_answer(call, current_q_id, selected_opt, nonce=None):
+    """
+    Обработчик ответа на вопрос.
+    """
+    user_id = call.from_user.id
+    if await is_stale(user_id, nonce):
+        # Кнопка из прошлого прохождения: отвечаем, не обращаясь к базе
+        await api.answer_callback_query(call.id, messages["stale_button"])
+        return
+
+    # Проверка ответа, завершение вопроса, переход к следующему и обновление топа — одна транзакция
+    order = order_from_session(await sessions.aget(quiz_key(user_id)))
+    result = await db.record_answer(user_id, current_q_id, selected_opt, username=call.from_user.username, order=order)
+
+    if not result.is_correct:
+        # Если ответ неправильный
+        await api.answer_callback_query(call.id, messages["incorrect_alert"], show_alert=True)
+        return
+
+    # Отправляем сообщение с описанием правильного ответа
+    correct_answer_description = result.description or "Описание отсутствует."
+    await api.answer_callback_query(call.id, messages["correct_alert"].format(correct_answer_description), show_alert=True)
+
+    if result.stale:
+        # Вопрос уже пройден (повторное нажатие или кнопка из старого прохождения)
+        return
+
+    if result.next_question:
+        # Удаляем текущее сообщение и отправляем следующий вопрос
+        await api.delete_message(call.message.chat.id, call.message.message_id)
+        await send_question(
+            call.message.chat.id,
+            result.next_question,
+            result.next_question_id,
+            user_id
+        )
+    elif result.total_time is not None:
+        # Если это был последний вопрос, квиз завершён
+        await api.send_message(
+            call.message.chat.id,
+            messages["quiz_completed" if result.top_updated else "quiz_completed_no_record"].format(result.total_time),
+            parse_mode="Markdown"
+        )
+
+@callbacks.register(HINT)
+async def show_hint(call, question_id, nonce=None):
+    """
+    Обработчик для отображения подсказки.
+    """
+    if await is_stale(call.from_user.id, nonce):
+        await api.answer_callback_query(call.id, messages["stale_button"])
+        return
+
+    # Получаем вопрос и подсказку
+    question = db.get_question(question_id)
+    hint = question.get("hint", "Подсказка отсутствует.")
+
+    # Отправляем подсказку как alert
+    await api.answer_callback_query(call.id, messages["hint"].format(hint), show_alert=True)
+
+callbacks.attach_async(bot)
+
+# Метрики обработчиков: время обработки, вызовы хранилища и SQL-запросы на обновление
+metrics.instrument_bot(bot)
+
+startup.mark("imports")
+
+async def run_webhook():
+    """
+    Принимает обновления через webhook и передаёт их в цикл событий.
+    Количество обновлений в обработке ограничено WEBHOOK_QUEUE_SIZE: при переполнении
+    сервер перестаёт разбирать очередь, и Telegram получает 503.
+    """
+    # HTTP-сервер нужен только в режиме webhook
+    from utils.webhook import WebhookServer
+
+    loop = asyncio.get_running_loop()
+    in_flight = threading.BoundedSemaphore(WEBHOOK_QUEUE_SIZE)
+
+    def on_update(update):
+        in_flight.acquire()
+        future = asyncio.run_coroutine_threadsafe(bot.process_new_updates([types.Update.de_json(update)]), loop)
+        future.add_done_callback(lambda _: in_flight.release())
+
+    server = WebhookServer(
+        on_update,
+        host=WEBHOOK_HOST,
+        port=WEBHOOK_PORT,
+        path=WEBHOOK_PATH,
+        secret_token=WEBHOOK_SECRET,
+        queue_size=WEBHOOK_QUEUE_SIZE
+    )
+    metrics.register_gauge("bot_queue_depth", server.queue_depth, queue="webhook")
+    server.start()
+    # Если WEBHOOK_SECRET не задан, сервер сгенерировал секрет сам
+    await bot.set_webhook(url=WEBHOOK_URL, secret_token=server.secret_token)
+    logging.info(f"Webhook слушает {WEBHOOK_HOST}:{WEBHOOK_PORT}{WEBHOOK_PATH}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await loop.run_in_executor(None, server.stop)
+
+async def main():
+    # Проверка схемы (таблицы создаются, только если версия схемы устарела)
+    # и загрузка каталога вопросов и топа в память
+    await db.open_storage()
+    startup.mark("storage")
+
+    storage = get_storage()
+    metrics.instrument_storage(storage)
+    # Сообщения с вопросами и картинки прогреваются, пока бот подключается к Telegram
+    prewarm = startup.prewarm(storage) if PREWARM else None
+    startup.watch_first_update(bot)
+    metrics.register_gauge("bot_queue_depth", storage.queue_depth, queue="storage")
+    if hasattr(sessions, "queue_depth"):
+        metrics.register_gauge("bot_queue_depth", sessions.queue_depth, queue="sessions")
+    metrics.register_gauge("bot_broadcasts_active", broadcaster.active_count)
+    exporter = metrics.MetricsExporter(port=METRICS_PORT, path=METRICS_FILE, interval=METRICS_DUMP_INTERVAL)
+    exporter.start()
+
+    # Рассылки, прерванные остановкой бота, продолжаются с последней сохранённой пачки
+    resumed = await broadcaster.resume()
+    if resumed:
+        logging.info(f"Продолжено рассылок: {resumed}")
+
+    startup.mark("ready")
+    logging.info(f"Бот запущен в асинхронном режиме ({UPDATES_MODE})...")
+    try:
+        if UPDATES_MODE == "webhook":
+            await run_webhook()
+        else:
+            await bot.remove_webhook()
+            await bot.infinity_polling()
+    finally:
+        await bot.close_session()
+        if prewarm is not None:
+            # Соединения с базой нельзя закрывать, пока поток прогрева ими пользуется
+            await asyncio.get_running_loop().run_in_executor(None, prewarm.join)
+        sessions.close()
+        db.shutdown()
+        exporter.stop()
+
+def run():
+    asyncio.run(main())
+
+if __name__ == "__main__":
+    setup_logging()
+    run()
@@ -0,0 +1,164 @@
+"""
+Рассылка на «поддельном Telegram API» и задержка сообщений квиза во время неё.
+
+В базу на временном файле добавляется --users пользователей, часть из них «заблокировала бота»
+(поддельный API отвечает им 403). Рассылка идёт через планировщик с приоритетом LOW, а в это
+время несколько потоков отправляют сообщения квиза с обычным приоритетом. Сравнивается задержка
+сообщений квиза без рассылки и во время неё, проверяется, что каждый доступный пользователь
+получил рассылку ровно один раз, а заблокировавшие бота удалены.
+
+Затем проверяется продолжение после перезапуска: рассылка с сохранённым курсором посередине
+списка отправляется только оставшимся пользователям.
+
+Лимиты поддельного API и рассылки масштабированы (--rate), чтобы прогон занимал секунды.
+
+Запуск: python -m benchmarks.bench_broadcast [--users 10000] [--rate 1000] [--blocked 0.02]
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import threading
+import time
+from collections import Counter
+
+from telebot.apihelper import ApiTelegramException
+
+from benchmarks.bench_outbound import FakeTelegramApi
+from utils.broadcast import Broadcaster
+from utils.outbound import OutboundScheduler, RateLimitedBot
+from utils.storage import SqliteStorage
+
+
+class BroadcastApi(FakeTelegramApi):
+    """
+    Поддельный API, который запоминает получателей и отвечает 403 заблокировавшим бота.
+    """
+
+    def __init__(self, blocked: set, **kwargs):
+        super().__init__(**kwargs)
+        self.blocked = blocked
+        self.received = Counter()
+
+    def send_message(self, chat_id, text, **kwargs):
+        if chat_id in self.blocked:
+            time.sleep(self.latency)
+            raise ApiTelegramException("sendMessage", None, {
+                "ok": False, "error_code": 403, "description": "Forbidden: bot was blocked by the user",
+            })
+        super().send_message(chat_id, text, **kwargs)
+        if text == "broadcast":
+            with self._lock:
+                self.received[chat_id] += 1
+
+
+def quiz_traffic(api, stop: threading.Event, senders: int, interval: float) -> list:
+    """
+    Отправляет сообщения квиза в разные чаты, пока не установлен stop.
+
+    :return: Задержки отправки, секунды.
+    """
+    latencies = []
+    lock = threading.Lock()
+
+    def sender():
+        while not stop.is_set():
+            started = time.monotonic()
+            api.send_message(-random.randrange(1, 10 ** 9), "quiz")
+            with lock:
+                latencies.append(time.monotonic() - started)
+            time.sleep(interval)
+
+    threads = [threading.Thread(target=sender) for _ in range(senders)]
+    for thread in threads:
+        thread.start()
+    stop.wait()
+    for thread in threads:
+        thread.join()
+    return latencies
+
+
+def percentile(values: list, q: float) -> float:
+    return sorted(values)[min(len(values) - 1, int(len(values) * q))] * 1000 if values else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--rate", type=int, default=1000, help="глобальный лимит поддельного API, запросов/с")
+    parser.add_argument("--blocked", type=float, default=0.02, help="доля пользователей, заблокировавших бота")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--chunk", type=int, default=200)
+    parser.add_argument("--quiz-senders", type=int, default=8)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        storage = SqliteStorage(os.path.join(tmp, "broadcast.db"))
+        storage.open()
+        try:
+            user_ids = list(range(1, args.users + 1))
+            storage.add_users([(user_id, f"user{user_id}") for user_id in user_ids])
+            blocked = set(random.sample(user_ids, int(args.users * args.blocked)))
+
+            fake = BroadcastApi(blocked, global_rate=args.rate, chat_rate=3, latency=0.002)
+            # Как в боте: рассылке достаётся часть глобального лимита, остальное — квизу
+            api = RateLimitedBot(fake, OutboundScheduler(
+                global_rate=args.rate * 0.9, global_burst=int(args.rate * 0.9),
+                chat_rate=1.0, chat_burst=3, low_rate=args.rate * 0.6,
+            ))
+            # Квиз: по сообщению в 20 мс из каждого потока, заметно ниже свободной части лимита
+            interval = 0.02
+
+            baseline_stop = threading.Event()
+            threading.Timer(2.0, baseline_stop.set).start()
+            baseline = quiz_traffic(api, baseline_stop, args.quiz_senders, interval)
+
+            finished = threading.Event()
+            broadcaster = Broadcaster(storage, api.background("send_message"), workers=args.workers,
+                                      chunk_size=args.chunk, on_finish=lambda broadcast: finished.set())
+            started = time.monotonic()
+            broadcaster.start("broadcast", 1)
+            during = []
+            during_stop = threading.Event()
+            traffic = threading.Thread(target=lambda: during.extend(
+                quiz_traffic(api, during_stop, args.quiz_senders, interval)))
+            traffic.start()
+            finished.wait()
+            elapsed = time.monotonic() - started
+            during_stop.set()
+            traffic.join()
+
+            reachable = args.users - len(blocked)
+            unfinished = storage.get_unfinished_broadcasts()
+            print(f"пользователей: {args.users}, заблокировали бота: {len(blocked)}")
+            print(f"рассылка: {elapsed:.2f} с, {reachable / elapsed:.0f} сообщений/с, "
+                  f"ошибок 429: {fake.too_many}")
+            print(f"{'квиз':<16} {'сообщений':>10} {'p50, мс':>9} {'p99, мс':>9} {'max, мс':>9}")
+            for name, latencies in (("без рассылки", baseline), ("во время рассылки", during)):
+                print(f"{name:<16} {len(latencies):>10} {statistics.median(latencies) * 1000:>9.1f} "
+                      f"{percentile(latencies, 0.99):>9.1f} {max(latencies) * 1000:>9.1f}")
+
+            assert unfinished == [], "Рассылка должна быть завершена"
+            assert len(fake.received) == reachable and max(fake.received.values()) == 1, \
+                "Каждый доступный пользователь получает рассылку ровно один раз"
+            assert storage.get_users_count() == reachable, "Заблокировавшие бота удаляются из списка рассылки"
+
+            # Продолжение после перезапуска: курсор сохранён посередине списка
+            fake.received.clear()
+            finished.clear()
+            remaining = sorted(storage.get_all_users(), key=lambda user: user["tg_id"])
+            middle = len(remaining) // 2
+            interrupted = storage.create_broadcast("broadcast", 1)
+            storage.save_broadcast_progress(interrupted["broadcast_id"], remaining[middle - 1]["tg_id"], middle, 0, 0)
+            assert broadcaster.resume() == 1
+            finished.wait()
+            expected = {int(user["tg_id"]) for user in remaining[middle:]}
+            assert set(fake.received) == expected, "После перезапуска отправляются только оставшиеся пользователи"
+            print(f"продолжение: отправлено {len(fake.received)} из {len(remaining)} (курсор на {middle})")
+        finally:
+            storage.close()
+
+
+if __name__ == "__main__":
+    main()
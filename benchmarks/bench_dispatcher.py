@@ -0,0 +1,65 @@
+"""
+Нагрузочный тест диспетчера обновлений.
+
+Имитирует обработчики, которые большую часть времени ждут ответа Telegram API,
+и показывает, как пропускная способность растёт с количеством потоков.
+Заодно проверяет, что обновления каждого пользователя обработаны по порядку.
+
+Запуск: python -m benchmarks.bench_dispatcher [--users 200] [--updates 2000] [--latency-ms 20]
+"""
+import argparse
+import threading
+import time
+from collections import defaultdict
+
+from utils.dispatcher import UpdateDispatcher
+
+
+def run(workers: int, users: int, updates: int, latency: float) -> float:
+    """
+    Прогоняет updates обновлений от users пользователей через диспетчер.
+
+    :return: Пропускная способность, обновлений в секунду.
+    """
+    dispatcher = UpdateDispatcher(workers)
+    seen = defaultdict(list)
+    lock = threading.Lock()
+
+    def handler(user_id: int, seq: int):
+        time.sleep(latency)  # Ожидание ответа Telegram API
+        with lock:
+            seen[user_id].append(seq)
+
+    started = time.perf_counter()
+    for i in range(updates):
+        user_id = i % users
+        dispatcher.submit(user_id, handler, user_id, i // users)
+    dispatcher.stop()
+    elapsed = time.perf_counter() - started
+
+    for user_id, order in seen.items():
+        if order != sorted(order):
+            raise AssertionError(f"Нарушен порядок обновлений пользователя {user_id}: {order}")
+    if sum(len(order) for order in seen.values()) != updates:
+        raise AssertionError("Обработаны не все обновления")
+    return updates / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--updates", type=int, default=2000)
+    parser.add_argument("--latency-ms", type=float, default=20.0)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32])
+    args = parser.parse_args()
+
+    baseline = None
+    print(f"{'потоков':>8} {'обн/с':>10} {'ускорение':>10}")
+    for workers in args.workers:
+        throughput = run(workers, args.users, args.updates, args.latency_ms / 1000)
+        baseline = baseline or throughput
+        print(f"{workers:>8} {throughput:>10.1f} {throughput / baseline:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,306 @@
+"""
+Бенчмарк обработчиков бота.
+
+Обновления проходят через настоящий TeleBot (bot.process_new_updates) и обработчики bot.py,
+а запросы к Telegram уходят в заглушку без сети. Для каждого размера базы создаётся
+временная база с синтетическими пользователями, прогрессом и топом, после чего
+прогоняются полные квизы (start_quiz, handle_answer, show_hint, show_stats)
+и просмотры админ-панели.
+
+Для каждого обработчика выводятся p50/p99 задержки, число SQL-запросов и запросов к Telegram
+на одно обновление, а для размера базы — пропускная способность. Результаты можно сохранить
+в JSON и сравнить с базовым прогоном: при регрессии скрипт завершается с кодом 1.
+
+Запуск:
+    python -m benchmarks.bench_handlers [--sizes 100,100000] [--quizzes 20] [--admin-repeat 50]
+    python -m benchmarks.bench_handlers --output baseline.json
+    python -m benchmarks.bench_handlers --baseline baseline.json [--tolerance 0.25] [--min-delta-ms 0.5]
+
+Миллионы строк прогресса: --sizes 100,100000,2000000
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from types import SimpleNamespace
+
+from telebot import types
+
+QUESTIONS = 25
+ADMIN_ID = 1
+
+# Настройки читаются при импорте utils.config, поэтому задаются до импорта модулей бота.
+# Токен ненастоящий: запросы к Telegram уходят в заглушку
+os.environ.setdefault("BOT_API", "123456:bench")
+os.environ["ADMIN"] = str(ADMIN_ID)
+os.environ.setdefault("SESSION_STORE", "memory")
+os.environ.setdefault("LOG_CONSOLE", "0")
+
+from utils import database
+from utils.callbacks import ANSWER, HINT, QUESTIONS_PAGE, USERS_PAGE, PAGE_AFTER, PAGE_BEFORE, encode
+from utils.keyboards import admin_action
+from utils.log import stop_logging
+from utils.ordering import order_from_session, first_question_id, next_question_id
+from utils.quizzes import DEFAULT_QUIZ_ID
+from utils.sessions import quiz_key
+FIRST_BENCH_USER = 10 ** 9
+
+
+class StubApi:
+    """
+    Заглушка Telegram API: считает вызовы и отвечает как успешный запрос.
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self._reply = SimpleNamespace(message_id=1, photo=[SimpleNamespace(file_id="stub-file-id")])
+
+    def __getattr__(self, name: str):
+        def method(*args, **kwargs):
+            self.calls += 1
+            return self._reply
+        return method
+
+
+def message_update(update_id: int, user_id: int, text: str) -> types.Update:
+    user = {"id": user_id, "is_bot": False, "first_name": "bench", "username": f"bench{user_id}"}
+    return types.Update.de_json({
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id, "date": 0, "text": text,
+            "from": user, "chat": {"id": user_id, "type": "private"},
+        },
+    })
+
+
+def callback_update(update_id: int, user_id: int, data: str) -> types.Update:
+    user = {"id": user_id, "is_bot": False, "first_name": "bench", "username": f"bench{user_id}"}
+    return types.Update.de_json({
+        "update_id": update_id,
+        "callback_query": {
+            "id": str(update_id), "from": user, "chat_instance": "1", "data": data,
+            "message": {"message_id": update_id, "date": 0, "chat": {"id": user_id, "type": "private"}},
+        },
+    })
+
+
+def fill(progress_rows: int):
+    """
+    Заполняет базу вопросами и синтетическими пользователями, прошедшими квиз.
+    """
+    images = sorted(name for name in os.listdir("imgs") if name.startswith("question"))
+    database.add_questions([{
+        "question_text": f"Вопрос {i}", "option1": "a", "option2": "b", "option3": "c", "option4": "d",
+        "correct_option": i % 4 + 1, "image_path": os.path.join("imgs", images[i % len(images)]) if images else None,
+        "hint": f"Подсказка {i}", "description": f"Ответ {i}",
+    } for i in range(1, QUESTIONS + 1)])
+
+    users = progress_rows // QUESTIONS
+    conn = database.get_connection()
+    with conn:
+        conn.executemany(
+            "INSERT INTO Users (tg_id, username) VALUES (?, ?)",
+            ((str(1000 + user), f"user{user}") for user in range(users)),
+        )
+        conn.executemany(
+            "INSERT INTO UserProgress (tg_id, question_id, is_completed, start_time, end_time) VALUES (?, ?, 1, ?, ?)",
+            ((str(1000 + i // QUESTIONS), i % QUESTIONS + 1, 0, i % 97) for i in range(users * QUESTIONS)),
+        )
+        conn.executemany(
+            "INSERT INTO TopUsers (tg_id, username, total_time) VALUES (?, ?, ?)",
+            ((str(1000 + user), f"user{user}", random.randint(60, 6000)) for user in range(users)),
+        )
+    database.load_leaderboard()
+
+
+def scenario(quizzes: int, admin_repeat: int, sessions):
+    """
+    Последовательность (имя обработчика, обновление): полные квизы и просмотры админ-панели.
+    Кнопки вопросов несут nonce текущего прохождения из хранилища сессий бота,
+    вопросы идут в порядке прохождения из сессии.
+    """
+    update_id = 0
+
+    def next_id():
+        nonlocal update_id
+        update_id += 1
+        return update_id
+
+    for quiz in range(quizzes):
+        user_id = FIRST_BENCH_USER + quiz
+        yield "start_quiz", message_update(next_id(), user_id, "/start_quiz")
+        session = sessions.get(quiz_key(user_id))
+        nonce, order = session["nonce"], order_from_session(session)
+        quiz = database.get_quiz(DEFAULT_QUIZ_ID)
+        question_id = first_question_id(quiz, order)
+        while question_id is not None:
+            correct = question_id % 4 + 1
+            if question_id % 5 == 0:
+                yield "show_hint", callback_update(next_id(), user_id, encode(HINT, question_id, nonce))
+            if question_id % 7 == 0:
+                yield "handle_answer", callback_update(next_id(), user_id, encode(ANSWER, question_id, correct % 4 + 1, nonce))
+            yield "handle_answer", callback_update(next_id(), user_id, encode(ANSWER, question_id, correct, nonce))
+            question_id = next_question_id(quiz, question_id, order)
+        yield "show_stats", message_update(next_id(), user_id, "/stats")
+
+    for _ in range(admin_repeat):
+        yield "admin_panel", message_update(next_id(), ADMIN_ID, "/admin")
+        for view in ("questions", "users", "stats", "back"):
+            yield f"admin_{view}", callback_update(next_id(), ADMIN_ID, admin_action(view))
+        # Листание из середины списков: страница ищется по ключу и не дороже первой
+        yield "admin_questions_page", callback_update(next_id(), ADMIN_ID, encode(QUESTIONS_PAGE, 1, PAGE_AFTER, 10))
+        yield "admin_users_page", callback_update(next_id(), ADMIN_ID, encode(USERS_PAGE, 50, PAGE_BEFORE, 1500))
+
+
+def percentile(values: list, q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+def run_size(bot_module, stub: StubApi, tmp: str, progress_rows: int, args) -> dict:
+    database.close_connections()
+    database.db_path = os.path.join(tmp, f"bench_{progress_rows}.db")
+    database._file_id_cache.clear()
+    bot_module.storage.open()
+    fill(progress_rows)
+
+    conn = database.get_connection()
+    statements = 0
+
+    def count_statement(_):
+        nonlocal statements
+        statements += 1
+
+    conn.set_trace_callback(count_statement)
+    latencies = defaultdict(list)
+    sql = defaultdict(int)
+    api = defaultdict(int)
+
+    started = time.perf_counter()
+    for name, update in scenario(args.quizzes, args.admin_repeat, bot_module.sessions):
+        statements_before, api_before = statements, stub.calls
+        update_started = time.perf_counter()
+        bot_module.bot.process_new_updates([update])
+        latencies[name].append((time.perf_counter() - update_started) * 1000)
+        sql[name] += statements - statements_before
+        api[name] += stub.calls - api_before
+    elapsed = time.perf_counter() - started
+    conn.set_trace_callback(None)
+
+    updates = sum(map(len, latencies.values()))
+    result = {"_total": {"updates": updates, "throughput": updates / elapsed}}
+    for name, values in latencies.items():
+        result[name] = {
+            "count": len(values),
+            "p50_ms": statistics.median(values),
+            "p99_ms": percentile(values, 0.99),
+            "sql_per_update": sql[name] / len(values),
+            "api_per_update": api[name] / len(values),
+        }
+    return result
+
+
+def print_results(results: dict):
+    for size, handlers in results["sizes"].items():
+        total = handlers["_total"]
+        print(f"\nстрок прогресса: {size}, обновлений: {total['updates']}, {total['throughput']:.0f} обновлений/с")
+        print(f"{'обработчик':<20} {'кол-во':>7} {'p50, мс':>9} {'p99, мс':>9} {'SQL/обн.':>9} {'API/обн.':>9}")
+        for name, stats in handlers.items():
+            if name == "_total":
+                continue
+            print(f"{name:<20} {stats['count']:>7} {stats['p50_ms']:>9.3f} {stats['p99_ms']:>9.3f} "
+                  f"{stats['sql_per_update']:>9.2f} {stats['api_per_update']:>9.2f}")
+
+
+def compare(results: dict, baseline: dict, tolerance: float, min_delta_ms: float) -> list:
+    """
+    Сравнивает прогон с базовым. Задержка считается ухудшившейся, если выросла и больше чем
+    в (1 + tolerance) раз, и больше чем на min_delta_ms: доли миллисекунды на малых выборках — шум.
+
+    :return: Список описаний регрессий.
+    """
+    regressions = []
+    for size, handlers in results["sizes"].items():
+        base_handlers = baseline.get("sizes", {}).get(size)
+        if base_handlers is None:
+            continue
+        for name, stats in handlers.items():
+            base = base_handlers.get(name)
+            if name == "_total" or base is None:
+                continue
+            for metric in ("p50_ms", "p99_ms"):
+                if stats[metric] > max(base[metric] * (1 + tolerance), base[metric] + min_delta_ms):
+                    regressions.append(f"{size} {name} {metric}: {base[metric]:.3f} -> {stats[metric]:.3f}")
+            # Число запросов не зависит от машины, поэтому любой рост — регрессия
+            for metric in ("sql_per_update", "api_per_update"):
+                if stats[metric] > base[metric] + 1e-9:
+                    regressions.append(f"{size} {name} {metric}: {base[metric]:.2f} -> {stats[metric]:.2f}")
+        base_total = base_handlers.get("_total")
+        if base_total and handlers["_total"]["throughput"] < base_total["throughput"] / (1 + tolerance):
+            regressions.append(f"{size} throughput: {base_total['throughput']:.0f} -> {handlers['_total']['throughput']:.0f}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="100,100000", help="размеры базы в строках прогресса через запятую")
+    parser.add_argument("--quizzes", type=int, default=20, help="полных прохождений квиза на размер")
+    parser.add_argument("--admin-repeat", type=int, default=50, help="просмотров админ-панели на размер")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="сохранить результаты в JSON")
+    parser.add_argument("--baseline", help="сравнить с результатами из JSON")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="допустимое ухудшение задержки и пропускной способности")
+    parser.add_argument("--min-delta-ms", type=float, default=0.5, help="рост задержки меньше этого не считается регрессией")
+    args = parser.parse_args()
+    random.seed(args.seed)
+
+    results = {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "quizzes": args.quizzes,
+        "admin_repeat": args.admin_repeat,
+        "sizes": {},
+    }
+    repo = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        # bot.log создаётся во временной папке, а не в репозитории
+        os.chdir(tmp)
+        try:
+            import bot as bot_module
+        finally:
+            os.chdir(repo)
+        stub = StubApi()
+        bot_module.api = stub
+
+        # Лог пишется в bot.log во временной папке и остаётся частью работы обработчиков
+        for size in (int(value) for value in args.sizes.split(",")):
+            results["sizes"][str(size)] = run_size(bot_module, stub, tmp, size, args)
+        bot_module.sessions.close()
+        bot_module.storage.close()
+        stop_logging()
+
+    print_results(results)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"\nрезультаты сохранены в {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.tolerance, args.min_delta_ms)
+        if regressions:
+            print(f"\nрегрессии относительно {args.baseline}:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print(f"\nрегрессий относительно {args.baseline} нет")
+
+
+if __name__ == "__main__":
+    main()
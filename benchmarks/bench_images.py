@@ -0,0 +1,88 @@
+"""
+Подготовка картинок вопросов: размер загрузки, оценка времени загрузки и стоимость проверки копии.
+
+Собирает копии всех картинок из imgs/ во временной папке и показывает:
+- сколько байт загружается в Telegram без подготовки и с ней, и оценку времени загрузки
+  при заданной скорости канала (--uplink, Мбит/с);
+- время первой сборки и повторной, когда картинки не менялись (должно быть 0 обработанных);
+- время выбора файла при отправке вопроса (prepared_image) против хэша исходного файла;
+- что изменённая картинка собирается заново, а остальные — нет.
+
+Запуск: python -m benchmarks.bench_images [--uplink 20] [--lookups 10000]
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+from utils import images
+from utils.images import ImagePipeline, SOURCE_DIR, SOURCE_EXTENSIONS, file_hash
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--uplink", type=float, default=20, help="скорость загрузки в Telegram, Мбит/с")
+    parser.add_argument("--lookups", type=int, default=10000)
+    args = parser.parse_args()
+
+    sources = sorted(os.path.join(SOURCE_DIR, name) for name in os.listdir(SOURCE_DIR)
+                     if name.lower().endswith(SOURCE_EXTENSIONS))
+    with tempfile.TemporaryDirectory() as tmp:
+        pipeline = ImagePipeline(os.path.join(tmp, "images"))
+
+        started = time.perf_counter()
+        prepared = {path: pipeline.prepare(path) for path in sources}
+        first_build = time.perf_counter() - started
+
+        reloaded = ImagePipeline(pipeline.directory)
+        started = time.perf_counter()
+        rebuilt = sum(reloaded.lookup(path) is None for path in sources)
+        for path in sources:
+            reloaded.prepare(path)
+        second_build = time.perf_counter() - started
+        assert rebuilt == 0, "Неизменённые картинки не обрабатываются повторно"
+
+        source_bytes = sum(os.path.getsize(path) for path in sources)
+        upload_bytes = sum(os.path.getsize(image.path) for image in prepared.values())
+        largest = max(sources, key=os.path.getsize)
+
+        def upload_ms(size: int) -> float:
+            return size * 8 / (args.uplink * 1e6) * 1000
+
+        print(f"картинок: {len(sources)}")
+        print(f"{'':<22} {'байт':>10} {'загрузка, мс':>13}")
+        print(f"{'без подготовки':<22} {source_bytes:>10} {upload_ms(source_bytes) / len(sources):>13.1f}")
+        print(f"{'с подготовкой':<22} {upload_bytes:>10} "
+              f"{upload_ms(upload_bytes) / len(sources):>13.1f}")
+        print(f"{largest + ' до':<22} {os.path.getsize(largest):>10} {upload_ms(os.path.getsize(largest)):>13.1f}")
+        print(f"{largest + ' после':<22} {os.path.getsize(prepared[largest].path):>10} "
+              f"{upload_ms(os.path.getsize(prepared[largest].path)):>13.1f}")
+        print(f"сборка: первая {first_build * 1000:.0f} мс, повторная {second_build * 1000:.1f} мс "
+              f"(обработано {rebuilt})")
+
+        images._pipeline = reloaded
+        started = time.perf_counter()
+        for i in range(args.lookups):
+            images.prepared_image(sources[i % len(sources)])
+        lookup_us = (time.perf_counter() - started) / args.lookups * 1e6
+        started = time.perf_counter()
+        for i in range(args.lookups):
+            file_hash(sources[i % len(sources)])
+        hash_us = (time.perf_counter() - started) / args.lookups * 1e6
+        print(f"выбор файла при отправке: {lookup_us:.1f} мкс (хэш исходного файла: {hash_us:.1f} мкс)")
+
+        # Изменённая картинка собирается заново, остальные остаются готовыми
+        changed = os.path.join(tmp, "changed.jpg")
+        shutil.copy(sources[0], changed)
+        first = reloaded.prepare(changed)
+        with open(sources[1], "rb") as src, open(changed, "wb") as dst:
+            dst.write(src.read())
+        assert reloaded.lookup(changed) is None, "Изменённая картинка не считается готовой"
+        assert reloaded.prepare(changed).content_hash != first.content_hash
+        assert all(reloaded.lookup(path) is not None for path in sources)
+        print("изменённая картинка собрана заново, остальные остались готовыми")
+
+
+if __name__ == "__main__":
+    main()
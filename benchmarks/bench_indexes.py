@@ -0,0 +1,93 @@
+"""
+Бенчмарк индексов UserProgress и TopUsers.
+
+Создаёт временную базу с синтетическими данными (по умолчанию миллион строк прогресса
+и сто тысяч строк топа) и замеряет запросы из utils.database сначала без индексов,
+а затем после применения миграций.
+
+Запуск: python -m benchmarks.bench_indexes [--progress-rows 1000000] [--top-rows 100000] [--repeat 200]
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from utils import database
+
+QUESTIONS = 25
+
+
+def fill(progress_rows: int, top_rows: int):
+    conn = database.get_connection()
+    users = max(1, progress_rows // QUESTIONS)
+    now = int(time.time())
+    with conn:
+        conn.executemany(
+            "INSERT INTO Users (tg_id, username) VALUES (?, ?)",
+            ((str(user), f"user{user}") for user in range(users)),
+        )
+        conn.executemany(
+            "INSERT INTO UserProgress (tg_id, question_id, is_completed, start_time, end_time) VALUES (?, ?, 1, ?, ?)",
+            ((str(i // QUESTIONS), i % QUESTIONS + 1, now, now + i % 97) for i in range(progress_rows)),
+        )
+        conn.executemany(
+            "INSERT INTO TopUsers (tg_id, username, total_time) VALUES (?, ?, ?)",
+            ((str(user), f"user{user}", random.randint(60, 6000)) for user in range(top_rows)),
+        )
+    return users
+
+
+def measure(users: int, repeat: int) -> dict:
+    ids = [random.randrange(users) for _ in range(repeat)]
+    cases = {
+        "add_user_progress": lambda user: database.add_user_progress(user, 3, start_time=1),
+        "complete_question": lambda user: database.complete_question(user, 3),
+        "get_completed_questions": database.get_completed_questions,
+        "calculate_total_time": database.calculate_total_time,
+        "get_my_info": database.get_my_info,
+        "get_top": lambda user: database.get_top(),
+    }
+    results = {}
+    for name, case in cases.items():
+        started = time.perf_counter()
+        for user in ids:
+            case(user)
+        results[name] = (time.perf_counter() - started) / repeat * 1000
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--progress-rows", type=int, default=1_000_000)
+    parser.add_argument("--top-rows", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database.db_path = os.path.join(tmp, "bench.db")
+        database.create_tables()
+        users = fill(args.progress_rows, args.top_rows)
+
+        # Замер без индексов: удаляем их и сбрасываем версию схемы
+        conn = database.get_connection()
+        for name in ("idx_progress_user_question", "idx_progress_user_completed", "idx_top_total_time"):
+            conn.execute(f"DROP INDEX IF EXISTS {name}")
+        conn.execute("PRAGMA user_version = 0")
+        before = measure(users, args.repeat)
+
+        started = time.perf_counter()
+        version = database.migrate()
+        migration_time = time.perf_counter() - started
+        after = measure(users, args.repeat)
+        database.close_connections()
+
+    print(f"строк прогресса: {args.progress_rows}, строк топа: {args.top_rows}, пользователей: {users}")
+    print(f"миграция до версии {version}: {migration_time:.2f} с")
+    print(f"{'запрос':<26} {'без индексов, мс':>18} {'с индексами, мс':>17} {'ускорение':>10}")
+    for name in before:
+        print(f"{name:<26} {before[name]:>18.3f} {after[name]:>17.3f} {before[name] / after[name]:>9.0f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Бенчмарк таблицы лидеров.
+
+Заполняет временную базу миллионом строк TopUsers (с индексом по total_time из миграций)
+и сравнивает запросы к базе, которые раньше выполнялись на каждый /stats и просмотр топа,
+с таблицей лидеров в памяти: место пользователя, топ-10, соседи по таблице и обновление времени.
+
+Запросы к базе на миллионе строк медленные, поэтому для них берётся меньшая выборка (--sql-repeat).
+
+Запуск: python -m benchmarks.bench_leaderboard [--users 1000000] [--repeat 2000] [--sql-repeat 50]
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from utils import database
+
+
+def timed(func, ids) -> float:
+    started = time.perf_counter()
+    for user in ids:
+        func(user)
+    return (time.perf_counter() - started) / len(ids) * 1_000_000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=2000)
+    parser.add_argument("--sql-repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database.db_path = os.path.join(tmp, "bench.db")
+        database.create_tables()
+        conn = database.get_connection()
+        with conn:
+            conn.executemany(
+                "INSERT INTO TopUsers (tg_id, username, total_time) VALUES (?, ?, ?)",
+                ((str(user), f"user{user}", random.randint(60, 6000)) for user in range(args.users)),
+            )
+
+        started = time.perf_counter()
+        database.load_leaderboard()
+        load_time = time.perf_counter() - started
+        leaderboard = database.get_leaderboard()
+
+        ids = [random.randrange(args.users) for _ in range(args.repeat)]
+        sql_ids = ids[:args.sql_repeat]
+
+        def sql_rank(user):
+            total_time = conn.execute("SELECT total_time FROM TopUsers WHERE tg_id = ?", (str(user),)).fetchone()[0]
+            return conn.execute("SELECT COUNT(*) + 1 FROM TopUsers WHERE total_time < ?", (total_time,)).fetchone()[0]
+
+        def sql_top(user):
+            return conn.execute("SELECT username, total_time FROM TopUsers ORDER BY total_time ASC LIMIT 10").fetchall()
+
+        def sql_around(user):
+            rank = sql_rank(user)
+            return conn.execute(
+                "SELECT tg_id, username, total_time FROM TopUsers ORDER BY total_time, tg_id LIMIT 5 OFFSET ?",
+                (max(rank - 3, 0),)
+            ).fetchall()
+
+        results = {
+            "место пользователя": (timed(sql_rank, sql_ids), timed(leaderboard.rank, ids)),
+            "топ-10": (timed(sql_top, sql_ids), timed(lambda user: leaderboard.top(10), ids)),
+            "соседи по таблице": (timed(sql_around, sql_ids), timed(leaderboard.around, ids)),
+        }
+        update_time = timed(lambda user: leaderboard.update(user, f"user{user}", random.randint(60, 6000)), ids)
+
+        # Проверка: место из памяти совпадает с COUNT(*) + 1 по базе
+        with conn:
+            conn.executemany(
+                "UPDATE TopUsers SET total_time = ? WHERE tg_id = ?",
+                ((leaderboard.get(user)[0], str(user)) for user in set(ids)),
+            )
+        for user in sql_ids:
+            assert leaderboard.rank(user) == sql_rank(user), "Место в памяти должно совпадать с базой"
+        database.close_connections()
+
+    print(f"пользователей в топе: {args.users}, загрузка таблицы лидеров: {load_time:.2f} с")
+    print(f"{'запрос':<20} {'база, мкс':>12} {'память, мкс':>12} {'ускорение':>10}")
+    for name, (sql, memory) in results.items():
+        print(f"{name:<20} {sql:>12.1f} {memory:>12.1f} {sql / memory:>9.0f}x")
+    print(f"{'обновление времени':<20} {'':>12} {update_time:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
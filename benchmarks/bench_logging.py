@@ -0,0 +1,105 @@
+"""
+Бенчмарк логирования в обработчиках.
+
+Несколько потоков пишут записи в лог так, как это делают обработчики и функции базы.
+Сравниваются прежняя схема (FileHandler и текстовый формат, запись на диск в потоке вызова)
+и очередь с фоновым потоком записи из utils.log (JSON, ротация). Для каждой схемы выводится
+задержка одного вызова в потоке обработчика (p50/p99) и сколько записей дошло до файла.
+Частые события пишутся через log_event с выборкой, как в utils.database.
+
+Запуск: python -m benchmarks.bench_logging [--threads 8] [--records 20000] [--fsync]
+"""
+import argparse
+import logging
+import os
+import statistics
+import tempfile
+import threading
+import time
+from typing import Optional
+
+QUEUE_LOG = "queue.log"
+
+
+def worker(records: int, latencies: list, log_call):
+    local = []
+    for i in range(records):
+        started = time.perf_counter()
+        log_call(i)
+        local.append(time.perf_counter() - started)
+    latencies.extend(local)
+
+
+def run(threads: int, records: int, log_call) -> list:
+    latencies = []
+    pool = [threading.Thread(target=worker, args=(records, latencies, log_call)) for _ in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    return latencies
+
+
+def report(name: str, latencies: list, lines: Optional[int]):
+    ordered = sorted(latencies)
+    p99 = ordered[int(len(ordered) * 0.99)]
+    line = f"{name:<28} p50 {statistics.median(ordered) * 1e6:7.1f} мкс   p99 {p99 * 1e6:8.1f} мкс"
+    print(line if lines is None else f"{line}   строк в файле: {lines}")
+
+
+class FsyncFileHandler(logging.FileHandler):
+    """
+    FileHandler, который сбрасывает каждую запись на диск: худший случай медленного диска.
+    """
+
+    def emit(self, record):
+        super().emit(record)
+        os.fsync(self.stream.fileno())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--records", type=int, default=20000, help="записей на поток")
+    parser.add_argument("--fsync", action="store_true", help="сбрасывать каждую запись на диск")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Настройки читаются при импорте utils.config
+        os.environ["LOG_FILE"] = os.path.join(tmp, QUEUE_LOG)
+        os.environ["LOG_CONSOLE"] = "0"
+        from utils import log
+
+        root = logging.getLogger()
+        root.setLevel(logging.INFO)
+        sync_path = os.path.join(tmp, "sync.log")
+        handler = (FsyncFileHandler if args.fsync else logging.FileHandler)(sync_path)
+        handler.setFormatter(logging.Formatter(log.TEXT_FORMAT, log.TEXT_DATEFMT))
+        root.addHandler(handler)
+        sync = run(args.threads, args.records, lambda i: log.log_action("start_quiz", i))
+        root.removeHandler(handler)
+        handler.close()
+        with open(sync_path, encoding="utf-8") as f:
+            report("FileHandler в потоке вызова", sync, sum(1 for _ in f))
+
+        log.setup_logging()
+        if args.fsync:
+            file_handler = log._listener.handlers[0]
+            file_handler.emit = lambda record, emit=file_handler.emit: (emit(record), os.fsync(file_handler.stream.fileno()))
+        queued = run(args.threads, args.records, lambda i: log.log_action("start_quiz", i))
+        sampled = run(args.threads, args.records, lambda i: log.log_event(
+            "db.question_started", f"Пользователь {i} начал вопрос 1.", sample=True, user_id=i, question_id=1))
+        dropped = log._queue_handler.dropped
+        started = time.perf_counter()
+        log.stop_logging()
+        drain = time.perf_counter() - started
+        with open(os.path.join(tmp, QUEUE_LOG), encoding="utf-8") as f:
+            lines = sum(1 for _ in f)
+        report("очередь + фоновый поток", queued, None)
+        report("очередь, частое событие", sampled, None)
+        print(f"строк в файле после обеих очередей: {lines}, отброшено при переполнении: {dropped}, "
+              f"дописывание при остановке: {drain * 1000:.0f} мс")
+
+
+if __name__ == "__main__":
+    main()
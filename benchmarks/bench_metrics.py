@@ -0,0 +1,58 @@
+"""
+Бенчмарк накладных расходов метрик.
+
+Измеряет, сколько стоят обёртка обработчика, обёртка метода хранилища, учёт SQL-запроса
+и учёт запроса к Telegram, и оценивает расходы на одно обновление handle_answer
+(обработчик, 4 вызова хранилища, 4 SQL-запроса, 3 запроса к Telegram) относительно
+его времени обработки. В конце печатает пример вывода в формате Prometheus.
+
+Запуск: python -m benchmarks.bench_metrics [--calls 200000] [--handler-ms 50]
+"""
+import argparse
+import time
+
+from utils import metrics
+
+
+def per_call_ns(func, calls: int) -> float:
+    started = time.perf_counter_ns()
+    for _ in range(calls):
+        func()
+    return (time.perf_counter_ns() - started) / calls
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=200000)
+    parser.add_argument("--handler-ms", type=float, default=50.0,
+                        help="время обработки обновления, с которым сравниваются расходы (с запросами к Telegram)")
+    args = parser.parse_args()
+    if not metrics.METRICS:
+        parser.error("метрики отключены (METRICS=0)")
+
+    def noop():
+        pass
+
+    baseline = per_call_ns(noop, args.calls)
+    handler = per_call_ns(metrics.instrument_handler(noop), args.calls) - baseline
+    storage_call = per_call_ns(metrics._timed_call("bench", noop), args.calls) - baseline
+    query = per_call_ns(metrics.count_query, args.calls)
+    api = per_call_ns(lambda: metrics.record_api("send_message", 0.05), args.calls)
+    update = handler + 4 * storage_call + 4 * query + 3 * api
+
+    print(f"обёртка обработчика:        {handler:7.0f} нс")
+    print(f"вызов хранилища:            {storage_call:7.0f} нс")
+    print(f"SQL-запрос:                 {query:7.0f} нс")
+    print(f"запрос к Telegram:          {api:7.0f} нс")
+    print(f"одно обновление handle_answer: {update / 1000:.1f} мкс, "
+          f"{update / (args.handler_ms * 1e6) * 100:.3f}% от {args.handler_ms} мс")
+
+    metrics.reset()
+    metrics.instrument_handler(noop)()
+    metrics.record_api("send_message", 0.05)
+    print()
+    print("\n".join(line for line in metrics.render().splitlines() if "bucket" not in line))
+
+
+if __name__ == "__main__":
+    main()
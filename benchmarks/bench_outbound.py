@@ -0,0 +1,135 @@
+"""
+Проверка планировщика исходящих запросов на локальном «поддельном Telegram API».
+
+Поддельный API следит за теми же лимитами, что и Telegram (глобальный и на чат),
+и отвечает 429 с retry_after, если их превысить. Несколько потоков одновременно
+рассылают сообщения в разные чаты и отвечают на нажатия кнопок — сначала напрямую,
+затем через OutboundScheduler. Показывает число ответов 429, пропускную способность
+и задержку answer_callback_query.
+
+Запуск: python -m benchmarks.bench_outbound [--requests 600] [--chats 40] [--senders 32] [--rate 30]
+"""
+import argparse
+import random
+import statistics
+import threading
+import time
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+
+from telebot.apihelper import ApiTelegramException
+
+from utils.outbound import OutboundScheduler, RateLimitedBot
+
+
+class FakeTelegramApi:
+    """
+    Считает сообщения в скользящем окне в одну секунду и отвечает 429, как Telegram.
+    Ответы на нажатия кнопок в лимит рассылки не входят.
+    """
+
+    def __init__(self, global_rate: int, chat_rate: int, latency: float = 0.005):
+        self.global_rate = global_rate
+        self.chat_rate = chat_rate
+        self.latency = latency
+        self._global = deque()
+        self._chats = defaultdict(deque)
+        self._lock = threading.Lock()
+        self.ok = 0
+        self.too_many = 0
+
+    @staticmethod
+    def _window(calls: deque, now: float) -> deque:
+        while calls and calls[0] <= now - 1.0:
+            calls.popleft()
+        return calls
+
+    def _request(self, method: str, chat_id=None):
+        time.sleep(self.latency)
+        now = time.monotonic()
+        with self._lock:
+            if chat_id is None:
+                self.ok += 1
+                return
+            over_global = len(self._window(self._global, now)) >= self.global_rate
+            chat_calls = self._window(self._chats[chat_id], now)
+            if over_global or len(chat_calls) >= self.chat_rate:
+                self.too_many += 1
+                raise ApiTelegramException(method, None, {
+                    "ok": False, "error_code": 429,
+                    "description": "Too Many Requests: retry after 1",
+                    "parameters": {"retry_after": 1},
+                })
+            self._global.append(now)
+            chat_calls.append(now)
+            self.ok += 1
+
+    def send_message(self, chat_id, text, **kwargs):
+        self._request("sendMessage", chat_id)
+
+    def answer_callback_query(self, callback_query_id, text=None, **kwargs):
+        self._request("answerCallbackQuery")
+
+
+def run(api, args, chats: list) -> dict:
+    """
+    Отправляет смесь сообщений и ответов на кнопки и собирает статистику.
+    """
+    callback_latency = []
+    failed = 0
+    lock = threading.Lock()
+
+    def job(i: int):
+        nonlocal failed
+        started = time.monotonic()
+        try:
+            if i % 4 == 0:
+                api.answer_callback_query(str(i), "ok")
+                with lock:
+                    callback_latency.append(time.monotonic() - started)
+            else:
+                api.send_message(chats[i % len(chats)], "text")
+        except Exception:
+            with lock:
+                failed += 1
+
+    started = time.monotonic()
+    with ThreadPoolExecutor(args.senders) as pool:
+        list(pool.map(job, range(args.requests)))
+    elapsed = time.monotonic() - started
+    return {
+        "elapsed": elapsed,
+        "failed": failed,
+        "callback_p50": statistics.median(callback_latency) * 1000 if callback_latency else 0.0,
+        "callback_max": max(callback_latency, default=0.0) * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=600)
+    parser.add_argument("--chats", type=int, default=40)
+    parser.add_argument("--senders", type=int, default=32)
+    parser.add_argument("--rate", type=int, default=30, help="глобальный лимит поддельного API, запросов/с")
+    args = parser.parse_args()
+    chats = [random.randrange(10 ** 9) for _ in range(args.chats)]
+
+    print(f"{'режим':<14} {'время, с':>9} {'запросов/с':>11} {'429':>6} {'ошибок':>7} {'callback p50, мс':>17} {'max, мс':>9}")
+    for name in ("напрямую", "планировщик"):
+        fake = FakeTelegramApi(global_rate=args.rate, chat_rate=3)
+        scheduler = None
+        api = fake
+        if name == "планировщик":
+            # Немного ниже лимитов API, чтобы не упираться в границу окна
+            scheduler = OutboundScheduler(global_rate=args.rate * 0.9, global_burst=1,
+                                          chat_rate=1.0, chat_burst=2)
+            api = RateLimitedBot(fake, scheduler)
+        stats = run(api, args, chats)
+        print(f"{name:<14} {stats['elapsed']:>9.2f} {fake.ok / stats['elapsed']:>11.1f} {fake.too_many:>6} "
+              f"{stats['failed']:>7} {stats['callback_p50']:>17.1f} {stats['callback_max']:>9.1f}")
+        if scheduler is not None:
+            assert stats["failed"] == 0, "Через планировщик все запросы должны быть доставлены"
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""
+Бенчмарк запуска бота.
+
+Отчёт об импорте: python -X importtime для import bot — модули, которые bot.py импортирует
+напрямую, по суммарному времени, и самые медленные модули по собственному времени.
+
+Время до первого обработанного обновления: бот запускается в отдельном процессе через bot.run(),
+вместо long polling ему через --connect-ms (время подключения к Telegram: deleteWebhook и первый
+getUpdates) передаётся одно обновление /start_quiz, а запросы к Telegram уходят в заглушку. Из utils.startup выводятся этапы: imports (импорт и объявление обработчиков),
+storage (схема, каталог и топ), ready, connected, first_update и prewarm. Сравниваются проверка схемы
+по PRAGMA user_version и прежний DDL при каждом запуске, с фоновым прогревом и без него.
+
+Запуск: python -m benchmarks.bench_startup [--runs 5] [--top 10] [--connect-ms 100]
+"""
+import argparse
+import json
+import os
+import re
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+IMPORT_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+# Варианты запуска: (название, проверка схемы, прогрев)
+MODES = (
+    ("DDL при запуске, без прогрева", "ddl", "0"),
+    ("user_version, без прогрева", "version", "0"),
+    ("user_version, прогрев", "version", "1"),
+)
+# Столбцы таблицы: (название, этап, этап, от конца которого считается длительность)
+COLUMNS = (
+    ("импорт", "imports", None),
+    ("хранилище", "storage", "imports"),
+    ("1-е обновление", "first_update", "connected"),
+    ("прогрев", "prewarm", "storage"),
+    ("до готовности", "ready", None),
+)
+
+
+def bot_env(tmp: str, prewarm: str = "1") -> dict:
+    env = dict(os.environ)
+    env.update({
+        "BOT_API": "123456:bench",
+        "LOG_FILE": os.path.join(tmp, "bot.log"),
+        "LOG_CONSOLE": "0",
+        "SESSION_STORE": "memory",
+        "METRICS_PORT": "0",
+        "PREWARM": prewarm,
+    })
+    return env
+
+
+def import_report(tmp: str, top: int):
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import bot"],
+                            env=bot_env(tmp), capture_output=True, text=True, check=True)
+    entries = []
+    for line in result.stderr.splitlines():
+        match = IMPORT_LINE.match(line)
+        if match:
+            entries.append((int(match[1]), int(match[2]), len(match[3]), match[4]))
+
+    total = next(cumulative for _, cumulative, _, name in entries if name == "bot")
+    print(f"import bot: {total / 1000:.1f} мс, модулей: {len(entries)}")
+    # Отступ в выводе importtime растёт на 2 с каждым уровнем вложенности; у bot он 1
+    direct = sorted((e for e in entries if e[2] == 3), key=lambda e: -e[1])[:top]
+    print(f"\n{'импорт в bot.py':<28} {'всего, мс':>10}")
+    for _, cumulative, _, name in direct:
+        print(f"{name:<28} {cumulative / 1000:>10.1f}")
+    slowest = sorted(entries, key=lambda e: -e[0])[:top]
+    print(f"\n{'модуль':<28} {'свой, мс':>10}")
+    for own, _, _, name in slowest:
+        print(f"{name:<28} {own / 1000:>10.1f}")
+
+
+def child(schema: str, db_path: str, connect_ms: float):
+    """
+    Запуск бота в отдельном процессе. Печатает этапы запуска в JSON.
+    """
+    # Как в bot.py: отсчёт начинается до импорта telebot и модулей бота
+    from utils import startup
+    from benchmarks.bench_handlers import StubApi, message_update
+    import bot
+    from utils import database
+
+    database.db_path = db_path
+    if schema == "ddl":
+        # Прежнее поведение: CREATE TABLE IF NOT EXISTS и проверка миграций при каждом запуске
+        database.ensure_schema = database.create_tables
+    bot.api = StubApi()
+    bot.bot.remove_webhook = lambda: None
+
+    def polling():
+        time.sleep(connect_ms / 1000)
+        startup.mark("connected")
+        bot.bot.process_new_updates([message_update(1, 10 ** 9, "/start_quiz")])
+
+    bot.bot.infinity_polling = polling
+    bot.run()
+    print(json.dumps({phase: seconds * 1000 for phase, seconds in startup.phases.items()}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="запусков на вариант")
+    parser.add_argument("--top", type=int, default=10, help="строк в отчёте об импорте")
+    parser.add_argument("--connect-ms", type=float, default=100, help="задержка до первого обновления после запуска")
+    parser.add_argument("--child", nargs=2, metavar=("SCHEMA", "DB"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        child(*args.child, args.connect_ms)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        import_report(tmp, args.top)
+
+        # Все запуски работают с копией базы; первый (прогревочный) доводит её схему до последней версии
+        db_path = os.path.join(tmp, "database.db")
+        shutil.copy("storage/database.db", db_path)
+
+        def launch(schema: str, prewarm: str) -> dict:
+            result = subprocess.run(
+                [sys.executable, "-m", "benchmarks.bench_startup", "--child", schema, db_path,
+                 "--connect-ms", str(args.connect_ms)],
+                env=bot_env(tmp, prewarm), capture_output=True, text=True, check=True)
+            return json.loads(result.stdout.strip().splitlines()[-1])
+
+        launch("version", "1")
+        print(f"\nдлительность этапов, мс (медиана по {args.runs} запускам); 1-е обновление — обработка после подключения")
+        print(f"{'вариант':<32}" + "".join(f"{title:>16}" for title, _, _ in COLUMNS))
+        for name, schema, prewarm in MODES:
+            runs = [launch(schema, prewarm) for _ in range(args.runs)]
+            row = ""
+            for _, phase, since in COLUMNS:
+                values = [run[phase] - (run[since] if since else 0) for run in runs if phase in run]
+                row += f"{statistics.median(values):>16.2f}" if values else f"{'—':>16}"
+            print(f"{name:<32}{row}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Проверка webhook-режима на локальном «поддельном Telegram».
+
+Поднимает WebhookServer на свободном порту и отправляет в него синтетические обновления
+из нескольких потоков, как это делает Telegram. Показывает, сколько обновлений принято,
+сколько отклонено с 503 из-за заполненной очереди и что запросы без секрета получают 403.
+
+Запуск: python -m benchmarks.bench_webhook [--updates 2000] [--senders 16] [--queue-size 100] [--handler-ms 2]
+"""
+import argparse
+import json
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.webhook import SECRET_HEADER, WebhookServer
+
+SECRET = "local-test-secret"
+
+
+def synthetic_update(update_id: int) -> dict:
+    user_id = 1000 + update_id % 50
+    return {
+        "update_id": update_id,
+        "callback_query": {
+            "id": str(update_id),
+            "from": {"id": user_id, "is_bot": False, "first_name": "test"},
+            "chat_instance": "1",
+            "data": "hint_1",
+        },
+    }
+
+
+def post(port: int, payload: dict, secret: str = SECRET) -> int:
+    request = urllib.request.Request(
+        f"http://127.0.0.1:{port}/webhook",
+        data=json.dumps(payload).encode(),
+        headers={"Content-Type": "application/json", SECRET_HEADER: secret},
+    )
+    try:
+        with urllib.request.urlopen(request, timeout=10) as response:
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--updates", type=int, default=2000)
+    parser.add_argument("--senders", type=int, default=16)
+    parser.add_argument("--queue-size", type=int, default=100)
+    parser.add_argument("--handler-ms", type=float, default=2.0)
+    args = parser.parse_args()
+
+    handled = []
+    lock = threading.Lock()
+
+    def on_update(update):
+        time.sleep(args.handler_ms / 1000)
+        with lock:
+            handled.append(update["update_id"])
+
+    server = WebhookServer(on_update, host="127.0.0.1", port=0, secret_token=SECRET,
+                           queue_size=args.queue_size, put_timeout=0.05)
+    server.start()
+
+    assert post(server.port, synthetic_update(0), secret="wrong") == 403, "Запрос с неверным секретом должен получить 403"
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(args.senders) as pool:
+        statuses = list(pool.map(lambda i: post(server.port, synthetic_update(i)), range(1, args.updates + 1)))
+    elapsed = time.perf_counter() - started
+    server.stop()
+
+    accepted = statuses.count(200)
+    print(f"отправлено: {args.updates} за {elapsed:.2f} с ({args.updates / elapsed:.0f} запросов/с)")
+    print(f"принято: {accepted}, отклонено с 503: {statuses.count(503)}, обработано: {len(handled)}")
+    assert len(handled) == accepted == server.accepted, "Каждое принятое обновление должно быть обработано"
+
+
+if __name__ == "__main__":
+    main()
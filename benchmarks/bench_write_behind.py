@@ -0,0 +1,79 @@
+"""
+Бенчмарк отложенной записи прогресса.
+
+Несколько потоков одновременно проходят квиз за разных пользователей, вызывая
+delete_user_progress, add_user_progress и complete_question, сначала с фиксацией каждой записи,
+затем через очередь отложенной записи. Проверяет, что пользователь сразу видит свои
+незаписанные ответы через get_completed_questions, а после остановки очереди
+в базе оказывается тот же прогресс, что и без неё.
+
+Запуск: python -m benchmarks.bench_write_behind [--users 400] [--questions 25] [--threads 16] [--flush-ms 50] [--flush-rows 500]
+"""
+import argparse
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from utils import database
+
+
+def play(user: int, questions: int):
+    database.delete_user_progress(user)
+    database.add_user_progress(user, 1, start_time=1000)
+    for question_id in range(1, questions + 1):
+        database.complete_question(user, question_id)
+        if question_id < questions:
+            database.add_user_progress(user, question_id + 1, start_time=1000 + question_id)
+        # Свои записи видны сразу, даже если они ещё в очереди
+        assert len(database.get_completed_questions(user)) == question_id, "Пользователь должен видеть свои ответы"
+
+
+def run(args) -> float:
+    started = time.perf_counter()
+    with ThreadPoolExecutor(args.threads) as pool:
+        list(pool.map(lambda user: play(user, args.questions), range(args.users)))
+    return time.perf_counter() - started
+
+
+def snapshot() -> list:
+    return database.get_connection().execute(
+        "SELECT tg_id, question_id, start_time, is_completed FROM UserProgress ORDER BY tg_id, question_id"
+    ).fetchall()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=400)
+    parser.add_argument("--questions", type=int, default=25)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--flush-ms", type=int, default=50)
+    parser.add_argument("--flush-rows", type=int, default=500)
+    args = parser.parse_args()
+    writes = args.users * (args.questions * 2 + 1)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database.db_path = os.path.join(tmp, "bench.db")
+        database.create_tables()
+
+        direct = run(args)
+        expected = snapshot()
+
+        database.enable_write_behind(args.flush_ms / 1000, args.flush_rows)
+        queue = database._progress_queue
+        queued = run(args)
+        started = time.perf_counter()
+        database.drain_write_behind()
+        drain = time.perf_counter() - started
+        actual = snapshot()
+        database.close_connections()
+
+    print(f"пользователей: {args.users}, записей: {writes}, потоков: {args.threads}")
+    print(f"каждая запись фиксируется сразу: {direct:.2f} с ({writes / direct:.0f} записей/с)")
+    print(f"отложенная запись:             {queued:.2f} с ({writes / queued:.0f} записей/с), "
+          f"транзакций: {queue.flushes}, остановка: {drain * 1000:.0f} мс")
+    assert actual == expected, "После остановки очереди прогресс в базе должен совпадать"
+
+
+if __name__ == "__main__":
+    main()
@@ -1,126 +1,162 @@
+# Отсчёт времени запуска начинается до импорта telebot и модулей бота
+from utils import startup
+import sys
+from utils.config import RUNTIME
+
+if __name__ == "__main__" and RUNTIME == "async":
+    # Асинхронный режим на AsyncTeleBot выбирается до импорта и создания объектов синхронного бота:
+    # хранилища, сессий с потоком записи, диспетчера и TeleBot
+    import runpy
+    runpy.run_module("async_bot", run_name="__main__")
+    sys.exit()
+
+import io
 import json
-import os
 import time
 import logging
 import re
-from telebot import TeleBot, types
-from dotenv import load_dotenv
-from utils.database import (
-    create_tables, add_user, delete_user_progress, get_question, check_answer,
-    complete_question, add_user_progress, get_completed_questions, get_all_questions,
-    get_my_info, add_to_top, get_top, delete_question, add_question, calculate_total_time, get_all_users
+import threading
+from telebot import TeleBot, types, util
+from telebot.apihelper import ApiTelegramException
+from utils.config import (
+    BOT_TOKEN, WORKERS, MAX_PENDING_UPDATES, is_admin,
+    API_GLOBAL_RATE, API_CHAT_RATE, API_CHAT_BURST, API_MAX_RETRIES,
+    SESSION_STORE, SESSION_TTL, SESSION_FLUSH_INTERVAL,
+    UPDATES_MODE, WEBHOOK_URL, WEBHOOK_HOST, WEBHOOK_PORT, WEBHOOK_PATH, WEBHOOK_SECRET, WEBHOOK_QUEUE_SIZE,
+    METRICS_PORT, METRICS_FILE, METRICS_DUMP_INTERVAL, PREWARM, SHUFFLE_QUESTIONS, SHUFFLE_OPTIONS,
+    BROADCAST_RATE, BROADCAST_WORKERS, BROADCAST_CHUNK
 )
+from utils import metrics
+from utils.callbacks import (
+    CallbackRouter, ANSWER, HINT, ADMIN, DELETE_QUESTION, ADD_QUESTION, QUESTIONS_PAGE, USERS_PAGE,
+    START_QUIZ, BROADCAST_CANCEL, PAGE_BEFORE, ADMIN_ACTIONS, new_nonce, is_stale_nonce
+)
+from utils.storage import get_storage
+from utils.broadcast import Broadcaster
+from utils.dispatcher import UpdateDispatcher
+from utils.images import is_file_id_rejected, prepare_image
+from utils.keyboards import (
+    ADMIN_PAGE_SIZE, generate_admin_menu, questions_keyboard, users_keyboard, back_keyboard, quizzes_keyboard,
+    broadcast_keyboard
+)
+from utils.log import setup_logging, log_action
+from utils.messages import messages, format_time, format_tops, format_page, quiz_header, format_broadcast
+from utils.ordering import (
+    QuestionOrder, order_from_session, order_to_session, first_question_id, question_number
+)
+from utils.outbound import OutboundScheduler, RateLimitedBot
+from utils.pagination import make_page
+from utils.payloads import question_payload
+from utils.question_io import detect_format, import_questions, get_or_create_quiz
+from utils.quizzes import DEFAULT_QUIZ_ID
+from utils.sessions import create_session_store, quiz_key, admin_key
 
 # Настройка логирования
-logging.basicConfig(
-    level=logging.INFO,
-    format="[%(levelname)s](%(asctime)s) - %(message)s",
-    datefmt="%Y.%m.%d %H:%M:%S",
-    handlers=[
-        logging.FileHandler("bot.log"),
-        logging.StreamHandler()
-    ]
-)
+setup_logging()
 
-admin_state = {}
-
-# Загрузка переменных окружения
-load_dotenv()
-BOT_TOKEN = os.getenv("BOT_API")
-ADMIN_IDS = [int(id.strip()) for id in os.getenv("ADMIN", "").split(",") if id.strip()]
-bot = TeleBot(BOT_TOKEN)
-
-# Сообщения
-messages = {
-    "start": "🚀 **Добро пожаловать в космический квиз-бот!**\n\n🌌 Здесь вы сможете проверить свои знания о космосе и сразиться за место в топе. Используйте команду /help, чтобы узнать больше о возможностях бота.",
-    "help": "📋 **Доступные команды:**\n\n"
-            "▶️ /start\_quiz - Начать новую викторину\n"
-            "📊 /stats - Посмотреть вашу статистику\n"
-            "🎁 /get\_prize - Получить награду за прохождение\n"
-            "👨💻 /author - Узнать об авторе бота\n"
-            "🔧 /admin - Админ-панель (только для администраторов)",
-    "prize_success": "🎉 **Поздравляем с завершением квиза!**\n\n"
-                     "🌟 Вы успешно прошли все вопросы! Пока что награда — это ваша гордость и знания, но в будущем вас ждут сюрпризы. Попробуйте улучшить свой результат и занять первое место в топе! 🏆",
-    "prize_failure": "❌ **Не все вопросы пройдены!**\n\n"
-                     "📊 Выполнено: {}/{}\n"
-                     "Продолжайте отвечать на вопросы, чтобы получить награду! 💪",
-    "no_questions": "❌ **Вопросы не найдены!**\n\n"
-                    "⚠️ Обратитесь к администратору за помощью. Контактные данные можно найти в разделе /author.",
-    "author": "👨💻 **Разработчик бота:**\n\n"
-              "• **ФИО:** Горшков Константин Алексеевич\n"
-              "• **Telegram:** [@Kos000113](https://t.me/Kos000113)\n"
-              "• **GitHub:** [kostya2023](https://github.com/kostya2023)\n"
-              "• **Проект:** [space_quiz_bot](https://github.com/kostya2023/telegram_space_quiz_bot)",
-    "stats": "📊 **Ваша статистика:**\n\n"
-             "• Пройдено вопросов: {}\n"
-             "• Общее время: {}\n"
-             "• Место в топе: {}",
-    "correct_answer": "✅ **Правильно!**\n\n"
-                      "🎉 Вы справились! Переходим к следующему вопросу!",
-    "incorrect_answer": "❌ **Неверно!**\n\n"
-                        "😔 Попробуйте ещё раз или переходите к следующему вопросу.",
-    "quiz_completed": "🎉 **Квиз завершён!**\n\n"
-                      "⏱️ Ваше время: {} секунд\n"
-                      "🏆 Ваш результат добавлен в топ!",
-    "admin": {
-        "access_denied": "⛔ **Доступ запрещён!**\n\n"
-                         "Эта команда доступна только администраторам.",
-        "panel": "🔧 **Админ-панель:**\n\n"
-                 "Выберите действие:",
-        "questions_list": "📚 **Список вопросов:**\n\n",
-        "users_list": "👥 **Список пользователей:**\n\n",
-        "top_users": "🏆 **Топ-10 пользователей:**\n\n",
-        "question_deleted": "🗑️ **Вопрос успешно удалён!**",
-        "question_added": "📝 **Вопрос успешно добавлен!**",
-        "error": "❌ **Произошла ошибка!**\n\n"
-                 "Пожалуйста, попробуйте ещё раз или свяжитесь с разработчиком.",
-        "invalid_format": "⚠️ **Неверный формат данных!**\n\n"
-                          "Пример правильного формата:\n"
-                          "`Вопрос; вариант1; вариант2; вариант3; вариант4; правильный_ответ`",
-        "add_question_instruction": "📝 **Добавление нового вопроса:**\n\n"
-                                    "Введите вопрос в формате:\n"
-                                    "`Вопрос; вариант1; вариант2; вариант3; вариант4; правильный_ответ`"
-    }
-}
+# Обновления обрабатывает собственный диспетчер, поэтому пул потоков telebot отключён
+bot = TeleBot(BOT_TOKEN, threaded=False)
+dispatcher = UpdateDispatcher(WORKERS, max_pending=MAX_PENDING_UPDATES)
+
+# Запросы к Telegram из обработчиков идут через планировщик с лимитами API и повторами после 429
+api = RateLimitedBot(bot, OutboundScheduler(
+    global_rate=API_GLOBAL_RATE, global_burst=int(API_GLOBAL_RATE),
+    chat_rate=API_CHAT_RATE, chat_burst=API_CHAT_BURST, max_retries=API_MAX_RETRIES,
+    # Рассылка занимает не больше BROADCAST_RATE сообщений в секунду, остальное остаётся квизу
+    low_rate=BROADCAST_RATE,
+))
 
 # Состояния пользователей
 user_attempts = {}  # Счетчик попыток для каждого пользователя
-user_start_time = {}  # Время начала прохождения квиза
 
-def log_action(action: str, user_id: int, details: str = ""):
-    logging.info(f"ACTION: {action} | USER_ID: {user_id} | DETAILS: {details}")
+# Хранилище данных (SQLite или PostgreSQL по настройке STORAGE)
+storage = get_storage()
+metrics.instrument_storage(storage)
+
+# Сессии (начатый квиз, состояние админ-диалога) переживают перезапуск бота
+sessions = create_session_store(SESSION_STORE, SESSION_TTL, SESSION_FLUSH_INTERVAL)
 
-def is_admin(user_id: int) -> bool:
-    return user_id in ADMIN_IDS
+# Нажатия кнопок: callback_data разбирается один раз и направляется в обработчик по коду действия
+callbacks = CallbackRouter()
 
-def format_time(seconds: int) -> str:
-    minutes = seconds // 60
-    seconds = seconds % 60
-    return f"{minutes} мин {seconds} сек"
+def notify_broadcast_finished(broadcast):
+    if broadcast.created_by:
+        api.send_message(int(broadcast.created_by), format_broadcast(broadcast))
+
+# Рассылки идут в своих потоках и с низким приоритетом, не занимая потоки диспетчера
+broadcaster = Broadcaster(storage, api.background("send_message"), workers=BROADCAST_WORKERS,
+                          chunk_size=BROADCAST_CHUNK, on_finish=notify_broadcast_finished)
+
+def is_stale(user_id, nonce):
+    """
+    Проверяет, что кнопка вопроса отправлена в прошлом прохождении квиза.
+    """
+    return nonce is not None and is_stale_nonce(sessions.get(quiz_key(user_id)), nonce)
+
+def command_quiz(message):
+    """
+    Квиз, к которому относится команда: указанный после неё slug, квиз текущего прохождения
+    или основной квиз. Если квиза с указанным slug нет, сообщает об этом.
+
+    :return: Квиз, или None.
+    """
+    slug = util.extract_arguments(message.text or "")
+    if slug:
+        quiz = storage.get_quiz_by_slug(slug)
+        if quiz is None:
+            send_unknown_quiz(message.chat.id, slug)
+        return quiz
+    session = sessions.get(quiz_key(message.from_user.id))
+    quiz = storage.get_quiz(session.get("quiz_id", DEFAULT_QUIZ_ID)) if session else None
+    return quiz or storage.get_quiz(DEFAULT_QUIZ_ID)
+
+def send_unknown_quiz(chat_id, slug):
+    slugs = ", ".join(quiz.slug for quiz in storage.get_quizzes())
+    api.send_message(chat_id, messages["unknown_quiz"].format(slug, slugs))
 
 def send_question(chat_id, question, question_id, user_id, message_id=None):
     """
     Отправляет вопрос с вариантами ответов.
     """
-    keyboard = types.InlineKeyboardMarkup()
-    for idx, option in enumerate(question["options"]):
-        keyboard.add(types.InlineKeyboardButton(option, callback_data=f"answer_{question_id}_{idx + 1}"))
-    keyboard.add(types.InlineKeyboardButton("💡 Подсказка", callback_data=f"hint_{question_id}"))
-
-    image_path = question.get("image_path")
-    if not image_path or not os.path.exists(image_path):
-        image_path = "imgs/photo_not_found.jpg"
+    # Подпись, клавиатура и путь к картинке собраны заранее для текущей версии каталога
+    payload = question_payload(storage.get_question_catalog(), question_id, question)
+    # В кнопки подставляется nonce текущего прохождения, а варианты ответа идут в порядке прохождения
+    session = sessions.get(quiz_key(user_id))
+    order = order_from_session(session)
+    reply_markup = payload.reply_markup_for(session.get("nonce", 0) if session else 0,
+                                            order.option_order(question_id) if order else None)
+    # Номер в подписи — место вопроса в прохождении, а не его ID
+    quiz = storage.get_quiz(session.get("quiz_id", DEFAULT_QUIZ_ID) if session else DEFAULT_QUIZ_ID)
+    number = question_number(quiz, question_id, order) if quiz else None
+    caption = payload.caption_for(number, len(quiz.question_ids) if quiz else None)
 
     if message_id:
         try:
-            bot.delete_message(chat_id, message_id)
+            api.delete_message(chat_id, message_id)
         except Exception as e:
             logging.error(f"Ошибка при удалении сообщения: {e}")
 
-    question_text = f"❓ Вопрос {question_id}: {question['question_text']}"
-
-    with open(image_path, "rb") as photo:
-        bot.send_photo(chat_id, photo, caption=question_text, reply_markup=keyboard, parse_mode="Markdown")
+    # Отправляется уменьшенная и пережатая копия картинки (utils.images).
+    # Если копия уже загружалась и не менялась, отправляем её по file_id
+    image_path = payload.image_path
+    image = prepare_image(image_path)
+    file_id = storage.get_image_file_id(image_path, image.content_hash)
+    if file_id:
+        try:
+            api.send_photo(chat_id, file_id, caption=caption, reply_markup=reply_markup,
+                           parse_mode=payload.parse_mode)
+            return
+        except ApiTelegramException as e:
+            # Лимит или сбой Telegram не делает file_id неверным: его нельзя забывать
+            if not is_file_id_rejected(e):
+                raise
+            logging.error(f"file_id для {image_path} не принят, загружаем файл заново: {e}")
+            storage.forget_image_file_id(image_path)
+
+    with open(image.path, "rb") as photo:
+        sent = api.send_photo(chat_id, photo, caption=caption, reply_markup=reply_markup,
+                              parse_mode=payload.parse_mode)
+    storage.save_image_file_id(image_path, image.content_hash, sent.photo[-1].file_id)
 
 @bot.message_handler(commands=["start"])
 def send_welcome(message):
@@ -128,7 +164,7 @@ def send_welcome(message):
     Обработчик команды /start.
     """
     log_action("start", message.from_user.id)
-    bot.send_message(message.chat.id, messages["start"], parse_mode="Markdown", reply_markup=types.ReplyKeyboardRemove())
+    api.send_message(message.chat.id, messages["start"], parse_mode="Markdown", reply_markup=types.ReplyKeyboardRemove())
 
 @bot.message_handler(commands=["help"])
 def show_help(message):
@@ -136,7 +172,7 @@ def show_help(message):
     Обработчик команды /help.
     """
     log_action("help", message.from_user.id)
-    bot.send_message(message.chat.id, messages["help"], parse_mode="Markdown")
+    api.send_message(message.chat.id, messages["help"], parse_mode="Markdown")
 
 @bot.message_handler(commands=["get_prize"])
 def prize(message):
@@ -144,40 +180,78 @@ def prize(message):
     Обработчик команды /get_prize.
     """
     user_id = message.from_user.id
-    completed = get_completed_questions(user_id)
-    total_questions = len(get_all_questions())
+    quiz = command_quiz(message)
+    if quiz is None:
+        return
+    completed = storage.get_completed_questions(user_id, quiz.quiz_id)
+    total_questions = storage.get_questions_count(quiz.quiz_id)
+    header = quiz_header(quiz, len(storage.get_quizzes()))
     
     if len(completed) == total_questions and total_questions > 0:
-        bot.send_message(message.chat.id, messages["prize_success"], parse_mode="Markdown")
+        api.send_message(message.chat.id, header + messages["prize_success"], parse_mode="Markdown")
     else:
-        bot.send_message(message.chat.id, messages["prize_failure"].format(len(completed), total_questions), parse_mode="Markdown")
+        api.send_message(message.chat.id, header + messages["prize_failure"].format(len(completed), total_questions), parse_mode="Markdown")
 
 @bot.message_handler(commands=["start_quiz"])
 def start_quiz(message):
     """
-    Обработчик команды /start_quiz.
+    Обработчик команды /start_quiz [slug]. Если квизов несколько и квиз не указан, предлагает выбрать квиз.
     """
-    user_id = message.from_user.id
-    log_action("start_quiz", user_id)
-    
-    delete_user_progress(user_id)
-    add_user(user_id, message.from_user.username)
-    
-    question = get_question(1)
+    if util.extract_arguments(message.text or ""):
+        quiz = command_quiz(message)
+        if quiz is None:
+            return
+    else:
+        quizzes = storage.get_quizzes()
+        if len(quizzes) > 1:
+            api.send_message(message.chat.id, messages["choose_quiz"], parse_mode="Markdown",
+                             reply_markup=quizzes_keyboard(quizzes))
+            return
+        quiz = quizzes[0] if quizzes else None
+    begin_quiz(message.chat.id, message.from_user, quiz)
+
+@callbacks.register(START_QUIZ)
+def choose_quiz(call, quiz_id):
+    """
+    Обработчик выбора квиза из списка.
+    """
+    api.answer_callback_query(call.id)
+    begin_quiz(call.message.chat.id, call.from_user, storage.get_quiz(quiz_id))
+
+def begin_quiz(chat_id, user, quiz):
+    """
+    Начинает квиз заново: сбрасывает прогресс пользователя по вопросам квиза и отправляет первый вопрос.
+    Порядок вопросов и вариантов ответа в прохождении задаёт seed, который хранится в сессии.
+    """
+    user_id = user.id
+    log_action("start_quiz", user_id, quiz.slug if quiz else "")
+
+    order = None
+    if SHUFFLE_QUESTIONS or SHUFFLE_OPTIONS:
+        order = QuestionOrder.new(quiz, SHUFFLE_QUESTIONS, SHUFFLE_OPTIONS)
+    question_id = first_question_id(quiz, order) if quiz else None
+    question = storage.get_question(question_id) if question_id is not None else None
     if not question:
-        bot.send_message(message.chat.id, messages["no_questions"], parse_mode="Markdown")
+        api.send_message(chat_id, messages["no_questions"], parse_mode="Markdown")
         return
 
-    user_start_time[user_id] = int(time.time())
-    add_user_progress(user_id, 1, start_time=user_start_time[user_id])
-    send_question(message.chat.id, question, 1, user_id)
+    storage.delete_user_progress(user_id, quiz.quiz_id)
+    storage.add_user(user_id, user.username)
+
+    started_at = int(time.time())
+    session = {"started_at": started_at, "nonce": new_nonce(), "quiz_id": quiz.quiz_id}
+    if order is not None:
+        session["order"] = order_to_session(order)
+    sessions.set(quiz_key(user_id), session)
+    storage.add_user_progress(user_id, question_id, start_time=started_at)
+    send_question(chat_id, question, question_id, user_id)
 
 @bot.message_handler(commands=["author"])
 def author(message):
     """
     Обработчик команды /author.
     """
-    bot.send_message(
+    api.send_message(
         message.chat.id,
         messages["author"],
         parse_mode="Markdown",
@@ -190,109 +264,104 @@ def show_stats(message):
     Обработчик команды /stats.
     """
     user_id = message.from_user.id
-    stats = get_my_info(user_id)
-    completed = get_completed_questions(user_id)
+    quiz = command_quiz(message)
+    if quiz is None:
+        return
+    stats = storage.get_my_info(user_id, quiz.quiz_id)
+    completed = storage.get_completed_questions(user_id, quiz.quiz_id)
     
     total_time = stats["total_time"]
     formatted_time = format_time(total_time) if total_time != "Нет данных" else "Нет данных"
     
-    bot.send_message(message.chat.id, messages["stats"].format(
+    api.send_message(message.chat.id, quiz_header(quiz, len(storage.get_quizzes())) + messages["stats"].format(
         len(completed),
         formatted_time,
         stats["place"] if stats["place"] != "Нет данных" else "🚫"
     ), parse_mode="Markdown")
 
-def generate_admin_menu():
-    """
-    Генерирует меню администратора.
-    """
-    keyboard = types.InlineKeyboardMarkup(row_width=2)
-    keyboard.add(
-        types.InlineKeyboardButton("📝 Управление вопросами", callback_data="admin_questions"),
-        types.InlineKeyboardButton("👥 Пользователи", callback_data="admin_users"),
-        types.InlineKeyboardButton("📊 Топ-10", callback_data="admin_stats"),
-        types.InlineKeyboardButton("❌ Закрыть", callback_data="admin_close")
-    )
-    return keyboard
-
 @bot.message_handler(commands=["admin"])
 def admin_panel(message):
     """
     Обработчик команды /admin.
     """
     if not is_admin(message.from_user.id):
-        bot.send_message(message.chat.id, messages["admin"]["access_denied"], parse_mode="Markdown")
+        api.send_message(message.chat.id, messages["admin"]["access_denied"], parse_mode="Markdown")
         return
 
     log_action("admin", message.from_user.id)
-    bot.send_message(
+    api.send_message(
         message.chat.id,
         messages["admin"]["panel"],
         parse_mode="Markdown",
         reply_markup=generate_admin_menu()
     )
 
-@bot.callback_query_handler(func=lambda call: call.data.startswith("admin_"))
-def handle_admin_actions(call):
+def show_questions(call, page=0, backward=False, cursor=0):
+    """
+    Показывает страницу списка вопросов после курсора (или перед ним при листании назад).
+    """
+    if backward:
+        rows = storage.get_questions_page(limit=ADMIN_PAGE_SIZE + 1, before_id=cursor)
+    else:
+        rows = storage.get_questions_page(cursor, ADMIN_PAGE_SIZE + 1)
+    current = make_page(rows, ADMIN_PAGE_SIZE, page, backward)
+    if not current.items and cursor:
+        # Страница опустела после удалений — показываем начало списка
+        return show_questions(call)
+    api.edit_message_text(
+        chat_id=call.message.chat.id,
+        message_id=call.message.message_id,
+        text=format_page(messages["admin"]["questions_list"], current, storage.get_questions_count(), ADMIN_PAGE_SIZE),
+        reply_markup=questions_keyboard(current)
+    )
+
+def show_users(call, page=0, backward=False, cursor=None):
+    """
+    Показывает страницу списка пользователей после курсора (или перед ним при листании назад).
+    """
+    if backward:
+        rows = storage.get_users_page(limit=ADMIN_PAGE_SIZE + 1, before_id=cursor)
+    else:
+        rows = storage.get_users_page(cursor, ADMIN_PAGE_SIZE + 1)
+    current = make_page(rows, ADMIN_PAGE_SIZE, page, backward)
+    if not current.items and cursor:
+        return show_users(call)
+    api.edit_message_text(
+        chat_id=call.message.chat.id,
+        message_id=call.message.message_id,
+        text=format_page(messages["admin"]["users_list"], current, storage.get_users_count(), ADMIN_PAGE_SIZE),
+        reply_markup=users_keyboard(current)
+    )
+
+@callbacks.register(ADMIN)
+def handle_admin_actions(call, action_index):
     """
     Обработчик действий администратора.
     """
     user_id = call.from_user.id
     if not is_admin(user_id):
-        bot.answer_callback_query(call.id, messages["admin"]["access_denied"])
+        api.answer_callback_query(call.id, messages["admin"]["access_denied"])
         return
 
-    action = call.data.split("_")[1]
+    action = ADMIN_ACTIONS[action_index] if action_index < len(ADMIN_ACTIONS) else None
     
     if action == "questions":
-        questions = get_all_questions()
-        keyboard = types.InlineKeyboardMarkup()
-        for q in questions:
-            keyboard.add(types.InlineKeyboardButton(
-                f"❌ Вопрос {q['question_id']}: {q['question_text'][:20]}...",
-                callback_data=f"delete_question_{q['question_id']}"
-            ))
-        keyboard.add(
-            types.InlineKeyboardButton("➕ Добавить вопрос", callback_data="add_question"),
-            types.InlineKeyboardButton("🔙 Назад", callback_data="admin_back")
-        )
-        bot.edit_message_text(
-            chat_id=call.message.chat.id,
-            message_id=call.message.message_id,
-            text=messages["admin"]["questions_list"],
-            reply_markup=keyboard
-        )
+        show_questions(call)
     
     elif action == "users":
-        users = get_all_users()
-        keyboard = types.InlineKeyboardMarkup()
-        for user in users:
-            keyboard.add(types.InlineKeyboardButton(
-                f"👤 {user['username']} (ID: {user['tg_id']})",
-                callback_data=f"user_detail_{user['tg_id']}"
-            ))
-        keyboard.add(types.InlineKeyboardButton("🔙 Назад", callback_data="admin_back"))
-        bot.edit_message_text(
-            chat_id=call.message.chat.id,
-            message_id=call.message.message_id,
-            text=messages["admin"]["users_list"],
-            reply_markup=keyboard
-        )
+        show_users(call)
     
     elif action == "stats":
-        top = get_top()
-        text = messages["admin"]["top_users"]
-        for place, data in top.items():
-            text += f"{place}. {data['Name_user']} — {data['total_time']} сек\n"
-        bot.edit_message_text(
+        api.edit_message_text(
             chat_id=call.message.chat.id,
             message_id=call.message.message_id,
-            text=text,
-            reply_markup=types.InlineKeyboardMarkup().add(types.InlineKeyboardButton("🔙 Назад", callback_data="admin_back"))
+            # Сообщение Telegram — не больше 4096 символов
+            text=format_tops([(quiz, storage.get_top(quiz_id=quiz.quiz_id)) for quiz in storage.get_quizzes()])[:4096],
+            reply_markup=back_keyboard()
         )
     
     elif action == "back":
-        bot.edit_message_text(
+        api.edit_message_text(
             chat_id=call.message.chat.id,
             message_id=call.message.message_id,
             text=messages["admin"]["panel"],
@@ -300,32 +369,65 @@ def handle_admin_actions(call):
         )
     
     elif action == "close":
-        bot.delete_message(call.message.chat.id, call.message.message_id)
+        api.delete_message(call.message.chat.id, call.message.message_id)
+
+    elif action == "broadcast":
+        sessions.set(admin_key(user_id), "waiting_broadcast")
+        api.send_message(call.message.chat.id, messages["admin"]["broadcast_instruction"])
 
-@bot.callback_query_handler(func=lambda call: call.data.startswith("delete_question_"))
-def delete_question_callback(call):
+@callbacks.register(DELETE_QUESTION)
+def delete_question_callback(call, question_id, page=0, cursor=0):
     """
-    Обработчик удаления вопроса.
+    Обработчик удаления вопроса. Кнопки старого формата передают только ID вопроса,
+    тогда список открывается с первой страницы.
     """
-    question_id = int(call.data.split("_")[2])
-    if delete_question(question_id):
-        bot.answer_callback_query(call.id, messages["admin"]["question_deleted"])
-        handle_admin_actions(call)
+    if not is_admin(call.from_user.id):
+        api.answer_callback_query(call.id, messages["admin"]["access_denied"])
+        return
+
+    if storage.delete_question(question_id):
+        api.answer_callback_query(call.id, messages["admin"]["question_deleted"])
+        # Обновляем ту же страницу списка вопросов
+        show_questions(call, page, cursor=cursor)
     else:
-        bot.answer_callback_query(call.id, messages["admin"]["error"])
+        api.answer_callback_query(call.id, messages["admin"]["error"])
 
-@bot.callback_query_handler(func=lambda call: call.data == "add_question")
+@callbacks.register(QUESTIONS_PAGE)
+def questions_page_callback(call, page, direction, cursor):
+    """
+    Обработчик листания списка вопросов.
+    """
+    if not is_admin(call.from_user.id):
+        api.answer_callback_query(call.id, messages["admin"]["access_denied"])
+        return
+    show_questions(call, page, direction == PAGE_BEFORE, cursor)
+
+@callbacks.register(USERS_PAGE)
+def users_page_callback(call, page, direction, cursor):
+    """
+    Обработчик листания списка пользователей.
+    """
+    if not is_admin(call.from_user.id):
+        api.answer_callback_query(call.id, messages["admin"]["access_denied"])
+        return
+    show_users(call, page, direction == PAGE_BEFORE, str(cursor))
+
+@callbacks.register(ADD_QUESTION)
 def ask_new_question(call):
     """
     Обработчик добавления нового вопроса.
     """
-    admin_state[call.from_user.id] = "waiting_question"
-    bot.send_message(
+    if not is_admin(call.from_user.id):
+        api.answer_callback_query(call.id, messages["admin"]["access_denied"])
+        return
+
+    sessions.set(admin_key(call.from_user.id), "waiting_question")
+    api.send_message(
         call.message.chat.id,
         messages["admin"]["add_question_instruction"]
     )
 
-@bot.message_handler(func=lambda m: admin_state.get(m.from_user.id) == "waiting_question")
+@bot.message_handler(func=lambda m: is_admin(m.from_user.id) and sessions.get(admin_key(m.from_user.id)) == "waiting_question")
 def add_new_question(message):
     """
     Обработчик добавления нового вопроса.
@@ -335,7 +437,7 @@ def add_new_question(message):
         if len(data) != 6:
             raise ValueError(messages["admin"]["invalid_format"])
         
-        add_question(
+        storage.add_question(
             data[0].strip(),
             data[1].strip(),
             data[2].strip(),
@@ -343,90 +445,216 @@ def add_new_question(message):
             data[4].strip(),
             int(data[5].strip())
         )
-        bot.send_message(message.chat.id, messages["admin"]["question_added"])
-        admin_state[message.from_user.id] = None
+        api.send_message(message.chat.id, messages["admin"]["question_added"])
+        sessions.delete(admin_key(message.from_user.id))
     except Exception as e:
-        bot.send_message(message.chat.id, f"❌ Ошибка: {e}")
+        api.send_message(message.chat.id, f"❌ Ошибка: {e}")
 
-@bot.callback_query_handler(func=lambda call: call.data.startswith("answer_"))
-def handle_answer(call):
+@bot.message_handler(content_types=["document"], func=lambda m: is_admin(m.from_user.id) and sessions.get(admin_key(m.from_user.id)) == "waiting_question")
+def import_questions_file(message):
+    """
+    Обработчик импорта вопросов из файла JSONL или CSV. В подписи к файлу можно указать
+    квиз для новых вопросов: «slug Название».
+    """
+    fmt = detect_format(message.document.file_name or "")
+    if fmt is None:
+        api.send_message(message.chat.id, messages["admin"]["import_unsupported"])
+        return
+
+    try:
+        file_info = api.get_file(message.document.file_id)
+        data = api.download_file(file_info.file_path)
+        stream = io.TextIOWrapper(io.BytesIO(data), encoding="utf-8-sig", newline="")
+        quiz_id = DEFAULT_QUIZ_ID
+        caption = (message.caption or "").strip()
+        if caption:
+            slug, _, title = caption.partition(" ")
+            quiz_id = get_or_create_quiz(storage, slug, title.strip() or None).quiz_id
+        report = import_questions(storage, stream, fmt, quiz_id=quiz_id)
+    except Exception as e:
+        api.send_message(message.chat.id, f"❌ Ошибка: {e}")
+        return
+
+    log_action("import_questions", message.from_user.id, f"{report.written}/{report.rows}")
+    # Сообщение Telegram — не больше 4096 символов
+    api.send_message(message.chat.id, messages["admin"]["import_done"].format(report.summary())[:4096])
+    sessions.delete(admin_key(message.from_user.id))
+
+@bot.message_handler(func=lambda m: is_admin(m.from_user.id) and sessions.get(admin_key(m.from_user.id)) == "waiting_broadcast")
+def start_broadcast(message):
+    """
+    Обработчик текста рассылки.
+    """
+    sessions.delete(admin_key(message.from_user.id))
+    broadcast = broadcaster.start(message.text, message.from_user.id)
+    if broadcast is None:
+        api.send_message(message.chat.id, messages["admin"]["error"])
+        return
+
+    log_action("broadcast", message.from_user.id, str(broadcast.broadcast_id))
+    api.send_message(
+        message.chat.id,
+        messages["admin"]["broadcast_started"].format(broadcast.broadcast_id, storage.get_users_count()),
+        reply_markup=broadcast_keyboard(broadcast.broadcast_id)
+    )
+
+@callbacks.register(BROADCAST_CANCEL)
+def cancel_broadcast(call, broadcast_id):
+    """
+    Обработчик остановки рассылки.
+    """
+    if not is_admin(call.from_user.id):
+        api.answer_callback_query(call.id, messages["admin"]["access_denied"])
+        return
+
+    if broadcaster.cancel(broadcast_id):
+        log_action("broadcast_cancel", call.from_user.id, str(broadcast_id))
+        api.answer_callback_query(call.id, messages["admin"]["broadcast_cancelling"])
+    else:
+        api.answer_callback_query(call.id, messages["admin"]["broadcast_not_running"])
+
+@callbacks.register(ANSWER)
+def handle_answer(call, current_q_id, selected_opt, nonce=None):
     """
     Обработчик ответа на вопрос.
     """
     user_id = call.from_user.id
-    _, current_q_id, selected_opt = call.data.split("_")
-    current_q_id = int(current_q_id)
-    selected_opt = int(selected_opt)
+    if is_stale(user_id, nonce):
+        # Кнопка из прошлого прохождения: отвечаем, не обращаясь к базе
+        api.answer_callback_query(call.id, messages["stale_button"])
+        return
 
-    is_correct = check_answer(current_q_id, selected_opt)
+    # Проверка ответа, завершение вопроса, переход к следующему и обновление топа — одна транзакция
+    order = order_from_session(sessions.get(quiz_key(user_id)))
+    result = storage.record_answer(user_id, current_q_id, selected_opt, username=call.from_user.username, order=order)
 
-    if is_correct:
-        # Если ответ правильный
-        complete_question(user_id, current_q_id)
-        
-        # Получаем описание правильного ответа
-        question = get_question(current_q_id)
-        correct_answer_description = question.get("description", "Описание отсутствует.")
-        
-        # Отправляем сообщение с описанием
-        bot.answer_callback_query(call.id, f"✅ Верно!\n\n{correct_answer_description}", show_alert=True)
-        
-        # Получаем следующий вопрос
-        next_q = get_question(current_q_id + 1)
-        
-        if next_q:
-            # Удаляем текущее сообщение и отправляем следующий вопрос
-            bot.delete_message(call.message.chat.id, call.message.message_id)
-            send_question(
-                call.message.chat.id,
-                next_q,
-                current_q_id + 1,
-                user_id
-            )
-            add_user_progress(user_id, current_q_id + 1, start_time=user_start_time[user_id])
-        else:
-            # Если это был последний вопрос, завершаем квиз
-            total_time = calculate_total_time(user_id)
-            if total_time is not None:
-                # Проверяем, обновилось ли время в топе
-                if add_to_top(user_id, call.from_user.username, total_time):
-                    bot.send_message(
-                        call.message.chat.id,
-                        messages["quiz_completed"].format(total_time),
-                        parse_mode="Markdown"
-                    )
-                else:
-                    bot.send_message(
-                        call.message.chat.id,
-                        "🎉 Квиз пройден! У вас есть результат лучше, так что время не обновлено.",
-                        parse_mode="Markdown"
-                    )
-    else:
+    if not result.is_correct:
         # Если ответ неправильный
-        bot.answer_callback_query(call.id, "❌ Неверно!", show_alert=True)
-        
+        api.answer_callback_query(call.id, messages["incorrect_alert"], show_alert=True)
+        return
 
-@bot.callback_query_handler(func=lambda call: call.data.startswith("hint_"))
-def show_hint(call):
+    # Отправляем сообщение с описанием правильного ответа
+    correct_answer_description = result.description or "Описание отсутствует."
+    api.answer_callback_query(call.id, messages["correct_alert"].format(correct_answer_description), show_alert=True)
+
+    if result.stale:
+        # Вопрос уже пройден (повторное нажатие или кнопка из старого прохождения)
+        return
+
+    if result.next_question:
+        # Удаляем текущее сообщение и отправляем следующий вопрос
+        api.delete_message(call.message.chat.id, call.message.message_id)
+        send_question(
+            call.message.chat.id,
+            result.next_question,
+            result.next_question_id,
+            user_id
+        )
+    elif result.total_time is not None:
+        # Если это был последний вопрос, квиз завершён
+        api.send_message(
+            call.message.chat.id,
+            messages["quiz_completed" if result.top_updated else "quiz_completed_no_record"].format(result.total_time),
+            parse_mode="Markdown"
+        )
+
+@callbacks.register(HINT)
+def show_hint(call, question_id, nonce=None):
     """
     Обработчик для отображения подсказки.
     """
-    nahui, question_id = call.data.split("_")
-    question_id = int(question_id)
-    
+    if is_stale(call.from_user.id, nonce):
+        api.answer_callback_query(call.id, messages["stale_button"])
+        return
+
     # Получаем вопрос и подсказку
-    question = get_question(question_id)
+    question = storage.get_question(question_id)
     hint = question.get("hint", "Подсказка отсутствует.")
     
     # Отправляем подсказку как alert
-    bot.answer_callback_query(call.id, f"💡 Подсказка:\n\n{hint}", show_alert=True)
+    api.answer_callback_query(call.id, messages["hint"].format(hint), show_alert=True)
+
+callbacks.attach(bot)
+
+# Метрики обработчиков: время обработки, вызовы хранилища и SQL-запросы на обновление
+metrics.instrument_bot(bot)
+
+startup.mark("imports")
+
+def run_webhook():
+    """
+    Принимает обновления через webhook вместо long polling.
+    Работает до остановки процесса (Ctrl+C).
+    """
+    # HTTP-сервер нужен только в режиме webhook
+    from utils.webhook import WebhookServer
+
+    server = WebhookServer(
+        lambda update: bot.process_new_updates([types.Update.de_json(update)]),
+        host=WEBHOOK_HOST,
+        port=WEBHOOK_PORT,
+        path=WEBHOOK_PATH,
+        secret_token=WEBHOOK_SECRET,
+        queue_size=WEBHOOK_QUEUE_SIZE
+    )
+    metrics.register_gauge("bot_queue_depth", server.queue_depth, queue="webhook")
+    server.start()
+    # Если WEBHOOK_SECRET не задан, сервер сгенерировал секрет сам
+    bot.set_webhook(url=WEBHOOK_URL, secret_token=server.secret_token)
+    logging.info(f"Webhook слушает {WEBHOOK_HOST}:{WEBHOOK_PORT}{WEBHOOK_PATH}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+
+def run():
+    # Проверка схемы (таблицы создаются, только если версия схемы устарела)
+    # и загрузка каталога вопросов и топа в память
+    storage.open()
+    startup.mark("storage")
+
+    # Сообщения с вопросами и картинки прогреваются, пока бот подключается к Telegram
+    prewarm = startup.prewarm(storage) if PREWARM else None
+    startup.watch_first_update(bot)
+
+    # Обновления разных пользователей обрабатываются параллельно, одного пользователя — по порядку
+    dispatcher.attach(bot)
+
+    metrics.register_gauge("bot_queue_depth", dispatcher.queue_depth, queue="dispatcher")
+    metrics.register_gauge("bot_queue_depth", storage.queue_depth, queue="storage")
+    metrics.register_gauge("bot_broadcasts_active", broadcaster.active_count)
+    if hasattr(sessions, "queue_depth"):
+        metrics.register_gauge("bot_queue_depth", sessions.queue_depth, queue="sessions")
+    exporter = metrics.MetricsExporter(port=METRICS_PORT, path=METRICS_FILE, interval=METRICS_DUMP_INTERVAL)
+    exporter.start()
+
+    # Рассылки, прерванные остановкой бота, продолжаются с последней сохранённой пачки
+    resumed = broadcaster.resume()
+    if resumed:
+        logging.info(f"Продолжено рассылок: {resumed}")
 
-if __name__ == "__main__":
-    # Создание таблиц в базе данных, если они ещё не созданы
-    create_tables()
-    
     # Логирование запуска бота
-    logging.info("Бот запущен...")
+    startup.mark("ready")
+    logging.info(f"Бот запущен ({WORKERS} потоков, режим {UPDATES_MODE})...")
     
-    # Запуск бесконечного цикла опроса серверов Telegram
-    bot.infinity_polling()
\ No newline at end of file
+    try:
+        if UPDATES_MODE == "webhook":
+            run_webhook()
+        else:
+            # Запуск бесконечного цикла опроса серверов Telegram
+            bot.remove_webhook()
+            bot.infinity_polling()
+    finally:
+        # Дожидаемся обработки принятых обновлений и закрываем соединения с базой данных
+        dispatcher.stop()
+        if prewarm is not None:
+            # Соединения с базой нельзя закрывать, пока поток прогрева ими пользуется
+            prewarm.join()
+        sessions.close()
+        storage.close()
+        exporter.stop()
+
+if __name__ == "__main__":
+    run()
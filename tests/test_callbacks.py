@@ -0,0 +1,126 @@
+"""
+callback_data кнопок: формат с версией, кнопки старого формата и маршрутизация по коду действия.
+"""
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from utils.callbacks import (
+    ANSWER, HINT, ADMIN, DELETE_QUESTION, ADD_QUESTION, USER_DETAIL, QUESTIONS_PAGE, USERS_PAGE, START_QUIZ,
+    BROADCAST_CANCEL, PAGE_BEFORE, ADMIN_ACTIONS, CallbackRouter, decode, encode, is_stale_nonce, new_nonce
+)
+from utils.keyboards import question_keyboard
+from utils.payloads import build_question_payload
+
+BIG = 2 ** 63 - 1  # Наибольший ID в BIGINT: с ним callback_data самые длинные
+
+# Действие и аргументы в том виде, в котором их передают клавиатуры
+ACTIONS = [
+    (ANSWER, (5, 2, 1234)),
+    (ANSWER, (BIG, 4, 36 ** 4 - 1)),
+    (HINT, (5, 0)),
+    (HINT, (BIG, 36 ** 4 - 1)),
+    (ADMIN, (ADMIN_ACTIONS.index("broadcast"),)),
+    (DELETE_QUESTION, (BIG, 10 ** 6, BIG)),
+    (ADD_QUESTION, ()),
+    (USER_DETAIL, (BIG,)),
+    (QUESTIONS_PAGE, (10 ** 6, PAGE_BEFORE, BIG)),
+    (USERS_PAGE, (0, 0, 0)),
+    (START_QUIZ, (BIG,)),
+    (BROADCAST_CANCEL, (BIG,)),
+]
+
+
+@pytest.mark.parametrize("action, args", ACTIONS)
+def test_round_trip(action, args):
+    data = encode(action, *args)
+    assert decode(data) == (action, args)
+    assert len(data.encode()) <= 64
+
+
+def test_too_long_data_is_rejected():
+    with pytest.raises(ValueError):
+        encode(DELETE_QUESTION, *[BIG] * 6)
+
+
+def test_keyboard_with_nonce_decodes():
+    payload = build_question_payload(7, {"question_text": "?", "options": ["a", "b", "c", "d"], "image_path": None})
+    nonce = new_nonce()
+    rows = json.loads(payload.reply_markup_for(nonce, (3, 1, 0, 2)))["inline_keyboard"]
+    decoded = [decode(row[0]["callback_data"]) for row in rows]
+    assert decoded == [(ANSWER, (7, option, nonce)) for option in (4, 2, 1, 3)] + [(HINT, (7, nonce))]
+
+
+def test_keyboard_without_payload():
+    keyboard = question_keyboard(9, ["a", "b"], nonce=35)
+    assert [decode(row[0].callback_data) for row in keyboard.keyboard] == [
+        (ANSWER, (9, 1, 35)), (ANSWER, (9, 2, 35)), (HINT, (9, 35))
+    ]
+
+
+@pytest.mark.parametrize("data, expected", [
+    ("answer_5_2", (ANSWER, (5, 2))),
+    ("hint_5", (HINT, (5,))),
+    ("admin_questions", (ADMIN, (ADMIN_ACTIONS.index("questions"),))),
+    ("admin_users", (ADMIN, (ADMIN_ACTIONS.index("users"),))),
+    ("admin_stats", (ADMIN, (ADMIN_ACTIONS.index("stats"),))),
+    ("admin_back", (ADMIN, (ADMIN_ACTIONS.index("back"),))),
+    ("admin_close", (ADMIN, (ADMIN_ACTIONS.index("close"),))),
+    ("delete_question_12", (DELETE_QUESTION, (12,))),
+    ("add_question", (ADD_QUESTION, ())),
+    ("user_detail_123456789", (USER_DETAIL, (123456789,))),
+])
+def test_legacy_data(data, expected):
+    assert decode(data) == expected
+
+
+@pytest.mark.parametrize("data", [
+    "", "1", "2a5", "1z5", "1a5..2", "1a5.!", "1a5.", "1h.",
+    "answer_", "answer_x_2", "answer_5__2", "hint_abc", "admin_", "admin_bogus", "delete_question_", "user_detail_x",
+    "unknown_5", "🙂", "\x00",
+])
+def test_malformed_data(data):
+    assert decode(data) is None
+
+
+def test_stale_nonce():
+    session = {"nonce": 100, "quiz_id": 1}
+    assert is_stale_nonce(session, 99)
+    assert not is_stale_nonce(session, 100)
+    # Кнопки старого формата без nonce, нет начатого прохождения, сессия до появления nonce
+    assert not is_stale_nonce(session, None)
+    assert not is_stale_nonce(None, 99)
+    assert not is_stale_nonce({"quiz_id": 1}, 99)
+
+
+def make_router():
+    router = CallbackRouter()
+    calls = []
+
+    @router.register(ANSWER)
+    def handle_answer(call, question_id, option, nonce=None):
+        calls.append(("answer", question_id, option, nonce))
+
+    @router.register(ADMIN)
+    def handle_admin(call, action):
+        calls.append(("admin", ADMIN_ACTIONS[action]))
+
+    return router, calls
+
+
+def test_router_dispatches_by_action():
+    router, calls = make_router()
+    handlers = []
+    router.attach(SimpleNamespace(register_callback_query_handler=lambda handler, func: handlers.append(handler)))
+    route_callback, = handlers
+
+    for data in (encode(ANSWER, 5, 2, 77), "answer_6_3", "admin_users", encode(ADMIN, 4)):
+        route_callback(SimpleNamespace(data=data))
+    assert calls == [("answer", 5, 2, 77), ("answer", 6, 3, None), ("admin", "users"), ("admin", "close")]
+
+
+@pytest.mark.parametrize("data", [encode(HINT, 5, 1), "1a5..2", "garbage", None])
+def test_router_ignores_unknown_buttons(data):
+    router, calls = make_router()
+    assert router.resolve(SimpleNamespace(data=data)) is None
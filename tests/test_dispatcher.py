@@ -0,0 +1,114 @@
+"""
+Диспетчер обновлений: порядок внутри пользователя при нескольких потоках и параллельность между пользователями.
+"""
+import random
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from utils.dispatcher import UpdateDispatcher, update_user_id
+
+
+@pytest.fixture
+def dispatcher():
+    dispatcher = UpdateDispatcher(workers=8)
+    yield dispatcher
+    dispatcher.stop()
+
+
+def test_per_user_fifo(dispatcher):
+    rnd = random.Random(1)
+    lock = threading.Lock()
+    seen = {user_id: [] for user_id in range(20)}
+    running = set()
+    overlaps = []
+
+    def handle(user_id, i):
+        with lock:
+            if user_id in running:
+                overlaps.append(user_id)
+            running.add(user_id)
+        # Случайная задержка перемешивает завершение задач разных пользователей
+        time.sleep(rnd.random() / 2000)
+        with lock:
+            running.discard(user_id)
+            seen[user_id].append(i)
+
+    for i in range(50):
+        for user_id in rnd.sample(range(20), 20):
+            dispatcher.submit(user_id, handle, user_id, i)
+    dispatcher.stop()
+
+    assert overlaps == [], "Задачи одного пользователя не выполняются одновременно"
+    assert all(order == list(range(50)) for order in seen.values())
+    assert dispatcher.queue_depth() == 0
+
+
+def test_users_run_in_parallel(dispatcher):
+    barrier = threading.Barrier(4, timeout=5)
+    for user_id in range(4):
+        # Каждая задача ждёт остальных: без параллельного выполнения барьер не пройти
+        dispatcher.submit(user_id, barrier.wait)
+    dispatcher.stop()
+    assert not barrier.broken
+
+
+def test_slow_user_does_not_block_others(dispatcher):
+    release = threading.Event()
+    done = threading.Event()
+    dispatcher.submit(1, release.wait, 5)
+    dispatcher.submit(1, lambda: None)
+    dispatcher.submit(2, done.set)
+    assert done.wait(5)
+    assert dispatcher.queue_depth() == 1, "Вторая задача первого пользователя ждёт первую"
+    release.set()
+
+
+def test_error_does_not_stop_queue(dispatcher):
+    results = []
+
+    def fail():
+        raise RuntimeError("handler failed")
+
+    dispatcher.submit(1, fail)
+    dispatcher.submit(1, results.append, "next")
+    dispatcher.stop()
+    assert results == ["next"]
+
+
+def test_max_pending_blocks_submit():
+    dispatcher = UpdateDispatcher(workers=1, max_pending=2)
+    release = threading.Event()
+    dispatcher.submit(1, release.wait, 5)
+    dispatcher.submit(1, lambda: None)
+    submitted = threading.Event()
+    blocked = threading.Thread(target=lambda: (dispatcher.submit(2, lambda: None), submitted.set()))
+    blocked.start()
+    assert not submitted.wait(0.1), "Третья задача ждёт, пока освободится место"
+    release.set()
+    assert submitted.wait(5)
+    blocked.join()
+    dispatcher.stop()
+
+
+def test_attach_routes_updates_by_user(dispatcher):
+    seen = []
+    bot = SimpleNamespace(process_new_updates=lambda updates: seen.extend(u.update_id for u in updates))
+    dispatcher.attach(bot)
+    user = SimpleNamespace(id=42)
+    updates = [
+        SimpleNamespace(update_id=i, message=SimpleNamespace(from_user=user)) for i in range(10)
+    ]
+    bot.process_new_updates(updates)
+    dispatcher.stop()
+    assert seen == list(range(10))
+
+
+def test_update_user_id():
+    user = SimpleNamespace(id=7)
+    assert update_user_id(SimpleNamespace(message=SimpleNamespace(from_user=user))) == 7
+    assert update_user_id(SimpleNamespace(message=None, callback_query=SimpleNamespace(from_user=user))) == 7
+    assert update_user_id(SimpleNamespace(poll_answer=SimpleNamespace(from_user=None, user=user))) == 7
+    assert update_user_id(SimpleNamespace(channel_post=SimpleNamespace())) is None
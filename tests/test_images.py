@@ -0,0 +1,37 @@
+"""
+Кэш file_id: какие ошибки Telegram означают, что картинку нужно загрузить заново.
+"""
+import pytest
+from telebot.apihelper import ApiTelegramException
+
+from utils.images import is_file_id_rejected
+
+
+def api_error(code: int, description: str = "") -> ApiTelegramException:
+    return ApiTelegramException("sendPhoto", None, {"ok": False, "error_code": code, "description": description})
+
+
+@pytest.mark.parametrize("description", [
+    "Bad Request: wrong file identifier/HTTP URL specified",
+    "Bad Request: wrong remote file identifier specified: Wrong character in the string",
+    "Bad Request: FILE_REFERENCE_EXPIRED",
+    "Bad Request: file reference expired",
+])
+def test_rejected_file_id(description):
+    assert is_file_id_rejected(api_error(400, description))
+
+
+@pytest.mark.parametrize("code, description", [
+    (429, "Too Many Requests: retry after 5"),
+    (500, "Internal Server Error"),
+    (502, "Bad Gateway"),
+    (400, "Bad Request: chat not found"),
+    (400, "Bad Request: message caption is too long"),
+    (403, "Forbidden: bot was blocked by the user"),
+])
+def test_other_errors_keep_file_id(code, description):
+    assert not is_file_id_rejected(api_error(code, description))
+
+
+def test_not_an_api_error():
+    assert not is_file_id_rejected(ConnectionError("reset"))
@@ -0,0 +1,121 @@
+"""
+Таблица лидеров на дереве Фенвика: места, топ и соседи сверяются с сортировкой всех записей.
+"""
+import random
+
+import pytest
+
+from utils.leaderboard import Leaderboard
+
+
+class Reference:
+    """
+    Та же таблица на словаре: каждый запрос сортирует всех пользователей.
+    """
+
+    def __init__(self):
+        self.users = {}
+
+    def ordered(self):
+        return sorted((total_time, user_id) for user_id, (total_time, _) in self.users.items())
+
+    def entries(self, start, count):
+        return [(position, user_id, self.users[user_id][1], total_time)
+                for position, (total_time, user_id) in enumerate(self.ordered(), 1)
+                if start <= position < start + count]
+
+    def rank(self, user_id):
+        if user_id not in self.users:
+            return None
+        total_time = self.users[user_id][0]
+        return sum(1 for other, _ in self.users.values() if other < total_time) + 1
+
+    def around(self, user_id, radius):
+        if user_id not in self.users:
+            return []
+        position = self.ordered().index((self.users[user_id][0], user_id)) + 1
+        start = max(position - radius, 1)
+        return self.entries(start, position + radius - start + 1)
+
+
+def test_rank_with_ties():
+    board = Leaderboard()
+    for user_id, total_time in ((1, 30), (2, 10), (3, 30), (4, 20), (5, 30), (6, 40)):
+        board.update(user_id, f"user{user_id}", total_time)
+    # Равное время — равное место, следующее место пропускает разделивших его
+    assert [board.rank(user_id) for user_id in range(1, 7)] == [3, 1, 3, 2, 3, 6]
+    assert board.rank(7) is None
+    # При равном времени порядок в топе задаёт ID
+    assert [user_id for _, user_id, _, _ in board.top(6)] == ["2", "4", "1", "3", "5", "6"]
+    assert board.top(2) == [(1, "2", "user2", 10), (2, "4", "user4", 20)]
+
+
+def test_update_and_remove():
+    board = Leaderboard()
+    board.update(1, "a", 50)
+    board.update(2, "b", 40)
+    board.update(1, "a2", 30)
+    assert len(board) == 2
+    assert board.get(1) == (30, "a2")
+    assert board.top() == [(1, "1", "a2", 30), (2, "2", "b", 40)]
+
+    board.remove(1)
+    board.remove(1)
+    board.remove(99)
+    assert len(board) == 1
+    assert board.rank(1) is None
+    assert board.rank(2) == 1
+    assert board.around(1) == []
+    assert board.top() == [(1, "2", "b", 40)]
+
+
+def test_around():
+    board = Leaderboard()
+    for user_id in range(1, 11):
+        board.update(user_id, str(user_id), user_id * 10)
+    assert [entry[0] for entry in board.around(1)] == [1, 2, 3]
+    assert [entry[0] for entry in board.around(5)] == [3, 4, 5, 6, 7]
+    assert [entry[0] for entry in board.around(10, radius=1)] == [9, 10]
+    assert board.around(5, radius=0) == [(5, "5", "5", 50)]
+
+
+def test_times_beyond_max_time_keep_exact_order():
+    board = Leaderboard(max_time=100)
+    for user_id, total_time in ((1, 500), (2, 150), (3, 100), (4, 99), (5, -5)):
+        board.update(user_id, "", total_time)
+    assert [user_id for _, user_id, _, _ in board.top()] == ["5", "4", "3", "2", "1"]
+    assert board.rank(1) == 5
+
+
+def test_load_replaces_table():
+    board = Leaderboard()
+    board.update(99, "old", 1)
+    board.load([(1, "a", 5000), ("2", "b", 20), (3, "c", 20)])
+    assert board.get(99) is None
+    assert board.top() == [(1, "2", "b", 20), (2, "3", "c", 20), (3, "1", "a", 5000)]
+    assert board.rank(1) == 3
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_matches_reference(seed):
+    rnd = random.Random(seed)
+    board = Leaderboard(max_time=rnd.choice([50, 3000, 7 * 86400]))
+    reference = Reference()
+    # Малый разброс времени даёт много совпадений, большой — рост дерева и общую последнюю корзину
+    spread = rnd.choice([20, 5000, 10 ** 6])
+    for _ in range(400):
+        user_id = str(rnd.randrange(60))
+        if rnd.random() < 0.2:
+            board.remove(user_id)
+            reference.users.pop(user_id, None)
+        else:
+            total_time = rnd.randrange(spread)
+            board.update(user_id, f"name{user_id}", total_time)
+            reference.users[user_id] = (total_time, f"name{user_id}")
+
+        probe = str(rnd.randrange(60))
+        assert board.rank(probe) == reference.rank(probe)
+        radius = rnd.randrange(4)
+        assert board.around(probe, radius) == reference.around(probe, radius)
+    assert len(board) == len(reference.users)
+    assert board.top(len(board) + 5) == reference.entries(1, len(board) + 5)
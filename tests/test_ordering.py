@@ -0,0 +1,141 @@
+"""
+Порядок вопросов в прохождении: перестановка Фейстеля и обход квиза, в том числе после его правки.
+"""
+import random
+from types import MappingProxyType
+
+import pytest
+
+from utils.ordering import (
+    QuestionOrder, _permute, _unpermute, first_question_id, last_question_id, next_question_id, question_number
+)
+from utils.quizzes import Quiz, quiz_version
+
+# 1, 2, 3, нечётные и степени двойки ±1: на них меняется ширина блока сети Фейстеля
+SIZES = [1, 2, 3, 5, 7, 15, 16, 17, 31, 32, 33, 63, 64, 65, 127, 129, 255, 256, 257, 1023, 1025]
+SEEDS = [0, 1, 42, 2 ** 47 + 5]
+
+
+def make_quiz(question_ids) -> Quiz:
+    question_ids = tuple(question_ids)
+    return Quiz(1, "space", "Космос", question_ids,
+                MappingProxyType({question_id: i for i, question_id in enumerate(question_ids)}),
+                quiz_version(question_ids))
+
+
+def walk(quiz: Quiz, order: QuestionOrder) -> list:
+    """
+    :return: Вопросы в порядке прохождения: от первого по next_question_id до конца.
+    """
+    visited = []
+    question_id = first_question_id(quiz, order)
+    while question_id is not None and len(visited) <= len(quiz.question_ids):
+        visited.append(question_id)
+        question_id = next_question_id(quiz, question_id, order)
+    return visited
+
+
+@pytest.mark.parametrize("n", SIZES)
+@pytest.mark.parametrize("seed", SEEDS)
+def test_permute_is_bijection(seed, n):
+    images = [_permute(seed, n, value) for value in range(n)]
+    assert sorted(images) == list(range(n))
+
+
+@pytest.mark.parametrize("n", SIZES)
+@pytest.mark.parametrize("seed", SEEDS)
+def test_unpermute_inverts_permute(seed, n):
+    for value in range(n):
+        assert _unpermute(seed, n, _permute(seed, n, value)) == value
+
+
+def test_seeds_give_different_orders():
+    orders = {tuple(_permute(seed, 10, value) for value in range(10)) for seed in range(50)}
+    assert len(orders) > 40
+
+
+@pytest.mark.parametrize("n", [1, 2, 3, 16, 17, 100])
+@pytest.mark.parametrize("shuffle_questions", [True, False])
+def test_walk_visits_every_question_once(n, shuffle_questions):
+    quiz = make_quiz(range(101, 101 + n))
+    order = QuestionOrder.new(quiz, shuffle_questions)
+    visited = walk(quiz, order)
+    assert sorted(visited) == list(quiz.question_ids)
+    assert visited[-1] == last_question_id(quiz, order)
+    if not shuffle_questions:
+        assert visited == list(quiz.question_ids)
+
+
+@pytest.mark.parametrize("n", [1, 2, 17, 100])
+def test_number_follows_walk(n):
+    quiz = make_quiz(range(1, n + 1))
+    order = QuestionOrder.new(quiz)
+    for number, question_id in enumerate(walk(quiz, order), 1):
+        assert question_number(quiz, question_id, order) == number
+    assert question_number(quiz, n + 1, order) is None
+
+
+def test_session_without_size_uses_current_quiz():
+    quiz = make_quiz(range(1, 21))
+    order = QuestionOrder(7)
+    assert not order.changed(quiz)
+    assert sorted(walk(quiz, order)) == list(quiz.question_ids)
+
+
+def test_without_order_quiz_order_is_kept():
+    quiz = make_quiz([5, 3, 9])
+    assert walk(quiz, None) == [5, 3, 9]
+    assert [question_number(quiz, question_id, None) for question_id in (5, 3, 9)] == [1, 2, 3]
+
+
+def edited_walk(seed: int) -> tuple:
+    """
+    Проходит квиз и на случайном шаге удаляет непройденные вопросы или добавляет новые.
+
+    :return: Квиз после правки и вопросы в порядке прохождения.
+    """
+    rnd = random.Random(seed)
+    question_ids = list(range(1, rnd.randint(3, 30) + 1))
+    quiz = make_quiz(question_ids)
+    order = QuestionOrder(rnd.getrandbits(48), True, True, len(question_ids), quiz.version)
+    edit_at = rnd.randint(0, len(question_ids) - 2)
+    new_id = len(question_ids) + 1
+    answered = []
+    question_id = order.first_question_id(quiz)
+    while question_id is not None and len(answered) <= 2 * new_id:
+        if len(answered) == edit_at:
+            for _ in range(rnd.randint(1, 3)):
+                candidates = [q for q in question_ids if q not in answered and q != question_id]
+                if candidates and rnd.random() < 0.6:
+                    question_ids.remove(rnd.choice(candidates))
+                else:
+                    question_ids.insert(rnd.randint(0, len(question_ids)), new_id)
+                    new_id += 1
+            quiz = make_quiz(question_ids)
+        answered.append(question_id)
+        question_id = order.next_question_id(quiz, question_id, answered)
+    return quiz, answered
+
+
+@pytest.mark.parametrize("seed", range(200))
+def test_walk_after_edit_reaches_remaining_questions(seed):
+    quiz, answered = edited_walk(seed)
+    assert len(answered) == len(set(answered)), "Пройденные вопросы не задаются повторно"
+    assert sorted(answered) == sorted(quiz.question_ids)
+
+
+def test_walk_after_removal_skips_completed():
+    quiz = make_quiz(range(1, 11))
+    order = QuestionOrder.new(quiz)
+    answered = walk(quiz, order)[:4]
+    removed = next(q for q in quiz.question_ids if q not in answered)
+    edited = make_quiz(q for q in quiz.question_ids if q != removed)
+
+    question_id = answered[-1]
+    rest = []
+    while question_id is not None:
+        question_id = order.next_question_id(edited, question_id, answered + rest)
+        if question_id is not None:
+            rest.append(question_id)
+    assert not set(rest) & set(answered)
+    assert sorted(answered + rest) == list(edited.question_ids)
@@ -0,0 +1,68 @@
+"""
+Планировщик исходящих запросов: повторы после ошибок и запросы с истёкшим сроком.
+"""
+import asyncio
+import io
+
+from telebot.apihelper import ApiTelegramException
+
+from utils.outbound import OutboundScheduler
+
+
+def api_error(code: int, description: str = "") -> ApiTelegramException:
+    return ApiTelegramException("sendPhoto", None, {"ok": False, "error_code": code, "description": description,
+                                                    "parameters": {"retry_after": 0}})
+
+
+def test_retry_rewinds_file_arguments():
+    scheduler = OutboundScheduler(global_rate=1000, global_burst=1000)
+    uploads = []
+
+    def send_photo(chat_id, photo, caption=None):
+        uploads.append(photo.read())
+        if len(uploads) < 3:
+            raise api_error(500 if len(uploads) == 1 else 429)
+        return "sent"
+
+    photo = io.BytesIO(b"jpeg")
+    assert scheduler.call("send_photo", send_photo, 1, photo, chat_id=1, caption="q") == "sent"
+    assert uploads == [b"jpeg"] * 3, "Повтор загружает файл целиком"
+
+
+def test_async_retry_rewinds_file_arguments():
+    scheduler = OutboundScheduler(global_rate=1000, global_burst=1000)
+    uploads = []
+
+    async def send_photo(chat_id, photo=None):
+        uploads.append(photo.read())
+        if len(uploads) == 1:
+            raise api_error(502)
+        return "sent"
+
+    assert asyncio.run(scheduler.acall("send_photo", send_photo, 1, photo=io.BytesIO(b"jpeg"), chat_id=1)) == "sent"
+    assert uploads == [b"jpeg", b"jpeg"]
+
+
+def test_client_error_is_not_retried():
+    scheduler = OutboundScheduler()
+    calls = []
+
+    def send_photo(chat_id, photo):
+        calls.append(chat_id)
+        raise api_error(400, "Bad Request: wrong file identifier")
+
+    try:
+        scheduler.call("send_photo", send_photo, 1, "file-id", chat_id=1)
+    except ApiTelegramException as e:
+        assert e.error_code == 400
+    else:
+        raise AssertionError("Ошибка 400 передаётся вызывающему")
+    assert calls == [1]
+
+
+def test_expired_callback_answer_is_dropped():
+    scheduler = OutboundScheduler()
+    scheduler.penalize(None, 60)
+    calls = []
+    assert scheduler.call("answer_callback_query", lambda: calls.append(1)) is None
+    assert calls == [] and scheduler.dropped == 1
@@ -0,0 +1,208 @@
+"""
+Хранилища сессий: истечение по времени жизни и запомненные промахи, которые не читают базу повторно.
+"""
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from utils import sessions
+from utils.sessions import MemorySessionStore, SessionStore, SqliteSessionStore, create_session_store, quiz_key
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def time(self):
+        return self.now
+
+
+class FakeStorage:
+    """
+    Таблица Sessions в словаре: считает чтения и записи.
+    """
+
+    def __init__(self):
+        self.rows = {}
+        self.loads = []
+        self.saves = []
+        self.fail = False
+
+    def load_session(self, key, now):
+        self.loads.append(key)
+        row = self.rows.get(key)
+        return row if row is not None and row[1] > now else None
+
+    def save_sessions(self, upserts, deletes):
+        if self.fail:
+            return False
+        self.saves.append((upserts, deletes))
+        for key, value, expires_at in upserts:
+            self.rows[key] = (value, expires_at)
+        for key in deletes:
+            self.rows.pop(key, None)
+        return True
+
+    def delete_expired_sessions(self, now):
+        expired = [key for key, (_, expires_at) in self.rows.items() if expires_at <= now]
+        for key in expired:
+            del self.rows[key]
+        return len(expired)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(sessions, "time", SimpleNamespace(time=clock.time))
+    return clock
+
+
+@pytest.fixture
+def storage(monkeypatch):
+    storage = FakeStorage()
+    monkeypatch.setattr(sessions, "get_storage", lambda: storage)
+    return storage
+
+
+@pytest.fixture
+def store(clock, storage):
+    # Фоновая запись не срабатывает сама: изменения записываются вызовом flush
+    store = SqliteSessionStore(ttl=100, flush_interval=3600)
+    yield store
+    storage.fail = False
+    store.close()
+
+
+def test_memory_ttl(clock):
+    store = MemorySessionStore(ttl=100)
+    store.set("a", {"nonce": 1})
+    clock.now += 60
+    store.set("b", 2)
+    assert store.get("a") == {"nonce": 1}
+    assert len(store) == 2
+
+    clock.now += 40
+    assert store.get("a") is None
+    assert store.get("a", "default") == "default"
+    assert store.get("b") == 2
+    assert len(store) == 1
+
+    # Время жизни отсчитывается от последнего изменения
+    store.set("b", 3)
+    clock.now += 99
+    assert store.get("b") == 3
+    clock.now += 1
+    assert store.get("b") is None
+    assert len(store) == 0
+
+
+def test_memory_set_evicts_expired(clock):
+    store = MemorySessionStore(ttl=10)
+    for i in range(100):
+        store.set(f"user{i}", i)
+    clock.now += 10
+    store.set("fresh", 1)
+    assert list(store._data) == ["fresh"]
+
+
+def test_memory_delete(clock):
+    store = MemorySessionStore(ttl=10)
+    store.set("a", 1)
+    store.delete("a")
+    store.delete("missing")
+    assert store.get("a") is None
+
+
+def test_miss_is_cached(store, storage):
+    assert store.get(quiz_key(1)) is None
+    assert store.get(quiz_key(1), {}) == {}
+    assert asyncio.run(store.aget(quiz_key(1))) is None
+    assert storage.loads == [quiz_key(1)], "Промах читает базу один раз"
+
+
+def test_cached_miss_expires(store, storage, clock):
+    assert store.get("a") is None
+    clock.now += 100
+    storage.rows["a"] = (json.dumps(5), clock.now + 100)
+    assert store.get("a") == 5
+    assert storage.loads == ["a", "a"]
+
+
+def test_session_loaded_from_storage(store, storage, clock):
+    storage.rows["a"] = (json.dumps({"nonce": 7}), clock.now + 30)
+    storage.rows["old"] = (json.dumps(1), clock.now - 1)
+    assert store.get("a") == {"nonce": 7}
+    assert store.get("a") == {"nonce": 7}
+    assert store.get("old") is None
+    assert storage.loads == ["a", "old"]
+
+    # Прочитанная сессия истекает в памяти тогда же, когда в базе
+    clock.now += 30
+    assert store.get("a") is None
+    assert storage.loads == ["a", "old", "a"]
+
+
+def test_set_and_delete_are_written_behind(store, storage, clock):
+    store.set("a", {"nonce": 1})
+    store.set("b", 2)
+    store.set("a", {"nonce": 3})
+    assert storage.saves == []
+    assert store.queue_depth() == 2
+
+    store.flush()
+    assert storage.saves == [([("a", json.dumps({"nonce": 3}), int(clock.now + 100)),
+                               ("b", "2", int(clock.now + 100))], [])]
+
+    store.delete("a")
+    assert store.get("a") is None
+    store.flush()
+    assert storage.saves[-1] == ([], ["a"])
+    assert store.get("a") is None
+    assert storage.loads == [], "Удалённая сессия не читается из базы"
+
+
+def test_failed_flush_is_retried(store, storage):
+    store.set("a", 1)
+    storage.fail = True
+    store.flush()
+    assert store.queue_depth() == 1
+
+    store.set("a", 2)
+    storage.fail = False
+    store.flush()
+    assert storage.rows["a"][0] == "2", "Повтор не перезаписывает более новое значение"
+
+
+def test_restart_reads_saved_session(clock, storage):
+    first = SqliteSessionStore(ttl=100, flush_interval=3600)
+    first.set(quiz_key(1), {"nonce": 9})
+    first.close()
+
+    second = SqliteSessionStore(ttl=100, flush_interval=3600)
+    assert second.get(quiz_key(1)) == {"nonce": 9}
+    clock.now += 100
+    assert second.get(quiz_key(1)) is None
+    second.close()
+
+
+def test_create_session_store(clock, storage):
+    assert isinstance(create_session_store("memory", 10), MemorySessionStore)
+    store = create_session_store("sqlite", 10, 3600)
+    assert isinstance(store, SqliteSessionStore)
+    store.close()
+    with pytest.raises(ValueError):
+        create_session_store("redis", 10)
+
+
+def test_session_store_is_abstract():
+    with pytest.raises(TypeError):
+        SessionStore()
+
+    class GetOnly(SessionStore):
+        def get(self, key, default=None):
+            return default
+
+    with pytest.raises(TypeError, match="delete"):
+        GetOnly()
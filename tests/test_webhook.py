@@ -0,0 +1,99 @@
+"""
+Webhook-сервер: проверка secret_token и ответ 503, когда очередь обновлений заполнена.
+"""
+import json
+import threading
+import urllib.error
+import urllib.request
+
+import pytest
+
+from utils.webhook import SECRET_HEADER, WebhookServer
+
+SECRET = "test-secret_1"
+
+
+def post(server: WebhookServer, body=b'{"update_id": 1}', secret=SECRET, path="/webhook") -> int:
+    request = urllib.request.Request(f"http://127.0.0.1:{server.port}{path}", data=body, method="POST")
+    if secret is not None:
+        request.add_header(SECRET_HEADER, secret)
+    try:
+        with urllib.request.urlopen(request, timeout=5) as response:
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+
+@pytest.fixture
+def updates():
+    return []
+
+
+@pytest.fixture
+def server(updates):
+    server = WebhookServer(updates.append, host="127.0.0.1", port=0, secret_token=SECRET)
+    server.start()
+    yield server
+    server.stop()
+
+
+def test_accepts_update(server, updates):
+    assert post(server, json.dumps({"update_id": 7}).encode()) == 200
+    server.queue.join()
+    assert updates == [{"update_id": 7}]
+    assert server.accepted == 1
+
+
+@pytest.mark.parametrize("secret", [None, "", "wrong", SECRET + "x", SECRET[:-1]])
+def test_wrong_secret_is_forbidden(server, updates, secret):
+    assert post(server, secret=secret) == 403
+    assert server.accepted == 0
+    assert server.queue_depth() == 0
+
+
+def test_bad_requests(server):
+    assert post(server, path="/other") == 404
+    assert post(server, body=b"not json") == 400
+    assert post(server, body=b"") == 400
+
+
+def test_full_queue_returns_503():
+    release = threading.Event()
+    started = threading.Event()
+    handled = []
+
+    def on_update(update):
+        started.set()
+        release.wait(5)
+        handled.append(update["update_id"])
+
+    server = WebhookServer(on_update, host="127.0.0.1", port=0, secret_token=SECRET, queue_size=1, put_timeout=0.05)
+    server.start()
+    try:
+        # Первое обновление занимает обработчик, второе — единственное место в очереди
+        assert post(server, b'{"update_id": 1}') == 200
+        assert started.wait(5)
+        assert post(server, b'{"update_id": 2}') == 200
+        assert post(server, b'{"update_id": 3}') == 503
+        assert (server.accepted, server.rejected) == (2, 1)
+        assert server.queue_depth() == 1
+    finally:
+        release.set()
+        server.stop()
+    assert handled == [1, 2]
+
+
+def test_invalid_secret_is_rejected():
+    with pytest.raises(ValueError):
+        WebhookServer(lambda update: None, host="127.0.0.1", port=0, secret_token="bad secret")
+
+
+def test_generated_secret():
+    server = WebhookServer(lambda update: None, host="127.0.0.1", port=0)
+    server.start()
+    try:
+        assert server.secret_token
+        assert post(server, secret=server.secret_token) == 200
+        assert post(server, secret=None) == 403
+    finally:
+        server.stop()
@@ -0,0 +1,148 @@
+"""
+Очередь отложенной записи: порядок операций в пакете и возврат пакета в очередь после неудачной записи.
+"""
+import threading
+
+import pytest
+
+from utils.write_behind import WriteBehindQueue
+
+
+class Recorder:
+    """
+    apply для очереди: запоминает пакеты и не записывает их, пока fail не сброшен.
+    """
+
+    def __init__(self):
+        self.batches = []
+        self.fail = False
+
+    def __call__(self, batch):
+        if self.fail is True:
+            return False
+        if self.fail:
+            raise self.fail
+        self.batches.append({key: list(ops) for key, ops in batch.items()})
+        return True
+
+
+@pytest.fixture
+def recorder():
+    return Recorder()
+
+
+@pytest.fixture
+def queue(recorder):
+    # Фоновая запись не срабатывает сама: пакеты записываются вызовом flush
+    queue = WriteBehindQueue(recorder, flush_interval=3600, max_rows=10 ** 6)
+    yield queue
+    recorder.fail = False
+    queue.close()
+
+
+def test_flush_keeps_order_per_key(queue, recorder):
+    for op in (("start", 1), ("answer", 1, 2), ("answer", 1, 3)):
+        queue.put(1, op)
+    queue.put(2, ("start", 5))
+    queue.put(1, ("finish", 1))
+    assert queue.queue_depth() == 5
+    assert queue.pending(1) == [("start", 1), ("answer", 1, 2), ("answer", 1, 3), ("finish", 1)]
+
+    queue.flush()
+    assert recorder.batches == [{
+        1: [("start", 1), ("answer", 1, 2), ("answer", 1, 3), ("finish", 1)],
+        2: [("start", 5)],
+    }]
+    assert queue.queue_depth() == 0
+    assert queue.pending(1) == []
+    assert queue.flushes == 1
+
+    queue.flush()
+    assert len(recorder.batches) == 1, "Пустая очередь не записывается"
+
+
+def test_failed_commit_is_requeued_before_newer_ops(queue, recorder):
+    queue.put(1, ("answer", 1))
+    queue.put(2, ("answer", 2))
+    recorder.fail = True
+    queue.flush()
+    assert recorder.batches == []
+    assert queue.flushes == 0
+    assert queue.queue_depth() == 2
+
+    queue.put(1, ("answer", 3))
+    assert queue.pending(1) == [("answer", 1), ("answer", 3)]
+
+    recorder.fail = False
+    queue.flush()
+    assert recorder.batches == [{1: [("answer", 1), ("answer", 3)], 2: [("answer", 2)]}]
+    assert queue.queue_depth() == 0
+
+
+def test_commit_error_is_requeued_and_raised(queue, recorder):
+    queue.put(1, ("answer", 1))
+    recorder.fail = RuntimeError("database is locked")
+    with pytest.raises(RuntimeError):
+        queue.flush()
+    assert queue.pending(1) == [("answer", 1)]
+    assert queue.queue_depth() == 1
+
+
+def test_inflight_batch_stays_visible():
+    started, release = threading.Event(), threading.Event()
+    seen = []
+
+    def apply(batch):
+        started.set()
+        release.wait(5)
+        return True
+
+    queue = WriteBehindQueue(apply, flush_interval=3600, max_rows=10 ** 6)
+    queue.put(1, ("answer", 1))
+    flush = threading.Thread(target=queue.flush)
+    flush.start()
+    assert started.wait(5)
+    queue.put(1, ("answer", 2))
+    seen.append(queue.pending(1))
+    release.set()
+    flush.join()
+    assert seen == [[("answer", 1), ("answer", 2)]]
+    assert queue.pending(1) == [("answer", 2)]
+    queue.close()
+
+
+def test_take_and_restore(queue, recorder):
+    queue.put(1, ("answer", 1))
+    queue.put(1, ("answer", 2))
+    queue.put(2, ("answer", 3))
+    ops = queue.take(1)
+    assert ops == [("answer", 1), ("answer", 2)]
+    assert queue.queue_depth() == 1
+
+    queue.put(1, ("answer", 4))
+    queue.restore(1, ops)
+    assert queue.pending(1) == [("answer", 1), ("answer", 2), ("answer", 4)]
+    assert queue.queue_depth() == 4
+
+
+def test_max_rows_wakes_background_flush(recorder):
+    flushed = threading.Event()
+
+    def apply(batch):
+        recorder(batch)
+        flushed.set()
+        return True
+
+    queue = WriteBehindQueue(apply, flush_interval=3600, max_rows=3)
+    for i in range(3):
+        queue.put(i, ("answer", i))
+    assert flushed.wait(5)
+    assert recorder.batches == [{0: [("answer", 0)], 1: [("answer", 1)], 2: [("answer", 2)]}]
+    queue.close()
+
+
+def test_close_flushes_remaining(recorder):
+    queue = WriteBehindQueue(recorder, flush_interval=3600, max_rows=10 ** 6)
+    queue.put(1, ("answer", 1))
+    queue.close()
+    assert recorder.batches == [{1: [("answer", 1)]}]
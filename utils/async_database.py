@@ -0,0 +1,98 @@
+import asyncio
+import contextvars
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+from utils.config import DB_THREADS
+from utils.storage import Storage, get_storage
+
+# Запросы к базе выполняются в отдельном пуле потоков, чтобы не блокировать цикл событий.
+# Для SQLite каждый поток пула получает своё долгоживущее соединение из utils.database.
+_executor: Optional[ThreadPoolExecutor] = None
+
+def get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=DB_THREADS, thread_name_prefix="db")
+    return _executor
+
+async def run_db(func: Callable, *args, **kwargs) -> Any:
+    """
+    Выполняет синхронную функцию работы с базой данных в пуле потоков базы.
+
+    :param func: Метод хранилища.
+    :return: Результат функции.
+    """
+    loop = asyncio.get_running_loop()
+    # Контекст передаётся в поток, чтобы запросы учитывались в метриках обновления, которое их вызвало
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(get_executor(), functools.partial(context.run, func, *args, **kwargs))
+
+def shutdown():
+    """
+    Останавливает пул потоков базы и закрывает хранилище.
+    """
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=True)
+        _executor = None
+    get_storage().close()
+
+def _wrap(name: str) -> Callable:
+    method = getattr(Storage, name)
+
+    @functools.wraps(method)
+    async def wrapper(*args, **kwargs):
+        storage = get_storage()
+        if name in storage.memory_methods:
+            # Данные в памяти процесса: пул потоков не нужен
+            return getattr(storage, name)(*args, **kwargs)
+        return await run_db(getattr(storage, name), *args, **kwargs)
+    return wrapper
+
+def _direct(name: str) -> Callable:
+    method = getattr(Storage, name)
+
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        return getattr(get_storage(), name)(*args, **kwargs)
+    return wrapper
+
+open_storage = _wrap("open")
+add_user = _wrap("add_user")
+get_all_users = _wrap("get_all_users")
+get_users_page = _wrap("get_users_page")
+get_users_count = _wrap("get_users_count")
+remove_users = _wrap("remove_users")
+add_quiz = _wrap("add_quiz")
+get_questions_page = _wrap("get_questions_page")
+add_question = _wrap("add_question")
+delete_question = _wrap("delete_question")
+update_question_hint = _wrap("update_question_hint")
+complete_question = _wrap("complete_question")
+calculate_total_time = _wrap("calculate_total_time")
+add_to_top = _wrap("add_to_top")
+get_top = _wrap("get_top")
+get_my_info = _wrap("get_my_info")
+get_completed_questions = _wrap("get_completed_questions")
+delete_user_progress = _wrap("delete_user_progress")
+add_user_progress = _wrap("add_user_progress")
+record_answer = _wrap("record_answer")
+get_image_file_id = _wrap("get_image_file_id")
+save_image_file_id = _wrap("save_image_file_id")
+forget_image_file_id = _wrap("forget_image_file_id")
+create_broadcast = _wrap("create_broadcast")
+get_unfinished_broadcasts = _wrap("get_unfinished_broadcasts")
+save_broadcast_progress = _wrap("save_broadcast_progress")
+get_broadcast_recipients = _wrap("get_broadcast_recipients")
+
+# Вопросы читаются из каталога в памяти в любом хранилище, поэтому их можно вызывать прямо из цикла событий
+get_question_catalog = _direct("get_question_catalog")
+get_question = _direct("get_question")
+check_answer = _direct("check_answer")
+get_all_questions = _direct("get_all_questions")
+get_questions_count = _direct("get_questions_count")
+get_quizzes = _direct("get_quizzes")
+get_quiz = _direct("get_quiz")
+get_quiz_by_slug = _direct("get_quiz_by_slug")
@@ -0,0 +1,321 @@
+"""
+Рассылка сообщения всем пользователям.
+
+Пользователи читаются из базы пачками по первичному ключу (get_broadcast_recipients), поэтому
+в памяти держится одна пачка, а чтение следующей не дороже первой. Сообщения пачки
+отправляются несколькими потоками (в асинхронном режиме — задачами) через планировщик
+исходящих запросов с приоритетом LOW: рассылка занимает только свободную ёмкость
+глобального лимита Telegram и идёт в своих потоках, поэтому не задерживает квиз.
+
+После каждой пачки в базе сохраняются tg_id последнего пользователя пачки и счётчики.
+Рассылка, прерванная перезапуском бота, продолжается с места остановки: повторно
+сообщение могут получить не больше одной пачки пользователей. Так же останавливается рассылка,
+если база не ответила: пустая пачка означает конец списка, а ошибка — нет, поэтому рассылка
+остаётся незаконченной и продолжается после перезапуска. Пользователи, которые
+заблокировали бота или удалили аккаунт, удаляются из списка рассылки.
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, fields
+from typing import Any, Awaitable, Callable, Dict, List, Mapping, Optional
+
+from utils import metrics
+from utils.log import log_event
+
+# Результаты отправки одному пользователю
+SENT = "sent"
+FAILED = "failed"
+PRUNED = "pruned"  # Пользователь недоступен и удалён из списка рассылки
+
+
+@dataclass
+class Broadcast:
+    """
+    Рассылка и место, до которого она дошла.
+    """
+    broadcast_id: int
+    text: str
+    created_by: Optional[str] = None
+    status: str = "running"  # running, done или cancelled
+    cursor: Optional[str] = None  # tg_id последнего обработанного пользователя
+    sent: int = 0
+    failed: int = 0
+    pruned: int = 0
+
+    @classmethod
+    def from_row(cls, row: Mapping[str, Any]) -> "Broadcast":
+        return cls(**{f.name: row[f.name] for f in fields(cls) if f.name in row})
+
+    def record(self, users: List[Dict[str, Any]], outcomes: List[str]) -> List[str]:
+        """
+        Учитывает результаты отправки пачке пользователей и сдвигает курсор на конец пачки.
+
+        :return: tg_id пользователей, которых нужно удалить из списка рассылки.
+        """
+        self.sent += outcomes.count(SENT)
+        self.failed += outcomes.count(FAILED)
+        pruned = [user["tg_id"] for user, outcome in zip(users, outcomes) if outcome == PRUNED]
+        self.pruned += len(pruned)
+        self.cursor = users[-1]["tg_id"]
+        for outcome in (SENT, FAILED, PRUNED):
+            metrics.inc("bot_broadcast_messages_total", outcomes.count(outcome), result=outcome)
+        return pruned
+
+    def progress(self) -> tuple:
+        """
+        :return: Аргументы save_broadcast_progress.
+        """
+        return self.broadcast_id, self.cursor, self.sent, self.failed, self.pruned, self.status
+
+
+def is_unreachable(error: Exception) -> bool:
+    """
+    Проверяет, что пользователю больше нельзя написать: он заблокировал бота,
+    удалил аккаунт или чата не существует.
+
+    :param error: Исключение telebot (ApiTelegramException).
+    """
+    code = getattr(error, "error_code", None)
+    description = (getattr(error, "description", None) or "").lower()
+    return code == 403 or (code == 400 and "chat not found" in description)
+
+def _outcome(user: Dict[str, Any], error: Optional[Exception]) -> str:
+    if error is None:
+        return SENT
+    if is_unreachable(error):
+        return PRUNED
+    logging.error(f"Рассылка: не удалось отправить сообщение пользователю {user['tg_id']}: {error}")
+    return FAILED
+
+def _log_interrupted(broadcast: Broadcast):
+    # Статус в базе остаётся running: рассылка продолжится после перезапуска бота с сохранённого места
+    logging.error(f"Рассылка {broadcast.broadcast_id} остановлена из-за ошибки базы, "
+                  f"она продолжится после перезапуска бота")
+
+def _log_finished(broadcast: Broadcast):
+    log_event("broadcast.finished", f"Рассылка {broadcast.broadcast_id}: {broadcast.status}, отправлено {broadcast.sent}, "
+                           f"ошибок {broadcast.failed}, удалено {broadcast.pruned}",
+              broadcast_id=broadcast.broadcast_id, status=broadcast.status,
+              sent=broadcast.sent, failed=broadcast.failed, pruned=broadcast.pruned)
+
+
+class Broadcaster:
+    """
+    Выполняет рассылки в фоновых потоках, отдельных от потоков обработки обновлений.
+    """
+
+    def __init__(self, storage, send: Callable[[int, str], Any], workers: int = 4, chunk_size: int = 200,
+                 on_finish: Optional[Callable[[Broadcast], Any]] = None):
+        """
+        :param storage: Хранилище (utils.storage.Storage).
+        :param send: Отправка сообщения: send(chat_id, text). Обычно метод бота с приоритетом LOW.
+        :param workers: Одновременных отправок.
+        :param chunk_size: Пользователей в пачке.
+        :param on_finish: Вызывается, когда рассылка закончена или остановлена.
+        """
+        self.storage = storage
+        self.send = send
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.on_finish = on_finish
+        self._cancelled: Dict[int, threading.Event] = {}
+        self._lock = threading.Lock()
+
+    def start(self, text: str, created_by: int) -> Optional[Broadcast]:
+        """
+        Создаёт рассылку и запускает её.
+
+        :return: Рассылка, или None, если её не удалось сохранить.
+        """
+        row = self.storage.create_broadcast(text, created_by)
+        if row is None:
+            return None
+        broadcast = Broadcast.from_row(row)
+        self._launch(broadcast)
+        return broadcast
+
+    def resume(self) -> int:
+        """
+        Продолжает рассылки, прерванные остановкой бота.
+
+        :return: Количество продолженных рассылок.
+        """
+        broadcasts = [Broadcast.from_row(row) for row in self.storage.get_unfinished_broadcasts()]
+        for broadcast in broadcasts:
+            self._launch(broadcast)
+        return len(broadcasts)
+
+    def cancel(self, broadcast_id: int) -> bool:
+        """
+        Останавливает рассылку после текущей пачки.
+
+        :return: True, если рассылка выполнялась.
+        """
+        with self._lock:
+            cancelled = self._cancelled.get(broadcast_id)
+        if cancelled is None:
+            return False
+        cancelled.set()
+        return True
+
+    def active_count(self) -> int:
+        with self._lock:
+            return len(self._cancelled)
+
+    def _launch(self, broadcast: Broadcast):
+        with self._lock:
+            if broadcast.broadcast_id in self._cancelled:
+                return
+            self._cancelled[broadcast.broadcast_id] = threading.Event()
+        threading.Thread(target=self._run, args=(broadcast,), name=f"broadcast-{broadcast.broadcast_id}",
+                         daemon=True).start()
+
+    def _deliver(self, broadcast: Broadcast, user: Dict[str, Any]) -> str:
+        try:
+            self.send(int(user["tg_id"]), broadcast.text)
+            return SENT
+        except Exception as e:
+            return _outcome(user, e)
+
+    def _run(self, broadcast: Broadcast):
+        with self._lock:
+            cancelled = self._cancelled[broadcast.broadcast_id]
+        try:
+            with ThreadPoolExecutor(self.workers, thread_name_prefix=f"broadcast-{broadcast.broadcast_id}") as pool:
+                while broadcast.status == "running":
+                    if cancelled.is_set():
+                        broadcast.status = "cancelled"
+                        break
+                    users = self.storage.get_broadcast_recipients(broadcast.cursor, self.chunk_size)
+                    if users is None:
+                        _log_interrupted(broadcast)
+                        return
+                    if not users:
+                        broadcast.status = "done"
+                        break
+                    outcomes = list(pool.map(lambda user: self._deliver(broadcast, user), users))
+                    pruned = broadcast.record(users, outcomes)
+                    if pruned:
+                        self.storage.remove_users(pruned)
+                    if not self.storage.save_broadcast_progress(*broadcast.progress()):
+                        _log_interrupted(broadcast)
+                        return
+            if not self.storage.save_broadcast_progress(*broadcast.progress()):
+                _log_interrupted(broadcast)
+                return
+        except Exception as e:
+            # Рассылка остаётся незаконченной и продолжится после перезапуска бота
+            logging.error(f"Ошибка рассылки {broadcast.broadcast_id}: {e}")
+            return
+        finally:
+            with self._lock:
+                self._cancelled.pop(broadcast.broadcast_id, None)
+        _log_finished(broadcast)
+        if self.on_finish is not None:
+            try:
+                self.on_finish(broadcast)
+            except Exception as e:
+                logging.error(f"Ошибка при завершении рассылки {broadcast.broadcast_id}: {e}")
+
+
+class AsyncBroadcaster:
+    """
+    То же, что Broadcaster, для асинхронного режима: пачка отправляется задачами в цикле событий,
+    а запросы к базе выполняются в пуле потоков базы (utils.async_database).
+    """
+
+    def __init__(self, db, send: Callable[[int, str], Awaitable[Any]], workers: int = 4, chunk_size: int = 200,
+                 on_finish: Optional[Callable[[Broadcast], Awaitable[Any]]] = None):
+        """
+        :param db: Модуль utils.async_database.
+        :param send: Асинхронная отправка сообщения: send(chat_id, text).
+        """
+        self.db = db
+        self.send = send
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.on_finish = on_finish
+        self._tasks: Dict[int, Any] = {}  # ID рассылки -> asyncio.Task
+        self._cancelled: Dict[int, Any] = {}  # ID рассылки -> asyncio.Event
+
+    async def start(self, text: str, created_by: int) -> Optional[Broadcast]:
+        row = await self.db.create_broadcast(text, created_by)
+        if row is None:
+            return None
+        broadcast = Broadcast.from_row(row)
+        self._launch(broadcast)
+        return broadcast
+
+    async def resume(self) -> int:
+        broadcasts = [Broadcast.from_row(row) for row in await self.db.get_unfinished_broadcasts()]
+        for broadcast in broadcasts:
+            self._launch(broadcast)
+        return len(broadcasts)
+
+    def cancel(self, broadcast_id: int) -> bool:
+        cancelled = self._cancelled.get(broadcast_id)
+        if cancelled is None:
+            return False
+        cancelled.set()
+        return True
+
+    def active_count(self) -> int:
+        return len(self._tasks)
+
+    def _launch(self, broadcast: Broadcast):
+        # asyncio импортируется только в асинхронном режиме: синхронный бот запускается быстрее
+        import asyncio
+
+        if broadcast.broadcast_id in self._tasks:
+            return
+        self._cancelled[broadcast.broadcast_id] = asyncio.Event()
+        self._tasks[broadcast.broadcast_id] = asyncio.create_task(self._run(broadcast))
+
+    async def _deliver(self, broadcast: Broadcast, user: Dict[str, Any], semaphore) -> str:
+        async with semaphore:
+            try:
+                await self.send(int(user["tg_id"]), broadcast.text)
+                return SENT
+            except Exception as e:
+                return _outcome(user, e)
+
+    async def _run(self, broadcast: Broadcast):
+        import asyncio
+
+        cancelled = self._cancelled[broadcast.broadcast_id]
+        semaphore = asyncio.Semaphore(self.workers)
+        try:
+            while broadcast.status == "running":
+                if cancelled.is_set():
+                    broadcast.status = "cancelled"
+                    break
+                users = await self.db.get_broadcast_recipients(broadcast.cursor, self.chunk_size)
+                if users is None:
+                    _log_interrupted(broadcast)
+                    return
+                if not users:
+                    broadcast.status = "done"
+                    break
+                outcomes = await asyncio.gather(*(self._deliver(broadcast, user, semaphore) for user in users))
+                pruned = broadcast.record(users, list(outcomes))
+                if pruned:
+                    await self.db.remove_users(pruned)
+                if not await self.db.save_broadcast_progress(*broadcast.progress()):
+                    _log_interrupted(broadcast)
+                    return
+            if not await self.db.save_broadcast_progress(*broadcast.progress()):
+                _log_interrupted(broadcast)
+                return
+        except Exception as e:
+            logging.error(f"Ошибка рассылки {broadcast.broadcast_id}: {e}")
+            return
+        finally:
+            self._tasks.pop(broadcast.broadcast_id, None)
+            self._cancelled.pop(broadcast.broadcast_id, None)
+        _log_finished(broadcast)
+        if self.on_finish is not None:
+            try:
+                await self.on_finish(broadcast)
+            except Exception as e:
+                logging.error(f"Ошибка при завершении рассылки {broadcast.broadcast_id}: {e}")
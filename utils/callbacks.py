@@ -0,0 +1,175 @@
+import logging
+import secrets
+from typing import Any, Callable, Dict, Mapping, Optional, Tuple, Union
+
+from utils import metrics
+
+# Версия формата callback_data. Первый символ данных кнопки — версия, второй — код действия,
+# дальше аргументы действия в base36 через точку: "1a5.2.k3f" — ответ 2 на вопрос 5 в сессии k3f.
+VERSION = "1"
+
+# Коды действий
+ANSWER = "a"           # Ответ на вопрос: ID вопроса, номер варианта, nonce сессии
+HINT = "h"             # Подсказка: ID вопроса, nonce сессии
+ADMIN = "m"            # Раздел админ-панели: номер из ADMIN_ACTIONS
+DELETE_QUESTION = "d"  # Удаление вопроса: ID вопроса, номер и курсор страницы списка
+ADD_QUESTION = "q"     # Добавление вопроса
+USER_DETAIL = "u"      # Карточка пользователя: ID пользователя
+QUESTIONS_PAGE = "l"   # Страница списка вопросов: номер страницы, направление, ID вопроса-курсора
+USERS_PAGE = "p"       # Страница списка пользователей: номер страницы, направление, ID пользователя-курсора
+START_QUIZ = "s"       # Выбор квиза для прохождения: ID квиза
+BROADCAST_CANCEL = "b"  # Остановка рассылки: ID рассылки
+
+# Все коды действий: данные с другим кодом не распознаются
+_ACTIONS = frozenset((ANSWER, HINT, ADMIN, DELETE_QUESTION, ADD_QUESTION, USER_DETAIL, QUESTIONS_PAGE, USERS_PAGE,
+                      START_QUIZ, BROADCAST_CANCEL))
+
+# Направление листания: страница после курсора или перед ним
+PAGE_AFTER = 0
+PAGE_BEFORE = 1
+
+# Разделы админ-панели по номерам
+ADMIN_ACTIONS = ("questions", "users", "stats", "back", "close", "broadcast")
+
+# Подставляется вместо nonce в заранее собранные клавиатуры вопросов (см. utils.payloads).
+# Сериализованная в JSON клавиатура содержит его как \u0000
+NONCE_PLACEHOLDER = "\x00"
+
+# Кнопки, отправленные до появления версии формата: префикс -> код действия
+_LEGACY_PREFIXES = (
+    ("answer_", ANSWER), ("hint_", HINT), ("admin_", ADMIN),
+    ("delete_question_", DELETE_QUESTION), ("add_question", ADD_QUESTION), ("user_detail_", USER_DETAIL),
+)
+
+_DIGITS = "0123456789abcdefghijklmnopqrstuvwxyz"
+
+Arg = Union[int, str]
+
+
+def to_base36(value: int) -> str:
+    if value < 0:
+        return "-" + to_base36(-value)
+    if value < 36:
+        return _DIGITS[value]
+    digits = []
+    while value:
+        value, digit = divmod(value, 36)
+        digits.append(_DIGITS[digit])
+    return "".join(reversed(digits))
+
+def new_nonce() -> int:
+    """
+    :return: Случайный nonce сессии квиза (до четырёх символов в base36).
+    """
+    return secrets.randbelow(36 ** 4)
+
+def encode(action: str, *args: Arg) -> str:
+    """
+    Кодирует действие кнопки в callback_data.
+
+    :param action: Код действия.
+    :param args: Целые аргументы. Строка передаётся как есть (например, NONCE_PLACEHOLDER).
+    :return: Строка не длиннее 64 байт, как требует Telegram.
+    """
+    data = VERSION + action + ".".join(arg if isinstance(arg, str) else to_base36(arg) for arg in args)
+    if len(data.encode()) > 64:
+        raise ValueError(f"callback_data длиннее 64 байт: {data}")
+    return data
+
+def decode(data: str) -> Optional[Tuple[str, Tuple[int, ...]]]:
+    """
+    Разбирает callback_data.
+
+    :return: (код действия, аргументы), или None, если данные не распознаны.
+        У кнопок старого формата nonce нет, поэтому аргументов на один меньше.
+    """
+    try:
+        if data[:1] == VERSION and data[1:2] in _ACTIONS:
+            body = data[2:]
+            return data[1], tuple(int(arg, 36) for arg in body.split(".")) if body else ()
+        return _decode_legacy(data)
+    except ValueError:
+        return None
+
+def _decode_legacy(data: str) -> Optional[Tuple[str, Tuple[int, ...]]]:
+    for prefix, action in _LEGACY_PREFIXES:
+        if data.startswith(prefix):
+            rest = data[len(prefix):]
+            if prefix.endswith("_") and not rest:
+                # Префикс без аргументов, которые у действия обязательны
+                return None
+            if action == ADMIN:
+                return action, (ADMIN_ACTIONS.index(rest.split("_")[0]),)
+            return action, tuple(int(arg) for arg in rest.split("_")) if rest else ()
+    return None
+
+def is_stale_nonce(session: Optional[Mapping[str, Any]], nonce: Optional[int]) -> bool:
+    """
+    Проверяет, что кнопка вопроса отправлена в прошлом прохождении квиза.
+    У кнопок старого формата nonce нет, их проверяет только хранилище.
+
+    :param session: Сессия квиза пользователя, или None.
+    """
+    if nonce is None:
+        return False
+    return session is not None and session.get("nonce", nonce) != nonce
+
+
+class CallbackRouter:
+    """
+    Направляет нажатия кнопок в обработчики по коду действия.
+
+    callback_data разбирается один раз, а обработчик выбирается по словарю, поэтому
+    стоимость маршрутизации не зависит от количества действий. Обработчик получает
+    нажатие и аргументы действия: handler(call, *args).
+    """
+
+    def __init__(self):
+        self.handlers: Dict[str, Callable] = {}
+
+    def register(self, action: str) -> Callable[[Callable], Callable]:
+        """
+        Декоратор обработчика действия. Обработчик учитывается в метриках под своим именем.
+        """
+        def decorator(handler: Callable) -> Callable:
+            self.handlers[action] = metrics.instrument_handler(handler)
+            return handler
+        return decorator
+
+    def resolve(self, call) -> Optional[Tuple[Callable, Tuple[int, ...]]]:
+        """
+        :return: (обработчик, аргументы), или None, если кнопка не распознана или у действия нет обработчика.
+        """
+        decoded = decode(call.data or "")
+        if decoded is None:
+            logging.debug(f"Нераспознанная кнопка: {call.data!r}")
+            return None
+        handler = self.handlers.get(decoded[0])
+        if handler is None:
+            return None
+        return handler, decoded[1]
+
+    def attach(self, bot):
+        """
+        Регистрирует в TeleBot единственный обработчик нажатий, который вызывает маршрутизатор.
+        """
+        def route_callback(call):
+            route = self.resolve(call)
+            if route is not None:
+                route[0](call, *route[1])
+
+        # Время и запросы учитываются в метриках по обработчикам действий
+        route_callback.instrumented = True
+        bot.register_callback_query_handler(route_callback, func=None)
+
+    def attach_async(self, bot):
+        """
+        То же, что attach, для AsyncTeleBot и асинхронных обработчиков.
+        """
+        async def route_callback(call):
+            route = self.resolve(call)
+            if route is not None:
+                await route[0](call, *route[1])
+
+        route_callback.instrumented = True
+        bot.register_callback_query_handler(route_callback, func=None)
@@ -0,0 +1,77 @@
+import os
+from dotenv import load_dotenv
+
+# Загрузка переменных окружения
+load_dotenv()
+BOT_TOKEN = os.getenv("BOT_API")
+ADMIN_IDS = [int(id.strip()) for id in os.getenv("ADMIN", "").split(",") if id.strip()]
+WORKERS = int(os.getenv("WORKERS", "8"))  # Количество потоков для обработки обновлений
+MAX_PENDING_UPDATES = int(os.getenv("MAX_PENDING_UPDATES", "1000"))  # Предел очереди необработанных обновлений
+SESSION_STORE = os.getenv("SESSION_STORE", "sqlite")  # Хранилище сессий: memory или sqlite (таблица Sessions хранилища данных)
+SESSION_TTL = int(os.getenv("SESSION_TTL", "86400"))  # Время жизни сессии без активности, в секундах
+SESSION_FLUSH_INTERVAL = float(os.getenv("SESSION_FLUSH_INTERVAL", "1.0"))  # Период записи сессий в базу, в секундах
+RUNTIME = os.getenv("RUNTIME", "sync")  # Режим работы: sync (потоки) или async (asyncio)
+DB_THREADS = int(os.getenv("DB_THREADS", "4"))  # Потоки для запросов к базе в режиме async
+API_CONNECTIONS = int(os.getenv("API_CONNECTIONS", "1000"))  # Одновременные запросы к Telegram в режиме async
+PREWARM = os.getenv("PREWARM", "1") == "1"  # Прогревать сообщения с вопросами и картинки в фоне при запуске
+SHUFFLE_QUESTIONS = os.getenv("SHUFFLE_QUESTIONS", "1") == "1"  # Свой порядок вопросов в каждом прохождении квиза
+SHUFFLE_OPTIONS = os.getenv("SHUFFLE_OPTIONS", "1") == "1"  # Свой порядок вариантов ответа в каждом прохождении квиза
+
+# Хранилище данных: sqlite (файл storage/database.db) или postgres (общая база для нескольких экземпляров бота)
+STORAGE = os.getenv("STORAGE", "sqlite")
+DATABASE_URL = os.getenv("DATABASE_URL")  # Строка подключения к PostgreSQL
+POSTGRES_POOL_SIZE = int(os.getenv("POSTGRES_POOL_SIZE", "16"))  # Предел соединений пула, не меньше WORKERS
+# Как часто экземпляр бота с postgres проверяет, не изменил ли каталог вопросов другой экземпляр, в секундах
+CATALOG_CHECK_INTERVAL = float(os.getenv("CATALOG_CHECK_INTERVAL", "1"))
+
+# Отложенная запись прогресса: записи копятся и фиксируются одной транзакцией
+PROGRESS_WRITE_BEHIND = os.getenv("PROGRESS_WRITE_BEHIND", "0") == "1"
+PROGRESS_FLUSH_MS = int(os.getenv("PROGRESS_FLUSH_MS", "50"))  # Максимальная задержка записи, в миллисекундах
+PROGRESS_FLUSH_ROWS = int(os.getenv("PROGRESS_FLUSH_ROWS", "500"))  # Сколько записей копить до внеочередной фиксации
+
+# Лимиты исходящих запросов к Telegram API
+API_GLOBAL_RATE = float(os.getenv("API_GLOBAL_RATE", "30"))  # Запросов в секунду на всего бота
+API_CHAT_RATE = float(os.getenv("API_CHAT_RATE", "1"))  # Сообщений в секунду в один чат
+API_CHAT_BURST = int(os.getenv("API_CHAT_BURST", "3"))  # Сообщений в чат, которые можно отправить разом
+API_MAX_RETRIES = int(os.getenv("API_MAX_RETRIES", "3"))  # Повторы после 429 и ошибок сервера Telegram
+
+# Рассылка всем пользователям (utils/broadcast.py)
+BROADCAST_RATE = float(os.getenv("BROADCAST_RATE", "20"))  # Сообщений рассылки в секунду, меньше API_GLOBAL_RATE
+BROADCAST_WORKERS = int(os.getenv("BROADCAST_WORKERS", "4"))  # Одновременных отправок рассылки
+BROADCAST_CHUNK = int(os.getenv("BROADCAST_CHUNK", "200"))  # Пользователей в пачке; прогресс сохраняется после каждой пачки
+
+# Подготовка картинок вопросов к отправке (utils/images.py, нужен пакет Pillow)
+IMAGE_PIPELINE = os.getenv("IMAGE_PIPELINE", "1") == "1"  # Отправлять уменьшенные и пережатые копии картинок
+IMAGE_DIR = os.getenv("IMAGE_DIR", "storage/images")  # Папка для подготовленных картинок и их манифеста
+IMAGE_MAX_SIDE = int(os.getenv("IMAGE_MAX_SIDE", "1280"))  # Длинная сторона картинки; клиенты Telegram больше не показывают
+IMAGE_QUALITY = int(os.getenv("IMAGE_QUALITY", "85"))  # Качество JPEG
+
+# Получение обновлений: polling (long polling) или webhook (HTTP-сервер)
+UPDATES_MODE = os.getenv("UPDATES_MODE", "polling")
+WEBHOOK_URL = os.getenv("WEBHOOK_URL")  # Публичный адрес, который регистрируется в setWebhook
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8443"))
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook")
+# secret_token для проверки запросов от Telegram. Если не задан, при запуске генерируется случайный;
+# для нескольких узлов за одним адресом нужен общий
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET")
+WEBHOOK_QUEUE_SIZE = int(os.getenv("WEBHOOK_QUEUE_SIZE", "1000"))
+
+# Метрики: задержки обработчиков и хранилища, запросы к Telegram, длины очередей
+METRICS = os.getenv("METRICS", "1") == "1"
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))  # Порт для GET /metrics в формате Prometheus, 0 — без сервера
+METRICS_FILE = os.getenv("METRICS_FILE")  # Файл, в который метрики периодически записываются
+METRICS_DUMP_INTERVAL = float(os.getenv("METRICS_DUMP_INTERVAL", "60"))  # Период записи файла, в секундах
+
+# Логирование: записи уходят в очередь, а файл и консоль обслуживает фоновый поток
+LOG_FILE = os.getenv("LOG_FILE", "bot.log")
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")  # Формат файла: json (одна запись JSON на строку) или text
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", str(10 * 1024 * 1024)))  # Размер файла, после которого он ротируется
+LOG_BACKUP_COUNT = int(os.getenv("LOG_BACKUP_COUNT", "5"))  # Сколько старых файлов хранить
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))  # Предел очереди записей; при переполнении записи отбрасываются
+LOG_SAMPLE_EVERY = int(os.getenv("LOG_SAMPLE_EVERY", "100"))  # Из частых событий базы записывается одно из N
+LOG_CONSOLE = os.getenv("LOG_CONSOLE", "1") == "1"  # Дублировать лог в консоль
+
+def is_admin(user_id: int) -> bool:
+    return user_id in ADMIN_IDS
@@ -1,10 +1,74 @@
+import logging
 import sqlite3
-from typing import List, Tuple, Any, Dict, Optional
+import threading
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import List, Tuple, Any, Dict, Mapping, Optional, Sequence
 import time
 
+from utils import metrics
+from utils.config import METRICS
+from utils.leaderboard import Leaderboard
+from utils.log import log_event
+from utils.ordering import QuestionOrder, first_question_id, last_question_id, next_question_id
+from utils.quizzes import DEFAULT_QUIZ_ID, DEFAULT_QUIZ_SLUG, DEFAULT_QUIZ_TITLE, Quiz, QuizIndex, build_quiz_index
+from utils.write_behind import WriteBehindQueue
+
 # Путь к базе данных
 db_path = "storage/database.db"
 
+# Размер кэша подготовленных выражений для каждого соединения
+STATEMENT_CACHE_SIZE = 256
+
+# Соединения хранятся по одному на поток и живут всё время работы бота
+_local = threading.local()
+_connections: List[sqlite3.Connection] = []
+_connections_lock = threading.Lock()
+_generation = 0
+
+def get_connection() -> sqlite3.Connection:
+    """
+    Возвращает долгоживущее соединение с базой данных для текущего потока.
+
+    Соединение открывается один раз на поток и переиспользуется всеми функциями модуля,
+    поэтому обработчики не тратят время на открытие и закрытие базы при каждом запросе.
+    Новое соединение сразу переводится в режим WAL с synchronous=NORMAL.
+
+    :return: Соединение sqlite3, закреплённое за текущим потоком.
+    """
+    conn = getattr(_local, "conn", None)
+    if conn is not None and _local.path == db_path and _local.generation == _generation:
+        return conn
+
+    # check_same_thread=False нужен только для закрытия соединений из главного потока при остановке
+    conn = sqlite3.connect(db_path, cached_statements=STATEMENT_CACHE_SIZE, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    if METRICS:
+        conn.set_trace_callback(metrics.count_query)
+
+    with _connections_lock:
+        _connections.append(conn)
+        _local.generation = _generation
+    _local.conn = conn
+    _local.path = db_path
+    return conn
+
+def close_connections():
+    """
+    Закрывает все открытые соединения с базой данных.
+    Потоки, которые обратятся к базе после этого, откроют новые соединения.
+    """
+    global _generation
+    with _connections_lock:
+        _generation += 1
+        for conn in _connections:
+            try:
+                conn.close()
+            except sqlite3.Error as e:
+                logging.error(f"Ошибка при закрытии соединения: {e}")
+        _connections.clear()
+
 def normalize_fetchall(list_for_normalize: List[Tuple[Any, ...]]) -> List[Any]:
     """
     Преобразует список кортежей в плоский список, извлекая первый элемент каждого кортежа.
@@ -21,7 +85,7 @@ def create_tables():
     """
     try:
         # Подключаемся к базе данных
-        with sqlite3.connect(db_path) as conn:
+        with get_connection() as conn:
             cursor = conn.cursor()
 
             # Создаем таблицу Users, если она не существует
@@ -72,13 +136,157 @@ def create_tables():
                 )
             ''')
 
+            # Создаем таблицу ImageCache, если она не существует
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS ImageCache (
+                    image_path TEXT PRIMARY KEY,  -- Путь к изображению
+                    content_hash TEXT NOT NULL,  -- SHA-256 содержимого файла
+                    file_id TEXT NOT NULL  -- file_id, который Telegram вернул после загрузки
+                )
+            ''')
+
             # Фиксируем изменения в базе данных
             conn.commit()
-            print("Таблицы успешно созданы или уже существуют.")
+            logging.info("Таблицы успешно созданы или уже существуют.")
 
     except sqlite3.Error as e:
         # Обработка ошибок при работе с базой данных
-        print(f"Ошибка при создании таблиц: {e}")
+        logging.error(f"Ошибка при создании таблиц: {e}")
+        return
+
+    # Доводим схему до последней версии
+    migrate()
+
+# Миграции схемы: (версия, список SQL-команд).
+# Номер последней применённой миграции хранится в PRAGMA user_version базы данных.
+MIGRATIONS: List[Tuple[int, List[str]]] = [
+    (1, [
+        # Поиск прогресса пользователя по вопросу: add_user_progress, complete_question
+        "CREATE INDEX IF NOT EXISTS idx_progress_user_question ON UserProgress (tg_id, question_id)",
+        # Пройденные вопросы пользователя: get_completed_questions, calculate_total_time, delete_user_progress
+        "CREATE INDEX IF NOT EXISTS idx_progress_user_completed ON UserProgress (tg_id, is_completed)",
+        # Место в топе и сортировка топа: get_my_info, get_top
+        "CREATE INDEX IF NOT EXISTS idx_top_total_time ON TopUsers (total_time)",
+    ]),
+    (2, [
+        # Одна запись прогресса на пару (пользователь, вопрос), чтобы работал UPSERT в record_answer
+        '''DELETE FROM UserProgress WHERE progress_id NOT IN (
+            SELECT MIN(progress_id) FROM UserProgress GROUP BY tg_id, question_id
+        )''',
+        "DROP INDEX IF EXISTS idx_progress_user_question",
+        "CREATE UNIQUE INDEX idx_progress_user_question ON UserProgress (tg_id, question_id)",
+    ]),
+    (3, [
+        # Сессии пользователей (utils/sessions.py)
+        '''CREATE TABLE IF NOT EXISTS Sessions (
+            key TEXT PRIMARY KEY,  -- Ключ сессии
+            value TEXT NOT NULL,  -- Значение в JSON
+            expires_at INTEGER NOT NULL  -- Время истечения (timestamp)
+        )''',
+        "CREATE INDEX IF NOT EXISTS idx_sessions_expires_at ON Sessions (expires_at)",
+    ]),
+    (4, [
+        # Несколько квизов: у каждого свой набор вопросов в заданном порядке и свой топ
+        '''CREATE TABLE IF NOT EXISTS Quizzes (
+            quiz_id INTEGER PRIMARY KEY AUTOINCREMENT,  -- Уникальный ID квиза
+            slug TEXT NOT NULL UNIQUE,  -- Короткое имя для /start_quiz <slug>
+            title TEXT NOT NULL  -- Название квиза
+        )''',
+        f"INSERT OR IGNORE INTO Quizzes (quiz_id, slug, title) VALUES ({DEFAULT_QUIZ_ID}, '{DEFAULT_QUIZ_SLUG}', '{DEFAULT_QUIZ_TITLE}')",
+        # Порядок вопросов квиза. Вопрос входит не больше чем в один квиз, поэтому прогресс
+        # пользователя по-прежнему хранится по паре (пользователь, вопрос)
+        '''CREATE TABLE IF NOT EXISTS QuizQuestions (
+            quiz_id INTEGER NOT NULL,  -- ID квиза
+            position INTEGER NOT NULL,  -- Номер вопроса в квизе
+            question_id INTEGER NOT NULL UNIQUE,  -- ID вопроса
+            PRIMARY KEY (quiz_id, position)
+        )''',
+        # Вопросы существующей базы образуют квиз по умолчанию в прежнем порядке
+        f"INSERT OR IGNORE INTO QuizQuestions (quiz_id, position, question_id) SELECT {DEFAULT_QUIZ_ID}, question_id, question_id FROM Questions",
+        # Топ по квизам: первичный ключ (квиз, пользователь) вместо пользователя
+        "ALTER TABLE TopUsers RENAME TO TopUsersOld",
+        f'''CREATE TABLE TopUsers (
+            quiz_id INTEGER NOT NULL DEFAULT {DEFAULT_QUIZ_ID},  -- ID квиза
+            tg_id TEXT NOT NULL,  -- Уникальный ID пользователя в Telegram
+            username TEXT,  -- Имя пользователя
+            total_time INTEGER,  -- Общее время прохождения квиза (в секундах)
+            PRIMARY KEY (quiz_id, tg_id)
+        )''',
+        f"INSERT INTO TopUsers (quiz_id, tg_id, username, total_time) SELECT {DEFAULT_QUIZ_ID}, tg_id, username, total_time FROM TopUsersOld",
+        "DROP TABLE TopUsersOld",
+        "CREATE INDEX IF NOT EXISTS idx_top_quiz_time ON TopUsers (quiz_id, total_time)",
+    ]),
+    (5, [
+        # Рассылки (utils/broadcast.py): текст и место, до которого дошла отправка
+        '''CREATE TABLE IF NOT EXISTS Broadcasts (
+            broadcast_id INTEGER PRIMARY KEY AUTOINCREMENT,  -- Уникальный ID рассылки
+            text TEXT NOT NULL,  -- Текст сообщения
+            created_by TEXT,  -- ID администратора в Telegram
+            created_at INTEGER NOT NULL,  -- Время создания (timestamp)
+            status TEXT NOT NULL DEFAULT 'running',  -- running, done или cancelled
+            cursor TEXT,  -- tg_id последнего пользователя, до которого дошла рассылка
+            sent INTEGER NOT NULL DEFAULT 0,  -- Доставлено сообщений
+            failed INTEGER NOT NULL DEFAULT 0,  -- Не доставлено из-за ошибок
+            pruned INTEGER NOT NULL DEFAULT 0  -- Удалено пользователей, заблокировавших бота
+        )''',
+    ]),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+def get_schema_version() -> int:
+    """
+    Возвращает версию схемы базы данных.
+
+    :return: Номер последней применённой миграции.
+    """
+    with get_connection() as conn:
+        return conn.execute("PRAGMA user_version").fetchone()[0]
+
+def migrate() -> int:
+    """
+    Применяет к базе данных миграции, которые ещё не были применены.
+    Каждая миграция выполняется в отдельной транзакции вместе с обновлением версии схемы.
+
+    :return: Версия схемы после миграции.
+    """
+    version = 0
+    try:
+        conn = get_connection()
+        version = get_schema_version()
+        for target, statements in MIGRATIONS:
+            if target <= version:
+                continue
+            with conn:
+                conn.execute("BEGIN")
+                for statement in statements:
+                    conn.execute(statement)
+                conn.execute(f"PRAGMA user_version = {target}")
+            version = target
+            logging.info(f"Схема базы данных обновлена до версии {version}.")
+    except sqlite3.Error as e:
+        logging.error(f"Ошибка при миграции базы данных (версия {version}): {e}")
+    return version
+
+def ensure_schema() -> int:
+    """
+    Проверяет схему при запуске бота.
+
+    Если версия схемы в PRAGMA user_version уже последняя, таблицы и индексы существуют,
+    и DDL не выполняется: при запуске читается только заголовок файла базы.
+    Иначе создаются таблицы и применяются миграции (create_tables).
+
+    :return: Версия схемы.
+    """
+    try:
+        version = get_schema_version()
+    except sqlite3.Error as e:
+        logging.error(f"Ошибка при чтении версии схемы: {e}")
+        version = 0
+    if version >= SCHEMA_VERSION:
+        return version
+    create_tables()
+    return get_schema_version()
 
 # Функция для добавления пользователя
 def add_user(user_id: int, username: str) -> bool:
@@ -91,26 +299,46 @@ def add_user(user_id: int, username: str) -> bool:
     """
     try:
         # Подключаемся к базе данных
-        with sqlite3.connect(db_path) as conn:
+        with get_connection() as conn:
             cursor = conn.cursor()
 
             # Проверяем, существует ли пользователь
             cursor.execute("SELECT tg_id FROM Users WHERE tg_id = ?", (str(user_id),))
             if cursor.fetchone():
-                print(f"Пользователь {user_id} уже существует.")
+                log_event("db.user_exists", f"Пользователь {user_id} уже существует.", sample=True, user_id=user_id)
                 return True  # Пользователь уже существует
 
             # Добавляем нового пользователя
             cursor.execute("INSERT INTO Users (tg_id, username) VALUES (?, ?)", (str(user_id), username))
             conn.commit()
-            print(f"Пользователь {user_id} успешно добавлен.")
+            log_event("db.user_added", f"Пользователь {user_id} успешно добавлен.", sample=True, user_id=user_id)
             return True  # Пользователь успешно добавлен
 
     except sqlite3.Error as e:
         # Обработка ошибок при добавлении пользователя
-        print(f"Ошибка при добавлении пользователя {user_id}: {e}")
+        logging.error(f"Ошибка при добавлении пользователя {user_id}: {e}")
         return False  # Произошла ошибка
 
+def add_users(users: List[Tuple[int, str]]) -> int:
+    """
+    Добавляет пачку пользователей одной транзакцией. Существующие пользователи не меняются.
+
+    :param users: Список кортежей (ID пользователя, имя).
+    :return: Количество новых пользователей (0 при ошибке).
+    """
+    try:
+        with get_connection() as conn:
+            before = conn.total_changes
+            conn.executemany(
+                "INSERT OR IGNORE INTO Users (tg_id, username) VALUES (?, ?)",
+                ((str(user_id), username) for user_id, username in users)
+            )
+            _reset_users_count()
+            return conn.total_changes - before
+    except sqlite3.Error as e:
+        logging.error(f"Ошибка при добавлении пачки пользователей: {e}")
+        return 0
+
 # Функция для удаления пользователя
 def delete_user(user_id: int) -> bool:
     """
@@ -119,9 +347,13 @@ def delete_user(user_id: int) -> bool:
     :param user_id: ID пользователя в Telegram.
     :return: True, если пользователь успешно удален, иначе False.
     """
+    # Незаписанный прогресс пользователя больше не нужен
+    if _progress_queue is not None:
+        _progress_queue.take(str(user_id))
+
     try:
         # Подключаемся к базе данных
-        with sqlite3.connect(db_path) as conn:
+        with get_connection() as conn:
             cursor = conn.cursor()
 
             # Удаляем пользователя
@@ -135,12 +367,14 @@ def delete_user(user_id: int) -> bool:
 
             # Фиксируем изменения в базе данных
             conn.commit()
-            print(f"Пользователь {user_id} успешно удален.")
+            _remove_from_leaderboards(user_id)
+            _reset_users_count()
+            log_event("db.user_deleted", f"Пользователь {user_id} успешно удален.", user_id=user_id)
             return True  # Пользователь успешно удален
 
     except sqlite3.Error as e:
         # Обработка ошибок при удалении пользователя
-        print(f"Ошибка при удалении пользователя {user_id}: {e}")
+        logging.error(f"Ошибка при удалении пользователя {user_id}: {e}")
         return False  # Произошла ошибка
 
 # Функция для получения всех пользователей
@@ -152,21 +386,21 @@ def get_all_users() -> List[str]:
     """
     try:
         # Подключаемся к базе данных
-        with sqlite3.connect(db_path) as conn:
+        with get_connection() as conn:
             cursor = conn.cursor()
 
             # Получаем всех пользователей
             cursor.execute("SELECT tg_id FROM Users")
             users = normalize_fetchall(cursor.fetchall())
-            print(f"Найдено {len(users)} пользователей.")
+            log_event("db.users_listed", f"Найдено {len(users)} пользователей.", count=len(users))
             return users
 
     except sqlite3.Error as e:
         # Обработка ошибок при получении пользователей
-        print(f"Ошибка при получении пользователей: {e}")
+        logging.error(f"Ошибка при получении пользователей: {e}")
         return []
 
-def add_question(question_text: str, option1: str, option2: str, option3: str, option4: str, correct_option: int, image_path: Optional[str] = None, hint: Optional[str] = None, description: Optional[str] = None) -> bool:
+def add_question(question_text: str, option1: str, option2: str, option3: str, option4: str, correct_option: int, image_path: Optional[str] = None, hint: Optional[str] = None, description: Optional[str] = None, quiz_id: int = DEFAULT_QUIZ_ID) -> bool:
     """
     Добавляет вопрос в базу данных с вариантами ответов, изображением, подсказкой и описанием правильного ответа.
 
@@ -179,11 +413,12 @@ def add_question(question_text: str, option1: str, option2: str, option3: str, o
     :param image_path: Путь к изображению (опционально).
     :param hint: Подсказка к вопросу (опционально).
     :param description: Описание правильного ответа (опционально).
+    :param quiz_id: Квиз, в конец которого добавляется вопрос.
     :return: True, если вопрос успешно добавлен, иначе False.
     """
     try:
         # Подключаемся к базе данных
-        with sqlite3.connect(db_path) as conn:
+        with get_connection() as conn:
             cursor = conn.cursor()
 
             # Добавляем вопрос с вариантами ответов, изображением, подсказкой и описанием
@@ -191,56 +426,254 @@ def add_question(question_text: str, option1: str, option2: str, option3: str, o
                 INSERT INTO Questions (question_text, option1, option2, option3, option4, correct_option, image_path, hint, description)
                 VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
             ''', (question_text, option1, option2, option3, option4, correct_option, image_path, hint, description))
+            _append_to_quiz(conn, quiz_id, [cursor.lastrowid])
 
             # Фиксируем изменения в базе данных
             conn.commit()
-            print(f"Вопрос '{question_text}' успешно добавлен.")
+            load_question_catalog()
+            log_event("db.question_added", f"Вопрос '{question_text}' успешно добавлен.", question_text=question_text)
             return True  # Вопрос успешно добавлен
 
     except sqlite3.Error as e:
         # Обработка ошибок при добавлении вопроса
-        print(f"Ошибка при добавлении вопроса '{question_text}': {e}")
+        logging.error(f"Ошибка при добавлении вопроса '{question_text}': {e}")
         return False  # Произошла ошибка
 
+def _append_to_quiz(conn: sqlite3.Connection, quiz_id: int, question_ids: List[int]):
+    """
+    Добавляет вопросы в конец квиза. Вопрос, который уже входит в квиз, остаётся на своём месте.
+    """
+    conn.executemany('''
+        INSERT OR IGNORE INTO QuizQuestions (quiz_id, position, question_id)
+        VALUES (?, (SELECT COALESCE(MAX(position), 0) + 1 FROM QuizQuestions WHERE quiz_id = ?), ?)
+    ''', ((quiz_id, quiz_id, question_id) for question_id in question_ids))
 
+def add_questions(questions: List[Dict[str, Any]], quiz_id: int = DEFAULT_QUIZ_ID) -> int:
+    """
+    Добавляет пачку вопросов в конец квиза одной транзакцией и один раз пересобирает каталог.
 
-def get_question(question_id: int) -> Optional[Dict[str, Any]]:
+    :param questions: Словари с ключами как у аргументов add_question.
+    :param quiz_id: ID квиза.
+    :return: Количество добавленных вопросов (0 при ошибке).
     """
-    Возвращает вопрос с вариантами ответов, изображением, подсказкой и описанием правильного ответа.
+    try:
+        with get_connection() as conn:
+            question_ids = [conn.execute('''
+                INSERT INTO Questions (question_text, option1, option2, option3, option4, correct_option, image_path, hint, description)
+                VALUES (:question_text, :option1, :option2, :option3, :option4, :correct_option, :image_path, :hint, :description)
+            ''', {"image_path": None, "hint": None, "description": None, **question}).lastrowid for question in questions]
+            _append_to_quiz(conn, quiz_id, question_ids)
+    except sqlite3.Error as e:
+        logging.error(f"Ошибка при добавлении пачки вопросов: {e}")
+        return 0
 
-    :param question_id: ID вопроса.
-    :return: Словарь с вопросом, вариантами ответов, изображением, подсказкой и описанием, или None, если вопрос не найден.
+    load_question_catalog()
+    return len(questions)
+
+# Столбцы вопроса, которые задаются при добавлении и импорте
+QUESTION_COLUMNS = ("question_text", "option1", "option2", "option3", "option4", "correct_option", "image_path", "hint", "description")
+
+def upsert_questions(questions: List[Dict[str, Any]], quiz_id: int = DEFAULT_QUIZ_ID) -> int:
     """
+    Добавляет и обновляет пачку вопросов одной транзакцией.
+
+    Вопрос с question_id, который уже есть в базе, обновляется, с новым question_id — добавляется
+    с этим ID, без question_id — добавляется со следующим свободным ID. Добавленные вопросы
+    встают в конец квиза quiz_id, обновлённые остаются в своём квизе.
+    Каталог не пересобирается: после всех пачек нужно вызвать load_question_catalog.
+
+    :param questions: Словари со столбцами QUESTION_COLUMNS и, при необходимости, question_id.
+    :param quiz_id: ID квиза для новых вопросов.
+    :return: Количество записанных вопросов (0 при ошибке).
+    """
+    query = f'''
+        INSERT INTO Questions (question_id, {", ".join(QUESTION_COLUMNS)})
+        VALUES (:question_id, {", ".join(":" + column for column in QUESTION_COLUMNS)})
+        ON CONFLICT (question_id) DO UPDATE SET
+            {", ".join(f"{column} = excluded.{column}" for column in QUESTION_COLUMNS)}
+    '''
     try:
-        # Подключаемся к базе данных
-        with sqlite3.connect(db_path) as conn:
-            cursor = conn.cursor()
+        with get_connection() as conn:
+            question_ids = []
+            for question in questions:
+                row = {"question_id": None, "image_path": None, "hint": None, "description": None, **question}
+                # lastrowid верен только для вставки, поэтому у вопроса с ID берётся его ID
+                lastrowid = conn.execute(query, row).lastrowid
+                question_ids.append(row["question_id"] if row["question_id"] is not None else lastrowid)
+            _append_to_quiz(conn, quiz_id, question_ids)
+    except sqlite3.Error as e:
+        logging.error(f"Ошибка при записи пачки вопросов: {e}")
+        return 0
+    return len(questions)
 
-            # Получаем вопрос
-            cursor.execute('''
-                SELECT question_text, option1, option2, option3, option4, correct_option, image_path, hint, description
+def get_questions_page(after_id: int = 0, limit: int = 100, before_id: Optional[int] = None) -> List[Dict[str, Any]]:
+    """
+    Возвращает вопросы из базы по возрастанию ID, начиная после after_id.
+    Страницы читаются по индексу первичного ключа, поэтому обход всей таблицы
+    идёт с постоянной памятью независимо от её размера.
+
+    :param after_id: ID последнего вопроса предыдущей страницы (0 — с начала).
+    :param limit: Размер страницы.
+    :param before_id: Если задан, возвращается страница перед вопросом с этим ID (листание назад).
+    :return: Вопросы со всеми столбцами.
+    """
+    if before_id is not None:
+        condition, order, bound = "question_id < ?", "DESC", before_id
+    else:
+        condition, order, bound = "question_id > ?", "ASC", after_id
+    try:
+        with get_connection() as conn:
+            cursor = conn.execute(f'''
+                SELECT question_id, {", ".join(QUESTION_COLUMNS)}
                 FROM Questions
-                WHERE question_id = ?
-            ''', (question_id,))
-            question = cursor.fetchone()
+                WHERE {condition}
+                ORDER BY question_id {order}
+                LIMIT ?
+            ''', (bound, limit))
+            columns = [column[0] for column in cursor.description]
+            page = [dict(zip(columns, row)) for row in cursor.fetchall()]
+            return page[::-1] if before_id is not None else page
+    except sqlite3.Error as e:
+        logging.error(f"Ошибка при чтении вопросов после {after_id}: {e}")
+        return []
 
-            if not question:
-                return None  # Вопрос не найден
 
-            # Формируем словарь с вопросом, вариантами ответов, изображением, подсказкой и описанием
-            return {
-                "question_text": question[0],
-                "options": [question[1], question[2], question[3], question[4]],
-                "correct_option": question[5],
-                "image_path": question[6],  # Путь к изображению
-                "hint": question[7],  # Подсказка
-                "description": question[8]  # Описание правильного ответа
-            }
+# Запросы каталога одинаковы для SQLite и PostgreSQL (имена таблиц без кавычек не зависят от регистра)
+CATALOG_QUERY = '''
+    SELECT question_id, question_text, option1, option2, option3, option4, correct_option, image_path, hint, description
+    FROM Questions
+    ORDER BY question_id
+'''
+QUIZZES_QUERY = "SELECT quiz_id, slug, title FROM Quizzes ORDER BY quiz_id"
+QUIZ_ORDER_QUERY = '''
+    SELECT QuizQuestions.quiz_id, QuizQuestions.question_id
+    FROM QuizQuestions JOIN Questions ON Questions.question_id = QuizQuestions.question_id
+    ORDER BY QuizQuestions.quiz_id, QuizQuestions.position
+'''
+
+# Каталог вопросов и квизов в памяти процесса: загружается один раз и пересобирается после правок админа
+_catalog: Optional[Mapping[int, Mapping[str, Any]]] = None
+_quiz_index = QuizIndex()
+_catalog_lock = threading.Lock()
+
+def load_question_catalog() -> int:
+    """
+    Загружает все вопросы и квизы из базы данных в неизменяемый каталог в памяти.
 
+    Новый каталог собирается целиком и только потом подменяет старый,
+    поэтому обработчики в других потоках всегда видят согласованный набор вопросов.
+    При ошибке чтения остаётся прежний каталог.
+
+    :return: Количество вопросов в каталоге.
+    """
+    global _catalog, _quiz_index
+    with _catalog_lock:
+        try:
+            with get_connection() as conn:
+                rows = conn.execute(CATALOG_QUERY).fetchall()
+                quiz_rows = conn.execute(QUIZZES_QUERY).fetchall()
+                order_rows = conn.execute(QUIZ_ORDER_QUERY).fetchall()
+        except sqlite3.Error as e:
+            logging.error(f"Ошибка при загрузке каталога вопросов: {e}")
+            return len(_catalog) if _catalog is not None else 0
+
+        # Указатель квизов подменяется первым: вопрос из нового каталога уже найдёт свой квиз
+        _quiz_index = build_quiz_index(quiz_rows, order_rows)
+        _catalog = build_question_catalog(rows)
+        return len(_catalog)
+
+def build_question_catalog(rows: List[Tuple[Any, ...]]) -> Mapping[int, Mapping[str, Any]]:
+    """
+    Собирает неизменяемый каталог из строк Questions, упорядоченных по question_id.
+
+    :param rows: Строки (question_id, question_text, option1..option4, correct_option, image_path, hint, description).
+    :return: Каталог {question_id: вопрос}.
+    """
+    catalog = MappingProxyType({
+        row[0]: MappingProxyType({
+            "question_id": row[0],
+            "question_text": row[1],
+            "options": (row[2], row[3], row[4], row[5]),
+            "correct_option": row[6],
+            "image_path": row[7],  # Путь к изображению
+            "hint": row[8],  # Подсказка
+            "description": row[9]  # Описание правильного ответа
+        })
+        for row in rows
+    })
+    return catalog
+
+def get_question_catalog() -> Mapping[int, Mapping[str, Any]]:
+    """
+    Возвращает каталог вопросов, загружая его при первом обращении.
+
+    :return: Неизменяемый словарь {question_id: вопрос}, упорядоченный по ID.
+    """
+    catalog = _catalog
+    if catalog is None:
+        load_question_catalog()
+        catalog = _catalog
+    return catalog if catalog is not None else MappingProxyType({})
+
+def get_quiz_index() -> QuizIndex:
+    """
+    Возвращает указатель квизов, загружая каталог при первом обращении.
+    """
+    get_question_catalog()
+    return _quiz_index
+
+def get_quizzes() -> Sequence[Quiz]:
+    """
+    :return: Все квизы по возрастанию ID.
+    """
+    return get_quiz_index().all()
+
+def get_quiz(quiz_id: int) -> Optional[Quiz]:
+    return get_quiz_index().get(quiz_id)
+
+def get_quiz_by_slug(slug: str) -> Optional[Quiz]:
+    return get_quiz_index().by_slug(slug)
+
+def add_quiz(slug: str, title: str) -> Optional[Quiz]:
+    """
+    Создаёт квиз без вопросов, или возвращает существующий квиз с тем же slug.
+
+    :param slug: Короткое имя (для /start_quiz <slug>), приводится к нижнему регистру.
+    :param title: Название квиза.
+    :return: Квиз, или None при ошибке.
+    """
+    slug = slug.lower()
+    try:
+        with get_connection() as conn:
+            conn.execute("INSERT OR IGNORE INTO Quizzes (slug, title) VALUES (?, ?)", (slug, title))
+            conn.commit()
     except sqlite3.Error as e:
-        # Обработка ошибок при получении вопроса
-        print(f"Ошибка при получении вопроса с ID {question_id}: {e}")
+        logging.error(f"Ошибка при создании квиза {slug}: {e}")
         return None
+    load_question_catalog()
+    log_event("db.quiz_added", f"Квиз {slug} добавлен.", slug=slug)
+    return get_quiz_by_slug(slug)
+
+def get_next_question_id(question_id: int) -> Optional[int]:
+    """
+    Возвращает ID вопроса, который идёт после указанного в его квизе.
+    Следующий вопрос берётся из порядка квиза в памяти по номеру текущего вопроса,
+    без поиска по каталогу, поэтому другие квизы на стоимость перехода не влияют.
+
+    :param question_id: ID текущего вопроса.
+    :return: ID следующего вопроса, или None, если вопрос последний.
+    """
+    return get_quiz_index().next_question_id(question_id)
+
+def get_question(question_id: int) -> Optional[Mapping[str, Any]]:
+    """
+    Возвращает вопрос с вариантами ответов, изображением, подсказкой и описанием правильного ответа.
+    Вопрос берётся из каталога в памяти, без обращения к базе данных.
+
+    :param question_id: ID вопроса.
+    :return: Словарь с вопросом, вариантами ответов, изображением, подсказкой и описанием, или None, если вопрос не найден.
+    """
+    return get_question_catalog().get(question_id)
 
 
 # Функция для проверки правильности ответа
@@ -252,30 +685,184 @@ def check_answer(question_id: int, user_answer: int) -> bool:
     :param user_answer: Номер варианта, выбранного пользователем (1, 2, 3 или 4).
     :return: True, если ответ правильный, иначе False.
     """
-    try:
-        # Подключаемся к базе данных
-        with sqlite3.connect(db_path) as conn:
-            cursor = conn.cursor()
+    question = get_question(question_id)
+    if not question:
+        return False  # Вопрос не найден
 
-            # Получаем правильный ответ
-            cursor.execute('''
-                SELECT correct_option
-                FROM Questions
-                WHERE question_id = ?
-            ''', (question_id,))
-            correct_option = cursor.fetchone()
+    # Сравниваем ответ пользователя с правильным ответом
+    return user_answer == question["correct_option"]
 
-            if not correct_option:
-                return False  # Вопрос не найден
+def get_questions_count(quiz_id: Optional[int] = None) -> int:
+    """
+    Возвращает количество вопросов в каталоге или в одном квизе.
 
-            # Сравниваем ответ пользователя с правильным ответом
-            return user_answer == correct_option[0]
+    :param quiz_id: ID квиза (None — все вопросы).
+    :return: Количество вопросов.
+    """
+    if quiz_id is None:
+        return len(get_question_catalog())
+    quiz = get_quiz(quiz_id)
+    return len(quiz.question_ids) if quiz is not None else 0
 
+# Очередь отложенной записи прогресса. Если она не включена, каждая запись фиксируется сразу
+_progress_queue: Optional[WriteBehindQueue] = None
+
+def enable_write_behind(flush_interval: float = 0.05, max_rows: int = 500):
+    """
+    Включает отложенную запись прогресса: add_user_progress, complete_question и delete_user_progress
+    ставят запись в очередь, а фоновый поток фиксирует очередь одной транзакцией.
+
+    :param flush_interval: Максимальная задержка записи в секундах.
+    :param max_rows: Сколько записей копить до внеочередной фиксации.
+    """
+    global _progress_queue
+    if _progress_queue is None:
+        _progress_queue = WriteBehindQueue(_apply_progress_batch, flush_interval, max_rows)
+
+def drain_write_behind():
+    """
+    Записывает всё, что осталось в очереди, и выключает отложенную запись.
+    """
+    global _progress_queue
+    queue, _progress_queue = _progress_queue, None
+    if queue is not None:
+        queue.close()
+
+def get_write_queue_depth() -> int:
+    """
+    :return: Количество записей прогресса, ещё не зафиксированных в базе.
+    """
+    queue = _progress_queue
+    return queue.queue_depth() if queue is not None else 0
+
+def _write_progress(cursor: sqlite3.Cursor, user_id: int, question_id: int, start_time: Optional[int], end_time: Optional[int]) -> bool:
+    # Проверяем, существует ли уже запись о прогрессе для этого вопроса и пользователя
+    cursor.execute('''
+        SELECT progress_id, start_time, end_time
+        FROM UserProgress
+        WHERE tg_id = ? AND question_id = ?
+    ''', (str(user_id), question_id))
+    existing_record = cursor.fetchone()
+
+    if existing_record:
+        # Если запись существует, обновляем её
+        progress_id = existing_record[0]
+        current_start_time = existing_record[1]
+
+        # Обновляем только end_time, если он передан
+        if end_time is not None:
+            cursor.execute('''
+                UPDATE UserProgress
+                SET end_time = ?, is_completed = 1
+                WHERE progress_id = ?
+            ''', (end_time, progress_id))
+        # Обновляем start_time, только если он передан и текущий start_time отсутствует
+        elif start_time is not None and current_start_time is None:
+            cursor.execute('''
+                UPDATE UserProgress
+                SET start_time = ?
+                WHERE progress_id = ?
+            ''', (start_time, progress_id))
+    else:
+        # Если записи нет, создаем новую
+        if start_time is None:
+            # Если start_time не передан, это ошибка (начало вопроса должно быть записано)
+            logging.error(f"Ошибка: start_time не передан для нового вопроса.")
+            return False
+
+        cursor.execute('''
+            INSERT INTO UserProgress (tg_id, question_id, start_time, end_time, is_completed)
+            VALUES (?, ?, ?, ?, ?)
+        ''', (str(user_id), question_id, start_time, end_time, 1 if end_time else 0))
+    return True
+
+def _complete_progress(cursor: sqlite3.Cursor, user_id: int, question_id: int, end_time: int):
+    cursor.execute('''
+        UPDATE UserProgress
+        SET end_time = ?, is_completed = 1
+        WHERE tg_id = ? AND question_id = ? AND end_time IS NULL
+    ''', (end_time, str(user_id), question_id))
+
+def _apply_progress_op(cursor: sqlite3.Cursor, user_id: str, op: tuple):
+    kind = op[0]
+    if kind == "progress":
+        _write_progress(cursor, user_id, *op[1:])
+    elif kind == "complete":
+        _complete_progress(cursor, user_id, *op[1:])
+    elif kind == "reset":
+        _reset_progress(cursor, user_id, op[1])
+
+def _reset_progress(cursor: sqlite3.Cursor, user_id: int, quiz_id: Optional[int]):
+    if quiz_id is None:
+        cursor.execute("DELETE FROM UserProgress WHERE tg_id = ?", (str(user_id),))
+    else:
+        cursor.execute('''
+            DELETE FROM UserProgress
+            WHERE tg_id = ? AND question_id IN (SELECT question_id FROM QuizQuestions WHERE quiz_id = ?)
+        ''', (str(user_id), quiz_id))
+
+def _apply_progress_batch(batch: Dict[str, List[tuple]]) -> bool:
+    """
+    Записывает пакет отложенных операций прогресса одной транзакцией.
+    """
+    try:
+        with get_connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            cursor = conn.cursor()
+            for user_id, ops in batch.items():
+                for op in ops:
+                    _apply_progress_op(cursor, user_id, op)
+        return True
     except sqlite3.Error as e:
-        # Обработка ошибок при проверке ответа
-        print(f"Ошибка при проверке ответа на вопрос {question_id}: {e}")
+        logging.error(f"Ошибка при записи пакета прогресса ({sum(map(len, batch.values()))} операций): {e}")
         return False
 
+def _pending_progress(user_id: int) -> List[tuple]:
+    queue = _progress_queue
+    return queue.pending(str(user_id)) if queue is not None else []
+
+def _progress_with_pending(cursor: sqlite3.Cursor, user_id: int, pending: List[tuple]) -> Dict[int, list]:
+    """
+    Прогресс пользователя из базы с наложенными незаписанными операциями.
+
+    :return: Словарь {question_id: [start_time, end_time, is_completed]}.
+    """
+    cursor.execute('''
+        SELECT question_id, start_time, end_time, is_completed
+        FROM UserProgress
+        WHERE tg_id = ?
+    ''', (str(user_id),))
+    rows = {row[0]: [row[1], row[2], bool(row[3])] for row in cursor.fetchall()}
+
+    # Те же правила, что у _write_progress и _complete_progress
+    for op in pending:
+        kind = op[0]
+        if kind == "progress":
+            _, question_id, start_time, end_time = op
+            row = rows.get(question_id)
+            if row is None:
+                if start_time is not None:
+                    rows[question_id] = [start_time, end_time, bool(end_time)]
+            elif end_time is not None:
+                row[1], row[2] = end_time, True
+            elif start_time is not None and row[0] is None:
+                row[0] = start_time
+        elif kind == "complete":
+            _, question_id, end_time = op
+            row = rows.get(question_id)
+            if row is not None and row[1] is None:
+                row[1], row[2] = end_time, True
+        elif kind == "reset":
+            quiz_id = op[1]
+            if quiz_id is None:
+                rows.clear()
+                continue
+            quiz = get_quiz(quiz_id)
+            for question_id in list(rows):
+                if quiz is not None and question_id in quiz.positions:
+                    del rows[question_id]
+    return rows
+
 # Функция для начала прохождения вопроса
 def start_question(user_id: int, question_id: int) -> bool:
     """
@@ -287,7 +874,7 @@ def start_question(user_id: int, question_id: int) -> bool:
     """
     try:
         # Подключаемся к базе данных
-        with sqlite3.connect(db_path) as conn:
+        with get_connection() as conn:
             cursor = conn.cursor()
 
             # Записываем время начала прохождения вопроса (timestamp)
@@ -299,12 +886,13 @@ def start_question(user_id: int, question_id: int) -> bool:
 
             # Фиксируем изменения в базе данных
             conn.commit()
-            print(f"Пользователь {user_id} начал вопрос {question_id} в {start_time}.")
+            log_event("db.question_started", f"Пользователь {user_id} начал вопрос {question_id} в {start_time}.",
+                      sample=True, user_id=user_id, question_id=question_id, start_time=start_time)
             return True  # Успешно
 
     except sqlite3.Error as e:
         # Обработка ошибок при начале вопроса
-        print(f"Ошибка при начале вопроса {question_id} для пользователя {user_id}: {e}")
+        logging.error(f"Ошибка при начале вопроса {question_id} для пользователя {user_id}: {e}")
         return False  # Произошла ошибка
 
 
@@ -317,27 +905,28 @@ def complete_question(user_id: int, question_id: int) -> bool:
     :param question_id: ID вопроса.
     :return: True, если успешно, иначе False.
     """
+    # Записываем время завершения прохождения вопроса (timestamp)
+    end_time = int(time.time())
+    queue = _progress_queue
+    if queue is not None:
+        queue.put(str(user_id), ("complete", question_id, end_time))
+        return True
+
     try:
         # Подключаемся к базе данных
-        with sqlite3.connect(db_path) as conn:
+        with get_connection() as conn:
             cursor = conn.cursor()
-
-            # Записываем время завершения прохождения вопроса (timestamp)
-            end_time = int(time.time())
-            cursor.execute('''
-                UPDATE UserProgress
-                SET end_time = ?, is_completed = 1
-                WHERE tg_id = ? AND question_id = ? AND end_time IS NULL
-            ''', (end_time, str(user_id), question_id))
+            _complete_progress(cursor, user_id, question_id, end_time)
 
             # Фиксируем изменения в базе данных
             conn.commit()
-            print(f"Пользователь {user_id} завершил вопрос {question_id} в {end_time}.")
+            log_event("db.question_completed", f"Пользователь {user_id} завершил вопрос {question_id} в {end_time}.",
+                      sample=True, user_id=user_id, question_id=question_id, end_time=end_time)
             return True  # Успешно
 
     except sqlite3.Error as e:
         # Обработка ошибок при завершении вопроса
-        print(f"Ошибка при завершении вопроса {question_id} для пользователя {user_id}: {e}")
+        logging.error(f"Ошибка при завершении вопроса {question_id} для пользователя {user_id}: {e}")
         return False  # Произошла ошибка
 
 # Функция для вычисления общего времени прохождения квиза
@@ -350,7 +939,7 @@ def calculate_total_time(user_id: int) -> Optional[int]:
     """
     try:
         # Подключаемся к базе данных
-        with sqlite3.connect(db_path) as conn:
+        with get_connection() as conn:
             cursor = conn.cursor()
 
             # Получаем все записи о прохождении вопросов
@@ -373,58 +962,120 @@ def calculate_total_time(user_id: int) -> Optional[int]:
 
     except sqlite3.Error as e:
         # Обработка ошибок при вычислении времени
-        print(f"Ошибка при вычислении времени для пользователя {user_id}: {e}")
+        logging.error(f"Ошибка при вычислении времени для пользователя {user_id}: {e}")
         return None
 
 
-def add_to_top(user_id: int, username: str, new_total_time: int) -> bool:
+def add_to_top(user_id: int, username: str, new_total_time: int, quiz_id: int = DEFAULT_QUIZ_ID) -> bool:
     """
-    Добавляет пользователя в топ, если новое время меньше текущего времени в топе.
+    Добавляет пользователя в топ квиза, если новое время меньше текущего времени в топе.
     Если время в топе больше или отсутствует, то запись добавляется или обновляется.
 
     :param user_id: ID пользователя в Telegram.
     :param username: Имя пользователя.
     :param new_total_time: Новое общее время прохождения квиза (в секундах).
+    :param quiz_id: ID квиза.
     :return: True, если запись успешно добавлена или обновлена, иначе False.
     """
     try:
         # Подключаемся к базе данных
-        with sqlite3.connect(db_path) as conn:
+        with get_connection() as conn:
             cursor = conn.cursor()
 
             # Получаем текущее время пользователя в топе, если оно существует
             cursor.execute('''
                 SELECT total_time
                 FROM TopUsers
-                WHERE tg_id = ?
-            ''', (str(user_id),))
+                WHERE quiz_id = ? AND tg_id = ?
+            ''', (quiz_id, str(user_id)))
             current_time = cursor.fetchone()
 
             # Если текущее время существует и оно меньше нового времени, не обновляем
             if current_time and current_time[0] < new_total_time:
-                print(f"Текущее время пользователя {user_id} в топе меньше нового времени. Обновление не требуется.")
+                log_event("db.top_not_improved", f"Текущее время пользователя {user_id} в топе меньше нового времени. Обновление не требуется.",
+                          sample=True, user_id=user_id, total_time=new_total_time)
                 return False
 
             # Если текущее время больше или отсутствует, добавляем или обновляем запись
             cursor.execute('''
-                INSERT OR REPLACE INTO TopUsers (tg_id, username, total_time)
-                VALUES (?, ?, ?)
-            ''', (str(user_id), username, new_total_time))
+                INSERT OR REPLACE INTO TopUsers (quiz_id, tg_id, username, total_time)
+                VALUES (?, ?, ?, ?)
+            ''', (quiz_id, str(user_id), username, new_total_time))
 
             # Фиксируем изменения в базе данных
             conn.commit()
-            print(f"Пользователь {user_id} добавлен в топ с временем {new_total_time} секунд.")
+            get_leaderboard(quiz_id).update(user_id, username, new_total_time)
+            log_event("db.top_updated", f"Пользователь {user_id} добавлен в топ с временем {new_total_time} секунд.",
+                      sample=True, user_id=user_id, total_time=new_total_time)
             return True  # Успешно
 
     except sqlite3.Error as e:
         # Обработка ошибок при добавлении в топ
-        print(f"Ошибка при добавлении пользователя {user_id} в топ: {e}")
+        logging.error(f"Ошибка при добавлении пользователя {user_id} в топ: {e}")
         return False  # Произошла ошибка
 
+# Таблицы лидеров в памяти, по одной на квиз: заполняются из TopUsers при первом обращении
+# и дальше обновляются вместе с таблицей. Место в одном квизе не зависит от числа игроков других
+_leaderboards: Optional[Dict[int, Leaderboard]] = None
+_leaderboard_lock = threading.Lock()
+
+def load_leaderboard() -> int:
+    """
+    Загружает таблицы лидеров всех квизов из TopUsers.
+    При ошибке чтения остаются прежние таблицы.
+
+    :return: Количество записей во всех таблицах.
+    """
+    global _leaderboards
+    with _leaderboard_lock:
+        try:
+            with get_connection() as conn:
+                rows = conn.execute("SELECT quiz_id, tg_id, username, total_time FROM TopUsers").fetchall()
+        except sqlite3.Error as e:
+            logging.error(f"Ошибка при загрузке таблицы лидеров: {e}")
+            return sum(map(len, _leaderboards.values())) if _leaderboards is not None else 0
+
+        _leaderboards = build_leaderboards(rows)
+        return len(rows)
+
+def build_leaderboards(rows: List[Tuple[int, str, str, int]]) -> Dict[int, Leaderboard]:
+    """
+    Раскладывает строки (quiz_id, tg_id, username, total_time) по таблицам лидеров квизов.
+    """
+    by_quiz: Dict[int, List[Tuple[str, str, int]]] = {}
+    for quiz_id, tg_id, username, total_time in rows:
+        by_quiz.setdefault(quiz_id, []).append((tg_id, username, total_time))
+    leaderboards = {}
+    for quiz_id, quiz_rows in by_quiz.items():
+        leaderboards[quiz_id] = Leaderboard()
+        leaderboards[quiz_id].load(quiz_rows)
+    return leaderboards
+
+def get_leaderboard(quiz_id: int = DEFAULT_QUIZ_ID) -> Leaderboard:
+    """
+    Возвращает таблицу лидеров квиза, загружая таблицы при первом обращении.
+    """
+    leaderboards = _leaderboards
+    if leaderboards is None:
+        load_leaderboard()
+        leaderboards = _leaderboards
+    if leaderboards is None:
+        return Leaderboard()
+    leaderboard = leaderboards.get(quiz_id)
+    if leaderboard is None:
+        # В квизе ещё никто не финишировал
+        with _leaderboard_lock:
+            leaderboard = leaderboards.setdefault(quiz_id, Leaderboard())
+    return leaderboard
+
+def _remove_from_leaderboards(user_id: int):
+    for leaderboard in list((_leaderboards or {}).values()):
+        leaderboard.remove(user_id)
+
 # Функция для получения топа пользователей
-def get_top() -> Dict[int, Dict[str, str]]:
+def get_top(limit: int = 10, quiz_id: int = DEFAULT_QUIZ_ID) -> Dict[int, Dict[str, str]]:
     """
-    Возвращает топ-10 пользователей.
+    Возвращает топ пользователей квиза (по умолчанию 10) из таблицы лидеров в памяти.
 
     :return: Словарь с топом пользователей в формате:
         {
@@ -433,36 +1084,36 @@ def get_top() -> Dict[int, Dict[str, str]]:
             ...
         }
     """
-    try:
-        # Подключаемся к базе данных
-        with sqlite3.connect(db_path) as conn:
-            cursor = conn.cursor()
+    return {
+        position: {"total_time": total_time, "Name_user": username}
+        for position, _, username, total_time in get_leaderboard(quiz_id).top(limit)
+    }
 
-            # Получаем топ-10 пользователей, отсортированных по времени
-            cursor.execute('''
-                SELECT username, total_time
-                FROM TopUsers
-                ORDER BY total_time ASC
-                LIMIT 10
-            ''')
-            top_users = cursor.fetchall()
+def get_rank(user_id: int, quiz_id: int = DEFAULT_QUIZ_ID) -> Optional[int]:
+    """
+    Возвращает место пользователя в топе: число пользователей с меньшим временем плюс один.
 
-            # Формируем словарь с топом
-            top_dict = {
-                i + 1: {"total_time": user[1], "Name_user": user[0]}
-                for i, user in enumerate(top_users)
-            }
-            return top_dict
+    :return: Место, или None, если пользователя нет в топе.
+    """
+    return get_leaderboard(quiz_id).rank(user_id)
 
-    except sqlite3.Error as e:
-        # Обработка ошибок при получении топа
-        print(f"Ошибка при получении топа: {e}")
-        return {}
+def get_around(user_id: int, radius: int = 2, quiz_id: int = DEFAULT_QUIZ_ID) -> List[Dict[str, Any]]:
+    """
+    Возвращает пользователя и его соседей по топу.
+
+    :param radius: Сколько соседей показать сверху и снизу.
+    :return: Список словарей {"place", "tg_id", "Name_user", "total_time"} по порядку.
+    """
+    return [
+        {"place": position, "tg_id": tg_id, "Name_user": username, "total_time": total_time}
+        for position, tg_id, username, total_time in get_leaderboard(quiz_id).around(user_id, radius)
+    ]
 
 # Функция для получения информации о текущем пользователе
-def get_my_info(user_id: int) -> Dict[str, Any]:
+def get_my_info(user_id: int, quiz_id: int = DEFAULT_QUIZ_ID) -> Dict[str, Any]:
     """
     Возвращает информацию о текущем пользователе.
+    Место считается по таблице лидеров в памяти, без подсчёта строк в базе.
 
     :param user_id: ID пользователя в Telegram.
     :return: Словарь с информацией о пользователе в формате:
@@ -471,90 +1122,86 @@ def get_my_info(user_id: int) -> Dict[str, Any]:
             "place": "5"
         }
     """
-    try:
-        # Подключаемся к базе данных
-        with sqlite3.connect(db_path) as conn:
-            cursor = conn.cursor()
-
-            # Получаем общее время пользователя
-            cursor.execute('''
-                SELECT total_time
-                FROM TopUsers
-                WHERE tg_id = ?
-            ''', (str(user_id),))
-            user_time = cursor.fetchone()
-
-            if not user_time:
-                return {"total_time": "Нет данных", "place": "Нет данных"}
-
-            # Получаем место пользователя в топе
-            cursor.execute('''
-                SELECT COUNT(*) + 1
-                FROM TopUsers
-                WHERE total_time < ?
-            ''', (user_time[0],))
-            place = cursor.fetchone()[0]
-
-            return {"total_time": user_time[0], "place": str(place)}
-
-    except sqlite3.Error as e:
-        # Обработка ошибок при получении информации
-        print(f"Ошибка при получении информации о пользователе {user_id}: {e}")
-        return {"total_time": "Ошибка", "place": "Ошибка"}
+    leaderboard = get_leaderboard(quiz_id)
+    current = leaderboard.get(user_id)
+    place = leaderboard.rank(user_id)
+    if current is None or place is None:
+        return {"total_time": "Нет данных", "place": "Нет данных"}
+    return {"total_time": current[0], "place": str(place)}
 
 # Функция для получения списка пройденных вопросов
-def get_completed_questions(user_id: int) -> List[int]:
+def get_completed_questions(user_id: int, quiz_id: Optional[int] = None) -> List[int]:
     """
     Возвращает список ID пройденных вопросов для пользователя.
 
     :param user_id: ID пользователя в Telegram.
+    :param quiz_id: Учитывать только вопросы этого квиза (None — все).
     :return: Список ID пройденных вопросов.
     """
+    # Незаписанные операции берутся до чтения базы: если их запишут между этими шагами,
+    # повторное наложение ничего не изменит
+    pending = _pending_progress(user_id)
     try:
         # Подключаемся к базе данных
-        with sqlite3.connect(db_path) as conn:
+        with get_connection() as conn:
             cursor = conn.cursor()
 
-            # Получаем пройденные вопросы
-            cursor.execute('''
-                SELECT question_id
-                FROM UserProgress
-                WHERE tg_id = ? AND is_completed = 1
-            ''', (str(user_id),))
-            completed_questions = normalize_fetchall(cursor.fetchall())
-            print(f"Пользователь {user_id} прошел {len(completed_questions)} вопросов.")
+            if pending:
+                rows = _progress_with_pending(cursor, user_id, pending)
+                completed_questions = [question_id for question_id, row in sorted(rows.items()) if row[2]]
+            else:
+                # Получаем пройденные вопросы
+                cursor.execute('''
+                    SELECT question_id
+                    FROM UserProgress
+                    WHERE tg_id = ? AND is_completed = 1
+                ''', (str(user_id),))
+                completed_questions = normalize_fetchall(cursor.fetchall())
+            if quiz_id is not None:
+                quiz = get_quiz(quiz_id)
+                positions = quiz.positions if quiz is not None else {}
+                completed_questions = [question_id for question_id in completed_questions if question_id in positions]
+            log_event("db.completed_listed", f"Пользователь {user_id} прошел {len(completed_questions)} вопросов.",
+                      sample=True, user_id=user_id, count=len(completed_questions))
             return completed_questions
 
     except sqlite3.Error as e:
         # Обработка ошибок при получении пройденных вопросов
-        print(f"Ошибка при получении пройденных вопросов для пользователя {user_id}: {e}")
+        logging.error(f"Ошибка при получении пройденных вопросов для пользователя {user_id}: {e}")
         return []
 
 
 # Функция для удаления прогресса пользователя
-def delete_user_progress(user_id: int) -> bool:
+def delete_user_progress(user_id: int, quiz_id: Optional[int] = None) -> bool:
     """
-    Удаляет весь прогресс пользователя.
+    Удаляет прогресс пользователя.
 
     :param user_id: ID пользователя в Telegram.
+    :param quiz_id: Удалить только прогресс по вопросам этого квиза (None — весь прогресс).
     :return: True, если успешно, иначе False.
     """
+    queue = _progress_queue
+    if queue is not None:
+        # Удаление встаёт в очередь после ранее поставленных записей пользователя
+        queue.put(str(user_id), ("reset", quiz_id))
+        return True
+
     try:
         # Подключаемся к базе данных
-        with sqlite3.connect(db_path) as conn:
+        with get_connection() as conn:
             cursor = conn.cursor()
 
             # Удаляем прогресс пользователя
-            cursor.execute("DELETE FROM UserProgress WHERE tg_id = ?", (str(user_id),))
+            _reset_progress(cursor, user_id, quiz_id)
 
             # Фиксируем изменения в базе данных
             conn.commit()
-            print(f"Прогресс пользователя {user_id} успешно удален.")
+            log_event("db.progress_deleted", f"Прогресс пользователя {user_id} успешно удален.", sample=True, user_id=user_id)
             return True  # Прогресс успешно удален
 
     except sqlite3.Error as e:
         # Обработка ошибок при удалении прогресса
-        print(f"Ошибка при удалении прогресса пользователя {user_id}: {e}")
+        logging.error(f"Ошибка при удалении прогресса пользователя {user_id}: {e}")
         return False  # Произошла ошибка
 
 def add_user_progress(user_id: int, question_id: int, start_time: Optional[int] = None, end_time: Optional[int] = None) -> bool:
@@ -567,59 +1214,27 @@ def add_user_progress(user_id: int, question_id: int, start_time: Optional[int]
     :param end_time: Время завершения вопроса (timestamp). Если не указано, время завершения не обновляется.
     :return: True, если запись успешно добавлена или обновлена, иначе False.
     """
+    queue = _progress_queue
+    if queue is not None:
+        queue.put(str(user_id), ("progress", question_id, start_time, end_time))
+        return True
+
     try:
         # Подключаемся к базе данных
-        with sqlite3.connect(db_path) as conn:
+        with get_connection() as conn:
             cursor = conn.cursor()
-
-            # Проверяем, существует ли уже запись о прогрессе для этого вопроса и пользователя
-            cursor.execute('''
-                SELECT progress_id, start_time, end_time
-                FROM UserProgress
-                WHERE tg_id = ? AND question_id = ?
-            ''', (str(user_id), question_id))
-            existing_record = cursor.fetchone()
-
-            if existing_record:
-                # Если запись существует, обновляем её
-                progress_id = existing_record[0]
-                current_start_time = existing_record[1]
-                current_end_time = existing_record[2]
-
-                # Обновляем только end_time, если он передан
-                if end_time is not None:
-                    cursor.execute('''
-                        UPDATE UserProgress
-                        SET end_time = ?, is_completed = 1
-                        WHERE progress_id = ?
-                    ''', (end_time, progress_id))
-                # Обновляем start_time, только если он передан и текущий start_time отсутствует
-                elif start_time is not None and current_start_time is None:
-                    cursor.execute('''
-                        UPDATE UserProgress
-                        SET start_time = ?
-                        WHERE progress_id = ?
-                    ''', (start_time, progress_id))
-            else:
-                # Если записи нет, создаем новую
-                if start_time is None:
-                    # Если start_time не передан, это ошибка (начало вопроса должно быть записано)
-                    print(f"Ошибка: start_time не передан для нового вопроса.")
-                    return False
-
-                cursor.execute('''
-                    INSERT INTO UserProgress (tg_id, question_id, start_time, end_time, is_completed)
-                    VALUES (?, ?, ?, ?, ?)
-                            ''', (str(user_id), question_id, start_time, end_time, 1 if end_time else 0))
+            if not _write_progress(cursor, user_id, question_id, start_time, end_time):
+                return False
 
             # Фиксируем изменения в базе данных
             conn.commit()
-            print(f"Прогресс пользователя {user_id} для вопроса {question_id} успешно обновлен.")
+            log_event("db.progress_updated", f"Прогресс пользователя {user_id} для вопроса {question_id} успешно обновлен.",
+                      sample=True, user_id=user_id, question_id=question_id)
             return True  # Успешно
 
     except sqlite3.Error as e:
         # Обработка ошибок при добавлении или обновлении прогресса
-        print(f"Ошибка при записи прогресса для пользователя {user_id}: {e}")
+        logging.error(f"Ошибка при записи прогресса для пользователя {user_id}: {e}")
         return False  # Произошла ошибка
 
 def update_question_hint(question_id: int, hint: str) -> bool:
@@ -632,7 +1247,7 @@ def update_question_hint(question_id: int, hint: str) -> bool:
     """
     try:
         # Подключаемся к базе данных
-        with sqlite3.connect(db_path) as conn:
+        with get_connection() as conn:
             cursor = conn.cursor()
 
             # Обновляем подсказку
@@ -644,12 +1259,13 @@ def update_question_hint(question_id: int, hint: str) -> bool:
 
             # Фиксируем изменения в базе данных
             conn.commit()
-            print(f"Подсказка для вопроса {question_id} успешно обновлена.")
+            load_question_catalog()
+            log_event("db.hint_updated", f"Подсказка для вопроса {question_id} успешно обновлена.", question_id=question_id)
             return True  # Успешно
 
     except sqlite3.Error as e:
         # Обработка ошибок при обновлении подсказки
-        print(f"Ошибка при обновлении подсказки для вопроса {question_id}: {e}")
+        logging.error(f"Ошибка при обновлении подсказки для вопроса {question_id}: {e}")
         return False  # Произошла ошибка
 
 
@@ -657,62 +1273,472 @@ def update_question_hint(question_id: int, hint: str) -> bool:
 def delete_question(question_id: int) -> bool:
     """Удаляет вопрос по ID."""
     try:
-        with sqlite3.connect(db_path) as conn:
+        with get_connection() as conn:
             cursor = conn.cursor()
             cursor.execute("DELETE FROM Questions WHERE question_id = ?", (question_id,))
+            deleted = cursor.rowcount > 0
+            cursor.execute("DELETE FROM QuizQuestions WHERE question_id = ?", (question_id,))
             conn.commit()
-            return cursor.rowcount > 0
+        if deleted:
+            load_question_catalog()
+        return deleted
     except sqlite3.Error as e:
-        print(f"Ошибка при удалении вопроса: {e}")
+        logging.error(f"Ошибка при удалении вопроса: {e}")
         return False
 
 def get_all_users() -> List[Dict[str, Any]]:
     """Возвращает список всех пользователей."""
     try:
-        with sqlite3.connect(db_path) as conn:
+        with get_connection() as conn:
             cursor = conn.cursor()
             cursor.execute("SELECT tg_id, username FROM Users")
             return [{"tg_id": row[0], "username": row[1]} for row in cursor.fetchall()]
     except sqlite3.Error as e:
-        print(f"Ошибка при получении пользователей: {e}")
+        logging.error(f"Ошибка при получении пользователей: {e}")
+        return []
+
+# Число пользователей для админ-панели: (момент подсчёта, количество)
+USERS_COUNT_TTL = 60
+_users_count: Optional[Tuple[float, int]] = None
+
+def get_users_page(after_id: Optional[str] = None, limit: int = 10, before_id: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    Возвращает страницу пользователей по возрастанию tg_id.
+    Страница ищется по первичному ключу (WHERE tg_id > ? LIMIT n), поэтому её стоимость
+    не зависит от числа пользователей.
+
+    :param after_id: tg_id последнего пользователя предыдущей страницы (None — с начала).
+    :param limit: Размер страницы.
+    :param before_id: Если задан, возвращается страница перед пользователем с этим tg_id (листание назад).
+    :return: Словари с tg_id и username.
+    """
+    if before_id is not None:
+        query, params = "SELECT tg_id, username FROM Users WHERE tg_id < ? ORDER BY tg_id DESC LIMIT ?", (before_id, limit)
+    elif after_id is not None:
+        query, params = "SELECT tg_id, username FROM Users WHERE tg_id > ? ORDER BY tg_id LIMIT ?", (after_id, limit)
+    else:
+        query, params = "SELECT tg_id, username FROM Users ORDER BY tg_id LIMIT ?", (limit,)
+    try:
+        with get_connection() as conn:
+            page = [{"tg_id": row[0], "username": row[1]} for row in conn.execute(query, params).fetchall()]
+            return page[::-1] if before_id is not None else page
+    except sqlite3.Error as e:
+        logging.error(f"Ошибка при получении страницы пользователей: {e}")
         return []
 
+def get_users_count() -> int:
+    """
+    Возвращает число пользователей.
+    Подсчёт кэшируется на USERS_COUNT_TTL секунд и сбрасывается при удалении пользователей
+    и добавлении пачкой: для номера страницы в админ-панели точность до новых пользователей не нужна.
+    """
+    global _users_count
+    cached = _users_count
+    now = time.monotonic()
+    if cached is not None and now - cached[0] < USERS_COUNT_TTL:
+        return cached[1]
+    try:
+        with get_connection() as conn:
+            count = conn.execute("SELECT COUNT(*) FROM Users").fetchone()[0]
+    except sqlite3.Error as e:
+        logging.error(f"Ошибка при подсчёте пользователей: {e}")
+        return cached[1] if cached else 0
+    _users_count = (now, count)
+    return count
+
+def _reset_users_count():
+    global _users_count
+    _users_count = None
+
 def delete_user_data(user_id: int) -> bool:
     """Полностью удаляет все данные пользователя."""
+    if _progress_queue is not None:
+        _progress_queue.take(str(user_id))
     try:
-        with sqlite3.connect(db_path) as conn:
+        with get_connection() as conn:
             cursor = conn.cursor()
             # Удаляем из Users, UserProgress и TopUsers
             cursor.execute("DELETE FROM Users WHERE tg_id = ?", (str(user_id),))
             cursor.execute("DELETE FROM UserProgress WHERE tg_id = ?", (str(user_id),))
             cursor.execute("DELETE FROM TopUsers WHERE tg_id = ?", (str(user_id),))
             conn.commit()
+            _remove_from_leaderboards(user_id)
+            _reset_users_count()
             return True
     except sqlite3.Error as e:
-        print(f"Ошибка при удалении пользователя: {e}")
+        logging.error(f"Ошибка при удалении пользователя: {e}")
         return False
     
 def get_all_questions() -> List[Dict]:
+    """Возвращает краткий список всех вопросов из каталога."""
+    return [{
+        "question_id": q["question_id"],
+        "question_text": q["question_text"],
+        "correct_option": q["correct_option"]
+    } for q in get_question_catalog().values()]
+
+# file_id загруженных изображений, уже прочитанные из базы
+_file_id_cache: Dict[Tuple[str, str], str] = {}
+
+def _drop_cached_file_ids(image_path: str):
+    for key in list(_file_id_cache):
+        if key[0] == image_path:
+            _file_id_cache.pop(key, None)
+
+def get_image_file_id(image_path: str, content_hash: str) -> Optional[str]:
+    """
+    Возвращает file_id ранее загруженного изображения.
+
+    :param image_path: Путь к изображению.
+    :param content_hash: Хэш текущего содержимого файла.
+    :return: file_id, или None, если файл ещё не загружался или изменился после загрузки.
+    """
+    key = (image_path, content_hash)
+    file_id = _file_id_cache.get(key)
+    if file_id:
+        return file_id
+
     try:
-        with sqlite3.connect(db_path) as conn:
+        with get_connection() as conn:
             cursor = conn.cursor()
-            cursor.execute("SELECT * FROM Questions")
-            return [{
-                "question_id": row[0],
-                "question_text": row[1],
-                "correct_option": row[6]
-            } for row in cursor.fetchall()]
-    except sqlite3.Error as e:
-        print(f"Ошибка: {e}")
+            cursor.execute('''
+                SELECT file_id
+                FROM ImageCache
+                WHERE image_path = ? AND content_hash = ?
+            ''', (image_path, content_hash))
+            row = cursor.fetchone()
+    except sqlite3.Error as e:
+        logging.error(f"Ошибка при получении file_id для {image_path}: {e}")
+        return None
+
+    if not row:
+        return None
+    _file_id_cache[key] = row[0]
+    return row[0]
+
+def save_image_file_id(image_path: str, content_hash: str, file_id: str) -> bool:
+    """
+    Сохраняет file_id загруженного изображения вместо предыдущего.
+
+    :param image_path: Путь к изображению.
+    :param content_hash: Хэш содержимого загруженного файла.
+    :param file_id: file_id, который вернул Telegram.
+    :return: True, если запись сохранена, иначе False.
+    """
+    try:
+        with get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                INSERT OR REPLACE INTO ImageCache (image_path, content_hash, file_id)
+                VALUES (?, ?, ?)
+            ''', (image_path, content_hash, file_id))
+            conn.commit()
+    except sqlite3.Error as e:
+        logging.error(f"Ошибка при сохранении file_id для {image_path}: {e}")
+        return False
+
+    _drop_cached_file_ids(image_path)
+    _file_id_cache[(image_path, content_hash)] = file_id
+    return True
+
+def forget_image_file_id(image_path: str) -> bool:
+    """
+    Удаляет сохранённый file_id изображения, чтобы при следующей отправке файл был загружен заново.
+
+    :param image_path: Путь к изображению.
+    :return: True, если успешно, иначе False.
+    """
+    _drop_cached_file_ids(image_path)
+    try:
+        with get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("DELETE FROM ImageCache WHERE image_path = ?", (image_path,))
+            conn.commit()
+            return True
+    except sqlite3.Error as e:
+        logging.error(f"Ошибка при удалении file_id для {image_path}: {e}")
+        return False
+
+@dataclass(frozen=True)
+class AnswerResult:
+    """
+    Результат ответа на вопрос.
+
+    :param is_correct: Правильный ли ответ.
+    :param description: Описание правильного ответа.
+    :param stale: Ответ на вопрос, который уже пройден или не относится к текущему прохождению.
+    :param next_question_id: ID следующего вопроса, если он есть.
+    :param next_question: Следующий вопрос.
+    :param total_time: Общее время квиза в секундах, если это был последний вопрос.
+    :param top_updated: Попал ли результат в топ.
+    """
+    is_correct: bool
+    description: Optional[str] = None
+    stale: bool = False
+    next_question_id: Optional[int] = None
+    next_question: Optional[Mapping[str, Any]] = None
+    total_time: Optional[int] = None
+    top_updated: bool = False
+
+def record_answer(user_id: int, question_id: int, option: int, username: Optional[str] = None, start_time: Optional[int] = None,
+                  order: Optional[QuestionOrder] = None) -> AnswerResult:
+    """
+    Проверяет ответ и записывает все его последствия в одной транзакции:
+    завершает текущий вопрос, открывает следующий, а после последнего вопроса
+    считает общее время и обновляет топ.
+
+    :param user_id: ID пользователя в Telegram.
+    :param question_id: ID вопроса.
+    :param option: Номер выбранного варианта (1, 2, 3 или 4).
+    :param username: Имя пользователя для топа.
+    :param start_time: Время начала квиза для следующего вопроса. По умолчанию берётся из текущего вопроса.
+    :param order: Порядок вопросов прохождения. По умолчанию вопросы идут в порядке квиза.
+    :return: AnswerResult с результатом ответа.
+    """
+    question = get_question(question_id)
+    if not question or option != question["correct_option"]:
+        return AnswerResult(is_correct=False)
+
+    description = question["description"]
+    quiz = get_quiz_index().quiz_of(question_id)
+    if quiz is None:
+        # Вопрос убран из квизов: продолжать прохождение не с чего
+        return AnswerResult(is_correct=True, description=description, stale=True)
+    # Если квиз изменился с начала прохождения, уже пройденные вопросы могли сдвинуться вперёд
+    completed = get_completed_questions(user_id, quiz.quiz_id) if order is not None and order.changed(quiz) else ()
+    next_id = next_question_id(quiz, question_id, order, completed)
+    end_time = int(time.time())
+
+    # Незаписанные операции пользователя (например, начало квиза) записываются в той же транзакции
+    queue = _progress_queue
+    pending = queue.take(str(user_id)) if queue is not None else []
+    try:
+        with get_connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            cursor = conn.cursor()
+            for op in pending:
+                _apply_progress_op(cursor, str(user_id), op)
+
+            # Завершаем текущий вопрос. Повторное нажатие на уже пройденный вопрос ничего не меняет
+            row = conn.execute('''
+                UPDATE UserProgress
+                SET end_time = ?, is_completed = 1
+                WHERE tg_id = ? AND question_id = ? AND end_time IS NULL
+                RETURNING start_time
+            ''', (end_time, str(user_id), question_id)).fetchone()
+            if row is None:
+                return AnswerResult(is_correct=True, description=description, stale=True)
+
+            if next_id is not None:
+                # Открываем следующий вопрос
+                conn.execute('''
+                    INSERT INTO UserProgress (tg_id, question_id, start_time, is_completed)
+                    VALUES (?, ?, ?, 0)
+                    ON CONFLICT (tg_id, question_id) DO UPDATE SET start_time = COALESCE(UserProgress.start_time, excluded.start_time)
+                ''', (str(user_id), next_id, start_time if start_time is not None else row[0]))
+                return AnswerResult(
+                    is_correct=True,
+                    description=description,
+                    next_question_id=next_id,
+                    next_question=get_question(next_id)
+                )
+
+            # Последний вопрос: общее время от начала первого вопроса прохождения (поиск по уникальному индексу)
+            first_start = conn.execute(
+                "SELECT start_time FROM UserProgress WHERE tg_id = ? AND question_id = ?",
+                (str(user_id), first_question_id(quiz, order))
+            ).fetchone()
+            total_time = end_time - int(first_start[0] if first_start and first_start[0] is not None else row[0])
+
+            # Обновляем топ квиза, только если новое время не хуже прежнего
+            updated = conn.execute('''
+                INSERT INTO TopUsers (quiz_id, tg_id, username, total_time)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT (quiz_id, tg_id) DO UPDATE SET username = excluded.username, total_time = excluded.total_time
+                WHERE excluded.total_time <= TopUsers.total_time
+                RETURNING total_time
+            ''', (quiz.quiz_id, str(user_id), username, total_time)).fetchone()
+
+        # Транзакция зафиксирована, обновляем таблицу лидеров в памяти
+        if updated is not None:
+            get_leaderboard(quiz.quiz_id).update(user_id, username, total_time)
+        return AnswerResult(
+            is_correct=True,
+            description=description,
+            total_time=total_time,
+            top_updated=updated is not None
+        )
+
+    except sqlite3.Error as e:
+        if queue is not None:
+            queue.restore(str(user_id), pending)
+        logging.error(f"Ошибка при записи ответа пользователя {user_id} на вопрос {question_id}: {e}")
+        return AnswerResult(is_correct=True, description=description, stale=True)
+
+def load_session(key: str, now: int) -> Optional[Tuple[str, int]]:
+    """
+    Возвращает сохранённую сессию.
+
+    :param key: Ключ сессии.
+    :param now: Текущее время (timestamp). Просроченные сессии не возвращаются.
+    :return: Кортеж (значение в JSON, время истечения), или None, если сессии нет.
+    """
+    try:
+        with get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT value, expires_at
+                FROM Sessions
+                WHERE key = ? AND expires_at > ?
+            ''', (key, now))
+            return cursor.fetchone()
+    except sqlite3.Error as e:
+        logging.error(f"Ошибка при чтении сессии {key}: {e}")
+        return None
+
+def save_sessions(upserts: List[Tuple[str, str, int]], deletes: List[str]) -> bool:
+    """
+    Записывает пачку изменений сессий одной транзакцией.
+
+    :param upserts: Список кортежей (ключ, значение в JSON, время истечения).
+    :param deletes: Список ключей удалённых сессий.
+    :return: True, если изменения записаны, иначе False.
+    """
+    try:
+        with get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.executemany('''
+                INSERT OR REPLACE INTO Sessions (key, value, expires_at)
+                VALUES (?, ?, ?)
+            ''', upserts)
+            cursor.executemany("DELETE FROM Sessions WHERE key = ?", [(key,) for key in deletes])
+            conn.commit()
+            return True
+    except sqlite3.Error as e:
+        logging.error(f"Ошибка при записи сессий: {e}")
+        return False
+
+def delete_expired_sessions(now: int) -> int:
+    """
+    Удаляет просроченные сессии.
+
+    :param now: Текущее время (timestamp).
+    :return: Количество удалённых сессий.
+    """
+    try:
+        with get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("DELETE FROM Sessions WHERE expires_at <= ?", (now,))
+            conn.commit()
+            return cursor.rowcount
+    except sqlite3.Error as e:
+        logging.error(f"Ошибка при удалении просроченных сессий: {e}")
+        return 0
+
+# Рассылки
+BROADCAST_COLUMNS = ("broadcast_id", "text", "created_by", "created_at", "status", "cursor", "sent", "failed", "pruned")
+
+def create_broadcast(text: str, created_by: int) -> Optional[Dict[str, Any]]:
+    """
+    Создаёт рассылку.
+
+    :param text: Текст сообщения.
+    :param created_by: ID администратора в Telegram.
+    :return: Рассылка (словарь со столбцами BROADCAST_COLUMNS), или None при ошибке.
+    """
+    try:
+        with get_connection() as conn:
+            row = conn.execute(
+                f"INSERT INTO Broadcasts (text, created_by, created_at) VALUES (?, ?, ?) RETURNING {', '.join(BROADCAST_COLUMNS)}",
+                (text, str(created_by), int(time.time()))
+            ).fetchone()
+            return dict(zip(BROADCAST_COLUMNS, row))
+    except sqlite3.Error as e:
+        logging.error(f"Ошибка при создании рассылки: {e}")
+        return None
+
+def get_unfinished_broadcasts() -> List[Dict[str, Any]]:
+    """
+    Возвращает рассылки, которые не были закончены (например, из-за перезапуска бота).
+
+    :return: Рассылки по возрастанию ID.
+    """
+    try:
+        with get_connection() as conn:
+            rows = conn.execute(
+                f"SELECT {', '.join(BROADCAST_COLUMNS)} FROM Broadcasts WHERE status = 'running' ORDER BY broadcast_id"
+            ).fetchall()
+            return [dict(zip(BROADCAST_COLUMNS, row)) for row in rows]
+    except sqlite3.Error as e:
+        logging.error(f"Ошибка при получении незаконченных рассылок: {e}")
         return []
 
+def save_broadcast_progress(broadcast_id: int, cursor: Optional[str], sent: int, failed: int, pruned: int,
+                            status: str = "running") -> bool:
+    """
+    Сохраняет, до какого пользователя дошла рассылка, и её счётчики.
+
+    :param cursor: tg_id последнего обработанного пользователя.
+    :param status: running, done или cancelled.
+    :return: True, если прогресс записан, иначе False.
+    """
+    try:
+        with get_connection() as conn:
+            conn.execute(
+                "UPDATE Broadcasts SET cursor = ?, sent = ?, failed = ?, pruned = ?, status = ? WHERE broadcast_id = ?",
+                (cursor, sent, failed, pruned, status, broadcast_id)
+            )
+            return True
+    except sqlite3.Error as e:
+        logging.error(f"Ошибка при сохранении прогресса рассылки {broadcast_id}: {e}")
+        return False
+
+def get_broadcast_recipients(after_id: Optional[str], limit: int) -> Optional[List[Dict[str, Any]]]:
+    """
+    Возвращает следующую пачку получателей рассылки по возрастанию tg_id.
+    В отличие от get_users_page, ошибка базы не выглядит как конец списка: рассылка по пустой пачке
+    считается законченной, поэтому при ошибке возвращается None, и рассылка продолжится позже.
+
+    :param after_id: tg_id последнего пользователя предыдущей пачки (None — с начала).
+    :param limit: Размер пачки.
+    :return: Пользователи пачки (пустой список — пользователи кончились), или None при ошибке.
+    """
+    if after_id is not None:
+        query, params = "SELECT tg_id, username FROM Users WHERE tg_id > ? ORDER BY tg_id LIMIT ?", (after_id, limit)
+    else:
+        query, params = "SELECT tg_id, username FROM Users ORDER BY tg_id LIMIT ?", (limit,)
+    try:
+        with get_connection() as conn:
+            return [{"tg_id": row[0], "username": row[1]} for row in conn.execute(query, params).fetchall()]
+    except sqlite3.Error as e:
+        logging.error(f"Ошибка при получении получателей рассылки: {e}")
+        return None
+
+def remove_users(user_ids: List[str]) -> int:
+    """
+    Удаляет пользователей из списка рассылки (таблицы Users), например заблокировавших бота.
+    Прогресс и результаты в топе остаются. Пользователь вернётся в список, когда снова начнёт квиз.
+
+    :param user_ids: tg_id пользователей.
+    :return: Количество удалённых пользователей.
+    """
+    try:
+        with get_connection() as conn:
+            before = conn.total_changes
+            conn.executemany("DELETE FROM Users WHERE tg_id = ?", [(str(user_id),) for user_id in user_ids])
+            _reset_users_count()
+            return conn.total_changes - before
+    except sqlite3.Error as e:
+        logging.error(f"Ошибка при удалении пользователей из списка рассылки: {e}")
+        return 0
+
 def recreate_database():
     """
     Пересоздает базу данных (удаляет и создает таблицы заново).
     """
     try:
         # Подключаемся к базе данных
-        with sqlite3.connect(db_path) as conn:
+        with get_connection() as conn:
             cursor = conn.cursor()
 
             # Удаляем таблицы, если они существуют
@@ -720,51 +1746,78 @@ def recreate_database():
             cursor.execute("DROP TABLE IF EXISTS Questions")
             cursor.execute("DROP TABLE IF EXISTS Users")
             cursor.execute("DROP TABLE IF EXISTS TopUsers")
+            cursor.execute("DROP TABLE IF EXISTS ImageCache")
+            cursor.execute("DROP TABLE IF EXISTS Sessions")
+            cursor.execute("DROP TABLE IF EXISTS Quizzes")
+            cursor.execute("DROP TABLE IF EXISTS QuizQuestions")
+            cursor.execute("DROP TABLE IF EXISTS Broadcasts")
+            cursor.execute("PRAGMA user_version = 0")
 
             # Создаем таблицы заново
             create_tables()
-            print("База данных успешно пересоздана.")
+            load_question_catalog()
+            load_leaderboard()
+            _reset_users_count()
+            logging.info("База данных успешно пересоздана.")
 
     except sqlite3.Error as e:
         # Обработка ошибок при пересоздании базы данных
-        print(f"Ошибка при пересоздании базы данных: {e}")
+        logging.error(f"Ошибка при пересоздании базы данных: {e}")
 
-def calculate_total_time(user_id: int) -> Optional[int]:
+def calculate_total_time(user_id: int, quiz_id: int = DEFAULT_QUIZ_ID, order: Optional[QuestionOrder] = None) -> Optional[int]:
     """
-    Вычисляет общее время прохождения квиза для пользователя.
+    Вычисляет общее время прохождения квиза для пользователя:
+    от начала первого вопроса квиза до завершения последнего.
+
+    :param user_id: ID пользователя в Telegram.
+    :param quiz_id: ID квиза.
+    :param order: Порядок вопросов прохождения. По умолчанию — порядок квиза.
+    :return: Общее время в секундах, или None, если квиз не пройден.
     """
+    quiz = get_quiz(quiz_id)
+    if quiz is None or not quiz.question_ids:
+        return None
+    first_id, last_id = first_question_id(quiz, order), last_question_id(quiz, order)
+
+    pending = _pending_progress(user_id)
     try:
-        with sqlite3.connect(db_path) as conn:
+        with get_connection() as conn:
             cursor = conn.cursor()
 
-            # Получаем все записи о прохождении вопросов
+            if pending:
+                # Учитываем ещё не записанный прогресс пользователя
+                rows = _progress_with_pending(cursor, user_id, pending)
+                last, first = rows.get(last_id), rows.get(first_id)
+                if not (last and last[2] and first and first[2]):
+                    return None
+                return int(last[1]) - int(first[0])
+
+            # Время завершения последнего вопроса
             cursor.execute('''
                 SELECT end_time
                 FROM UserProgress
-                WHERE tg_id = ? AND is_completed = 1 AND question_id = 25
-            ''', (str(user_id),))
+                WHERE tg_id = ? AND is_completed = 1 AND question_id = ?
+            ''', (str(user_id), last_id))
             end_time = cursor.fetchone()
 
+            # Время начала первого вопроса
             cursor.execute('''
                 SELECT start_time
                 FROM UserProgress
-                WHERE tg_id = ? AND is_completed = 1 AND question_id = 1
-            ''', (str(user_id),))
+                WHERE tg_id = ? AND is_completed = 1 AND question_id = ?
+            ''', (str(user_id), first_id))
             start_time = cursor.fetchone()
 
-
-            end_time = end_time[0]
-            start_time = start_time[0]
-            total_time = int(end_time) - int(start_time)
-            return total_time
+            if not end_time or not start_time:
+                return None
+            return int(end_time[0]) - int(start_time[0])
 
     except sqlite3.Error as e:
         # Обработка ошибок при вычислении времени
-        print(f"Ошибка при вычислении времени для пользователя {user_id}: {e}")
+        logging.error(f"Ошибка при вычислении времени для пользователя {user_id}: {e}")
         return None
 
 
-
 if __name__ == "__main__":
     recreate_database()
     
@@ -0,0 +1,117 @@
+import logging
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Deque, Dict, Hashable, Optional, Tuple
+
+# Типы обновлений, в которых есть отправитель
+_USER_UPDATE_FIELDS = (
+    "message", "edited_message", "callback_query", "inline_query",
+    "chosen_inline_result", "shipping_query", "pre_checkout_query", "poll_answer"
+)
+
+def update_user_id(update: Any) -> Optional[int]:
+    """
+    Возвращает ID пользователя, от которого пришло обновление.
+
+    :param update: Объект telebot.types.Update.
+    :return: ID пользователя, или None, если в обновлении нет отправителя.
+    """
+    for field in _USER_UPDATE_FIELDS:
+        payload = getattr(update, field, None)
+        if payload is None:
+            continue
+        user = getattr(payload, "from_user", None) or getattr(payload, "user", None)
+        if user is not None:
+            return user.id
+    return None
+
+
+class UpdateDispatcher:
+    """
+    Обрабатывает обновления в пуле потоков.
+
+    Обновления одного пользователя выполняются строго по очереди и в порядке поступления,
+    а обновления разных пользователей — параллельно. Поэтому медленная отправка фото
+    одному пользователю не задерживает остальных, а обработчики, меняющие состояние
+    пользователя, никогда не выполняются для него одновременно.
+    """
+
+    def __init__(self, workers: int = 8, max_pending: int = 0):
+        """
+        :param workers: Количество потоков-обработчиков.
+        :param max_pending: Максимальное количество принятых, но ещё не обработанных задач.
+            Когда предел достигнут, submit ждёт освобождения места. 0 — без ограничения.
+        """
+        self.workers = workers
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="update-worker")
+        self._pending: Dict[Hashable, Deque[Tuple[Callable, tuple]]] = {}
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_pending) if max_pending > 0 else None
+
+    def submit(self, key: Hashable, task: Callable, *args):
+        """
+        Ставит задачу в очередь пользователя.
+
+        :param key: Ключ очереди, обычно ID пользователя.
+        :param task: Функция-обработчик.
+        :param args: Аргументы обработчика.
+        """
+        if self._slots is not None:
+            self._slots.acquire()
+        with self._lock:
+            pending = self._pending.get(key)
+            if pending is not None:
+                # Очередь пользователя уже обрабатывается, задача выполнится следом
+                pending.append((task, args))
+                return
+            self._pending[key] = deque([(task, args)])
+        self._executor.submit(self._drain, key)
+
+    def _drain(self, key: Hashable):
+        while True:
+            with self._lock:
+                pending = self._pending[key]
+                if not pending:
+                    del self._pending[key]
+                    return
+                task, args = pending.popleft()
+            try:
+                task(*args)
+            except Exception as e:
+                logging.exception(f"Ошибка при обработке обновления пользователя {key}: {e}")
+            finally:
+                if self._slots is not None:
+                    self._slots.release()
+
+    def queue_depth(self) -> int:
+        """
+        :return: Количество задач, ожидающих выполнения.
+        """
+        with self._lock:
+            return sum(len(pending) for pending in self._pending.values())
+
+    def attach(self, bot):
+        """
+        Направляет все обновления бота через диспетчер.
+        Бот должен быть создан с threaded=False, иначе telebot будет использовать свой пул потоков.
+
+        :param bot: Экземпляр TeleBot.
+        """
+        process_new_updates = bot.process_new_updates
+
+        def dispatch_updates(updates):
+            for update in updates:
+                user_id = update_user_id(update)
+                key = user_id if user_id is not None else ("update", update.update_id)
+                self.submit(key, process_new_updates, [update])
+
+        bot.process_new_updates = dispatch_updates
+
+    def stop(self, wait: bool = True):
+        """
+        Останавливает пул потоков.
+
+        :param wait: Дождаться выполнения всех поставленных задач.
+        """
+        self._executor.shutdown(wait=wait)
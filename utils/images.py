@@ -0,0 +1,326 @@
+"""
+Картинки вопросов: хэши файлов и подготовка копий для отправки в Telegram.
+
+Клиенты Telegram показывают фото не больше IMAGE_MAX_SIDE по длинной стороне, поэтому
+исходные картинки уменьшаются до этого размера, пережимаются в JPEG с качеством IMAGE_QUALITY
+и сохраняются без метаданных (EXIF, цветовой профиль). Копия называется по хэшу содержимого
+и описывается в манифесте (manifest.json в IMAGE_DIR): исходный файл и его хэш -> копия и её хэш.
+Пока исходный файл и настройки не меняются, картинка не обрабатывается повторно — ни при
+отправке, ни при следующей сборке. Если копия не меньше исходного файла, отправляется исходный.
+
+Копии собираются заранее (python -m utils.images) или при первой отправке картинки.
+Нужен пакет Pillow; без него отправляются исходные файлы.
+
+Запуск:
+    python -m utils.images [--force] [файлы...]
+"""
+import argparse
+import hashlib
+import io
+import json
+import logging
+import os
+import threading
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Tuple
+
+from utils.config import IMAGE_PIPELINE, IMAGE_DIR, IMAGE_MAX_SIDE, IMAGE_QUALITY
+from utils.log import log_event
+
+# Хэши файлов запоминаются вместе с размером и временем изменения,
+# поэтому файл перечитывается только если он изменился на диске
+_hash_cache: Dict[str, Tuple[int, int, str]] = {}
+_hash_lock = threading.Lock()
+
+# Версия обработки: при изменении алгоритма все копии собираются заново
+PIPELINE_VERSION = 1
+MANIFEST = "manifest.json"
+
+# Исходные картинки, которые собирает python -m utils.images без аргументов
+SOURCE_DIR = "imgs"
+SOURCE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp")
+
+def file_hash(path: str) -> str:
+    """
+    Возвращает SHA-256 содержимого файла.
+
+    :param path: Путь к файлу.
+    :return: Хэш содержимого в шестнадцатеричном виде.
+    """
+    stat = os.stat(path)
+    cached = _hash_cache.get(path)
+    if cached and cached[0] == stat.st_mtime_ns and cached[1] == stat.st_size:
+        return cached[2]
+
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(65536), b""):
+            digest.update(chunk)
+    content_hash = digest.hexdigest()
+
+    with _hash_lock:
+        _hash_cache[path] = (stat.st_mtime_ns, stat.st_size, content_hash)
+    return content_hash
+
+
+@dataclass(frozen=True)
+class PreparedImage:
+    """
+    Файл, который загружается вместо картинки вопроса.
+    """
+    path: str
+    content_hash: str  # Хэш загружаемого файла: по нему проверяется file_id в кэше картинок
+
+
+# Ошибки Telegram о том, что file_id больше не принимается (ответ 400)
+FILE_ID_REJECTED = ("wrong file identifier", "wrong remote file identifier", "file reference expired",
+                    "file_reference_expired", "wrong file_id", "invalid file_id")
+
+
+def is_file_id_rejected(error: Exception) -> bool:
+    """
+    Проверяет, что Telegram отклонил сохранённый file_id и картинку нужно загрузить заново.
+    Лимиты (429) и ошибки сервера (5xx) к этому не относятся: file_id остаётся верным.
+
+    :param error: Исключение telebot (ApiTelegramException).
+    """
+    if getattr(error, "error_code", None) != 400:
+        return False
+    description = (getattr(error, "description", None) or "").lower()
+    return any(reason in description for reason in FILE_ID_REJECTED)
+
+
+class ImagePipeline:
+    """
+    Готовит копии картинок и ведёт их манифест.
+
+    Манифест держится в памяти, проверка готовой копии — это сравнение хэша исходного файла
+    (он кэшируется по времени изменения) и словарь. Если манифест переписал другой процесс
+    (сборка python -m utils.images при запущенном боте), он перечитывается при первом промахе.
+    """
+
+    def __init__(self, directory: str = IMAGE_DIR, max_side: int = IMAGE_MAX_SIDE, quality: int = IMAGE_QUALITY):
+        """
+        :param directory: Папка для копий и манифеста.
+        :param max_side: Длинная сторона копии.
+        :param quality: Качество JPEG.
+        """
+        self.directory = directory
+        self.max_side = max_side
+        self.quality = quality
+        self.settings = f"v{PIPELINE_VERSION}/{max_side}/{quality}"
+        self._manifest_path = os.path.join(directory, MANIFEST)
+        self._manifest: Dict[str, Dict[str, Any]] = {}
+        self._manifest_mtime: Optional[int] = None
+        self._lock = threading.Lock()
+        self._reload()
+
+    def lookup(self, source: str) -> Optional[PreparedImage]:
+        """
+        :return: Готовая копия картинки, или None, если её нет или исходный файл изменился.
+        """
+        entry = self._manifest.get(source)
+        if entry is None or entry["settings"] != self.settings or entry["source_hash"] != file_hash(source):
+            return None
+        if entry["output"] is None:
+            return PreparedImage(source, entry["source_hash"])
+        path = os.path.join(self.directory, entry["output"])
+        if not os.path.exists(path):
+            return None
+        return PreparedImage(path, entry["hash"])
+
+    def prepare(self, source: str, force: bool = False) -> PreparedImage:
+        """
+        Возвращает копию картинки, собирая её, если готовой нет.
+
+        :param force: Собрать заново, даже если копия готова.
+        """
+        prepared = None if force else self.lookup(source)
+        if prepared is not None:
+            return prepared
+        with self._lock:
+            if not force:
+                self._reload()
+                prepared = self.lookup(source)
+                if prepared is not None:
+                    return prepared
+            entry = self._process(source)
+            self._manifest[source] = entry
+            self._save()
+        return self.lookup(source) or PreparedImage(source, entry["source_hash"])
+
+    def entry(self, source: str) -> Optional[Dict[str, Any]]:
+        """
+        :return: Запись манифеста о картинке (размеры до и после обработки).
+        """
+        return self._manifest.get(source)
+
+    def prune(self) -> int:
+        """
+        Удаляет копии, на которые не ссылается манифест.
+
+        :return: Количество удалённых файлов.
+        """
+        if not os.path.isdir(self.directory):
+            return 0
+        with self._lock:
+            used = {entry["output"] for entry in self._manifest.values()}
+            removed = 0
+            for name in os.listdir(self.directory):
+                if name != MANIFEST and name not in used and os.path.isfile(os.path.join(self.directory, name)):
+                    os.remove(os.path.join(self.directory, name))
+                    removed += 1
+            return removed
+
+    def _process(self, source: str) -> Dict[str, Any]:
+        source_hash = file_hash(source)
+        source_bytes = os.path.getsize(source)
+        entry = {"settings": self.settings, "source_hash": source_hash, "source_bytes": source_bytes,
+                 "output": None, "hash": source_hash, "bytes": source_bytes}
+        try:
+            data, size = self._encode(source)
+        except Exception as e:
+            # Картинка отправляется как есть и не обрабатывается снова, пока не изменится
+            logging.error(f"Не удалось подготовить картинку {source}: {e}")
+            return entry
+        if len(data) >= source_bytes:
+            return entry
+
+        content_hash = hashlib.sha256(data).hexdigest()
+        output = f"{content_hash}.jpg"
+        path = os.path.join(self.directory, output)
+        try:
+            if not os.path.exists(path):
+                os.makedirs(self.directory, exist_ok=True)
+                tmp_path = f"{path}.{os.getpid()}.tmp"
+                with open(tmp_path, "wb") as f:
+                    f.write(data)
+                os.replace(tmp_path, path)
+        except OSError as e:
+            logging.error(f"Не удалось сохранить копию картинки {source}: {e}")
+            return entry
+        entry.update(output=output, hash=content_hash, bytes=len(data), width=size[0], height=size[1])
+        log_event("images.prepared", f"Картинка {source} подготовлена: {source_bytes} -> {len(data)} байт",
+                  source=source, source_bytes=source_bytes, bytes=len(data))
+        return entry
+
+    def _encode(self, source: str) -> Tuple[bytes, Tuple[int, int]]:
+        from PIL import Image, ImageOps
+
+        with Image.open(source) as image:
+            # Поворот из EXIF применяется к пикселям, потому что сами метаданные не сохраняются
+            image = ImageOps.exif_transpose(image)
+            if image.mode in ("RGBA", "LA", "P"):
+                image = image.convert("RGBA")
+                background = Image.new("RGB", image.size, (255, 255, 255))
+                background.paste(image, mask=image.getchannel("A"))
+                image = background
+            elif image.mode != "RGB":
+                image = image.convert("RGB")
+            image.thumbnail((self.max_side, self.max_side), Image.LANCZOS)
+            buffer = io.BytesIO()
+            image.save(buffer, "JPEG", quality=self.quality, optimize=True, progressive=True)
+            return buffer.getvalue(), image.size
+
+    def _reload(self):
+        try:
+            mtime = os.stat(self._manifest_path).st_mtime_ns
+        except OSError:
+            return
+        if mtime == self._manifest_mtime:
+            return
+        try:
+            with open(self._manifest_path, encoding="utf-8") as f:
+                self._manifest = json.load(f)
+            self._manifest_mtime = mtime
+        except (OSError, ValueError) as e:
+            logging.error(f"Не удалось прочитать манифест картинок {self._manifest_path}: {e}")
+
+    def _save(self):
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_path = f"{self._manifest_path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self._manifest, f, ensure_ascii=False, indent=1, sort_keys=True)
+            os.replace(tmp_path, self._manifest_path)
+            self._manifest_mtime = os.stat(self._manifest_path).st_mtime_ns
+        except OSError as e:
+            logging.error(f"Не удалось сохранить манифест картинок {self._manifest_path}: {e}")
+
+
+_pipeline: Optional[ImagePipeline] = None
+_pipeline_lock = threading.Lock()
+
+def get_pipeline() -> Optional[ImagePipeline]:
+    """
+    :return: Общий ImagePipeline, или None, если подготовка выключена (IMAGE_PIPELINE=0)
+        или не установлен Pillow.
+    """
+    global _pipeline
+    if _pipeline is not None or not IMAGE_PIPELINE:
+        return _pipeline
+    with _pipeline_lock:
+        if _pipeline is None:
+            try:
+                import PIL  # noqa: F401
+            except ImportError:
+                logging.warning("Пакет Pillow не установлен: картинки отправляются без подготовки (pip install Pillow)")
+                return None
+            _pipeline = ImagePipeline()
+    return _pipeline
+
+def prepared_image(path: str) -> Optional[PreparedImage]:
+    """
+    Файл для отправки без обработки картинки: готовая копия или исходный файл.
+
+    :return: None, если копию нужно собрать (prepare_image).
+    """
+    pipeline = get_pipeline()
+    if pipeline is None:
+        return PreparedImage(path, file_hash(path))
+    return pipeline.lookup(path)
+
+def prepare_image(path: str) -> PreparedImage:
+    """
+    Файл для отправки картинки: готовая копия, при необходимости собранная сейчас.
+    """
+    prepared = prepared_image(path)
+    if prepared is not None:
+        return prepared
+    return get_pipeline().prepare(path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("paths", nargs="*", help=f"картинки (по умолчанию все из {SOURCE_DIR}/)")
+    parser.add_argument("--force", action="store_true", help="собрать заново готовые копии")
+    args = parser.parse_args()
+
+    try:
+        import PIL  # noqa: F401
+    except ImportError:
+        parser.error("нужен пакет Pillow (pip install Pillow)")
+
+    paths = [os.path.normpath(path) for path in args.paths] or sorted(
+        os.path.join(SOURCE_DIR, name) for name in os.listdir(SOURCE_DIR)
+        if name.lower().endswith(SOURCE_EXTENSIONS) and os.path.isfile(os.path.join(SOURCE_DIR, name))
+    )
+    pipeline = ImagePipeline()
+    processed = source_total = total = 0
+    for path in paths:
+        ready = not args.force and pipeline.lookup(path) is not None
+        pipeline.prepare(path, force=args.force)
+        entry = pipeline.entry(path)
+        processed += not ready
+        source_total += entry["source_bytes"]
+        total += entry["bytes"]
+        status = "готова" if ready else ("собрана" if entry["output"] else "исходный файл")
+        print(f"{path:<32} {entry['source_bytes']:>9} -> {entry['bytes']:>9}  {status}")
+    removed = pipeline.prune() if not args.paths else 0
+    print(f"Картинок: {len(paths)}, обработано: {processed}, удалено старых копий: {removed}")
+    if source_total:
+        print(f"Размер: {source_total} -> {total} байт ({total / source_total:.0%})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+from typing import List, Sequence, Union
+from telebot import types
+
+from utils.callbacks import (
+    ANSWER, HINT, ADMIN, DELETE_QUESTION, ADD_QUESTION, USER_DETAIL, QUESTIONS_PAGE, USERS_PAGE, START_QUIZ,
+    BROADCAST_CANCEL, PAGE_AFTER, PAGE_BEFORE, ADMIN_ACTIONS, NONCE_PLACEHOLDER, encode
+)
+from utils.pagination import Page
+
+# Строк на одной странице списков админ-панели
+ADMIN_PAGE_SIZE = 10
+
+def admin_action(name: str) -> str:
+    """
+    callback_data раздела админ-панели.
+    """
+    return encode(ADMIN, ADMIN_ACTIONS.index(name))
+
+def question_keyboard(question_id: int, options: Sequence[str],
+                      nonce: Union[int, str] = NONCE_PLACEHOLDER) -> types.InlineKeyboardMarkup:
+    """
+    Генерирует клавиатуру с вариантами ответа и подсказкой.
+
+    :param nonce: nonce сессии квиза. По умолчанию — заглушка, которую подставляет utils.payloads.
+    """
+    keyboard = types.InlineKeyboardMarkup()
+    for idx, option in enumerate(options):
+        keyboard.add(types.InlineKeyboardButton(option, callback_data=encode(ANSWER, question_id, idx + 1, nonce)))
+    keyboard.add(types.InlineKeyboardButton("💡 Подсказка", callback_data=encode(HINT, question_id, nonce)))
+    return keyboard
+
+def quizzes_keyboard(quizzes) -> types.InlineKeyboardMarkup:
+    """
+    Генерирует список квизов для выбора перед прохождением.
+    """
+    keyboard = types.InlineKeyboardMarkup()
+    for quiz in quizzes:
+        keyboard.add(types.InlineKeyboardButton(
+            f"🧩 {quiz.title} ({len(quiz.question_ids)})",
+            callback_data=encode(START_QUIZ, quiz.quiz_id)
+        ))
+    return keyboard
+
+def generate_admin_menu() -> types.InlineKeyboardMarkup:
+    """
+    Генерирует меню администратора.
+    """
+    keyboard = types.InlineKeyboardMarkup(row_width=2)
+    keyboard.add(
+        types.InlineKeyboardButton("📝 Управление вопросами", callback_data=admin_action("questions")),
+        types.InlineKeyboardButton("👥 Пользователи", callback_data=admin_action("users")),
+        types.InlineKeyboardButton("📊 Топ-10", callback_data=admin_action("stats")),
+        types.InlineKeyboardButton("📣 Рассылка", callback_data=admin_action("broadcast")),
+        types.InlineKeyboardButton("❌ Закрыть", callback_data=admin_action("close"))
+    )
+    return keyboard
+
+def page_buttons(action: str, page: Page, first_id: int, last_id: int) -> List[types.InlineKeyboardButton]:
+    """
+    Кнопки листания: курсором служит ключ первой или последней строки страницы.
+    """
+    buttons = []
+    if page.has_prev:
+        buttons.append(types.InlineKeyboardButton("◀️", callback_data=encode(action, page.number - 1, PAGE_BEFORE, first_id)))
+    if page.has_next:
+        buttons.append(types.InlineKeyboardButton("▶️", callback_data=encode(action, page.number + 1, PAGE_AFTER, last_id)))
+    return buttons
+
+def questions_keyboard(page: Page) -> types.InlineKeyboardMarkup:
+    """
+    Генерирует страницу списка вопросов с кнопками удаления и листания.
+    """
+    keyboard = types.InlineKeyboardMarkup()
+    questions = page.items
+    if questions:
+        # После удаления показывается та же страница: она начинается после этого ID
+        cursor = questions[0]['question_id'] - 1
+        for q in questions:
+            keyboard.add(types.InlineKeyboardButton(
+                f"❌ Вопрос {q['question_id']}: {q['question_text'][:20]}...",
+                callback_data=encode(DELETE_QUESTION, q['question_id'], page.number, cursor)
+            ))
+        keyboard.row(*page_buttons(QUESTIONS_PAGE, page, questions[0]['question_id'], questions[-1]['question_id']))
+    keyboard.add(
+        types.InlineKeyboardButton("➕ Добавить вопрос", callback_data=encode(ADD_QUESTION)),
+        types.InlineKeyboardButton("🔙 Назад", callback_data=admin_action("back"))
+    )
+    return keyboard
+
+def users_keyboard(page: Page) -> types.InlineKeyboardMarkup:
+    """
+    Генерирует страницу списка пользователей с кнопками листания.
+    """
+    keyboard = types.InlineKeyboardMarkup()
+    users = page.items
+    for user in users:
+        keyboard.add(types.InlineKeyboardButton(
+            f"👤 {user['username']} (ID: {user['tg_id']})",
+            callback_data=encode(USER_DETAIL, int(user['tg_id']))
+        ))
+    if users:
+        keyboard.row(*page_buttons(USERS_PAGE, page, int(users[0]['tg_id']), int(users[-1]['tg_id'])))
+    keyboard.add(types.InlineKeyboardButton("🔙 Назад", callback_data=admin_action("back")))
+    return keyboard
+
+def back_keyboard() -> types.InlineKeyboardMarkup:
+    return types.InlineKeyboardMarkup().add(types.InlineKeyboardButton("🔙 Назад", callback_data=admin_action("back")))
+
+def broadcast_keyboard(broadcast_id: int) -> types.InlineKeyboardMarkup:
+    return types.InlineKeyboardMarkup().add(
+        types.InlineKeyboardButton("⏹ Остановить", callback_data=encode(BROADCAST_CANCEL, broadcast_id))
+    )
@@ -0,0 +1,200 @@
+import bisect
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Запись таблицы лидеров: (место в списке, ID пользователя, имя, время в секундах)
+Entry = Tuple[int, str, str, int]
+
+
+class Leaderboard:
+    """
+    Таблица лидеров в памяти с запросами за O(log n).
+
+    Время прохождения раскладывается по корзинам шириной в одну секунду, а дерево Фенвика
+    хранит количество пользователей в каждой корзине. Место пользователя — это число
+    пользователей с меньшим временем плюс один (как COUNT(*) + 1 в SQL), а пользователь
+    на позиции k находится спуском по дереву. Внутри корзины записи отсортированы
+    по (время, ID), поэтому порядок при равном времени стабилен.
+
+    Время больше max_time попадает в последнюю общую корзину, внутри которой записи
+    тоже отсортированы, так что место для них остаётся точным.
+    """
+
+    def __init__(self, max_time: int = 7 * 86400):
+        """
+        :param max_time: Время в секундах, после которого корзины перестают быть отдельными.
+        """
+        self.max_time = max_time
+        self._lock = threading.RLock()
+        self._clear(1024)
+
+    def _clear(self, size: int):
+        self._size = size
+        self._tree = [0] * (size + 1)
+        self._buckets: Dict[int, List[Tuple[int, str]]] = {}
+        self._users: Dict[str, Tuple[int, str]] = {}
+
+    def _bucket(self, total_time: int) -> int:
+        return min(max(total_time, 0), self.max_time)
+
+    def _add(self, bucket: int, delta: int):
+        i = bucket + 1
+        while i <= self._size:
+            self._tree[i] += delta
+            i += i & -i
+
+    def _prefix(self, bucket: int) -> int:
+        """Количество пользователей в корзинах меньше bucket."""
+        total = 0
+        i = min(bucket, self._size)
+        while i > 0:
+            total += self._tree[i]
+            i -= i & -i
+        return total
+
+    def _find(self, position: int) -> int:
+        """Корзина, в которой лежит пользователь на позиции position (с единицы)."""
+        i = 0
+        step = 1 << self._size.bit_length()
+        while step:
+            j = i + step
+            if j <= self._size and self._tree[j] < position:
+                i = j
+                position -= self._tree[j]
+            step >>= 1
+        return i
+
+    def _rebuild(self, size: int):
+        # Дерево строится из размеров корзин за O(size)
+        tree = [0] * (size + 1)
+        for bucket, entries in self._buckets.items():
+            tree[bucket + 1] = len(entries)
+        for i in range(1, size + 1):
+            parent = i + (i & -i)
+            if parent <= size:
+                tree[parent] += tree[i]
+        self._size = size
+        self._tree = tree
+
+    def _ensure_capacity(self, bucket: int):
+        if bucket < self._size:
+            return
+        size = self._size
+        while size <= bucket:
+            size *= 2
+        self._rebuild(min(size, self.max_time + 1))
+
+    def load(self, rows: Iterable[Tuple[str, str, int]]):
+        """
+        Заполняет таблицу целиком, например строками TopUsers при запуске.
+
+        :param rows: Строки (ID пользователя, имя, время в секундах).
+        """
+        with self._lock:
+            users = {str(user_id): (int(total_time), username) for user_id, username, total_time in rows}
+            buckets: Dict[int, List[Tuple[int, str]]] = {}
+            for user_id, (total_time, _) in users.items():
+                buckets.setdefault(self._bucket(total_time), []).append((total_time, user_id))
+            for entries in buckets.values():
+                entries.sort()
+
+            size = 1024
+            while size <= max(buckets, default=0):
+                size *= 2
+            self._users = users
+            self._buckets = buckets
+            self._rebuild(min(size, self.max_time + 1))
+
+    def update(self, user_id, username: str, total_time: int):
+        """
+        Добавляет пользователя или меняет его время.
+        """
+        user_id = str(user_id)
+        with self._lock:
+            self._remove(user_id)
+            bucket = self._bucket(total_time)
+            self._ensure_capacity(bucket)
+            bisect.insort(self._buckets.setdefault(bucket, []), (total_time, user_id))
+            self._users[user_id] = (total_time, username)
+            self._add(bucket, 1)
+
+    def remove(self, user_id):
+        """
+        Удаляет пользователя из таблицы.
+        """
+        with self._lock:
+            self._remove(str(user_id))
+
+    def _remove(self, user_id: str):
+        current = self._users.pop(user_id, None)
+        if current is None:
+            return
+        bucket = self._bucket(current[0])
+        entries = self._buckets[bucket]
+        del entries[bisect.bisect_left(entries, (current[0], user_id))]
+        if not entries:
+            del self._buckets[bucket]
+        self._add(bucket, -1)
+
+    def get(self, user_id) -> Optional[Tuple[int, str]]:
+        """
+        :return: Кортеж (время, имя) пользователя, или None, если его нет в таблице.
+        """
+        with self._lock:
+            return self._users.get(str(user_id))
+
+    def rank(self, user_id) -> Optional[int]:
+        """
+        Место пользователя: число пользователей с меньшим временем плюс один.
+
+        :return: Место, или None, если пользователя нет в таблице.
+        """
+        with self._lock:
+            current = self._users.get(str(user_id))
+            if current is None:
+                return None
+            bucket = self._bucket(current[0])
+            return self._prefix(bucket) + bisect.bisect_left(self._buckets[bucket], (current[0], "")) + 1
+
+    def _position(self, user_id: str) -> int:
+        total_time = self._users[user_id][0]
+        bucket = self._bucket(total_time)
+        return self._prefix(bucket) + bisect.bisect_left(self._buckets[bucket], (total_time, user_id)) + 1
+
+    def _slice(self, start: int, count: int) -> List[Entry]:
+        result = []
+        position = max(start, 1)
+        end = min(start + count, len(self._users) + 1)
+        while position < end:
+            bucket = self._find(position)
+            entries = self._buckets[bucket]
+            offset = position - self._prefix(bucket) - 1
+            for total_time, user_id in entries[offset:offset + end - position]:
+                result.append((position, user_id, self._users[user_id][1], total_time))
+                position += 1
+        return result
+
+    def top(self, count: int = 10) -> List[Entry]:
+        """
+        Первые count пользователей по возрастанию времени.
+        """
+        with self._lock:
+            return self._slice(1, count)
+
+    def around(self, user_id, radius: int = 2) -> List[Entry]:
+        """
+        Пользователь и radius соседей сверху и снизу.
+
+        :return: Записи таблицы, или пустой список, если пользователя нет в таблице.
+        """
+        with self._lock:
+            user_id = str(user_id)
+            if user_id not in self._users:
+                return []
+            position = self._position(user_id)
+            start = max(position - radius, 1)
+            return self._slice(start, position + radius - start + 1)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._users)
@@ -0,0 +1,163 @@
+import atexit
+import itertools
+import json
+import logging
+import queue
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Dict, Iterator, Optional
+
+from utils import metrics
+from utils.config import (
+    LOG_FILE, LOG_FORMAT, LOG_LEVEL, LOG_MAX_BYTES, LOG_BACKUP_COUNT, LOG_QUEUE_SIZE, LOG_SAMPLE_EVERY, LOG_CONSOLE
+)
+
+TEXT_FORMAT = "[%(levelname)s](%(asctime)s) - %(message)s"
+TEXT_DATEFMT = "%Y.%m.%d %H:%M:%S"
+
+_listener: Optional[QueueListener] = None
+_queue_handler: Optional["NonBlockingQueueHandler"] = None
+
+# Счётчики частых событий для выборки: событие -> номер следующей записи
+_sample_counters: Dict[str, Iterator[int]] = {}
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Форматирует запись лога как одну строку JSON.
+
+    Кроме времени, уровня, потока и текста в запись попадают имя события и поля,
+    переданные через log_event, а для выборочных событий — sample_every:
+    сколько таких событий приходится на одну записанную строку.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "thread": record.threadName,
+            "message": record.getMessage(),
+        }
+        event = getattr(record, "event", None)
+        if event is not None:
+            entry["event"] = event
+            entry.update(getattr(record, "fields", None) or {})
+        sample_every = getattr(record, "sample_every", None)
+        if sample_every:
+            entry["sample_every"] = sample_every
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """
+    Передаёт записи в очередь фонового потока записи и никогда не ждёт.
+
+    Текст и трассировка исключения форматируются сразу, пока аргументы не изменились,
+    а запись в файл и консоль выполняет QueueListener. Если очередь заполнена,
+    запись отбрасывается и учитывается в dropped и в метрике bot_log_dropped_total.
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record.message = record.getMessage()
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.msg, record.args, record.exc_info = record.message, None, None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            metrics.inc("bot_log_dropped_total")
+
+
+class _Listener(QueueListener):
+    def enqueue_sentinel(self):
+        # При остановке ждём места в очереди: признак конца нельзя отбросить
+        self.queue.put(self._sentinel)
+
+
+def setup_logging():
+    """
+    Настраивает логирование: обработчики пишут записи в очередь, а файл (с ротацией по размеру)
+    и консоль обслуживает фоновый поток. Повторный вызов ничего не делает.
+    """
+    global _listener, _queue_handler
+    if _listener is not None:
+        return
+
+    file_handler = RotatingFileHandler(LOG_FILE, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT, encoding="utf-8")
+    file_handler.setFormatter(JsonFormatter() if LOG_FORMAT == "json" else logging.Formatter(TEXT_FORMAT, TEXT_DATEFMT))
+    handlers = [file_handler]
+    if LOG_CONSOLE:
+        console_handler = logging.StreamHandler()
+        console_handler.setFormatter(logging.Formatter(TEXT_FORMAT, TEXT_DATEFMT))
+        handlers.append(console_handler)
+
+    log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    _queue_handler = NonBlockingQueueHandler(log_queue)
+    root = logging.getLogger()
+    root.setLevel(LOG_LEVEL)
+    root.addHandler(_queue_handler)
+
+    _listener = _Listener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+
+def stop_logging():
+    """
+    Дописывает накопившиеся записи и останавливает фоновый поток записи.
+    """
+    global _listener, _queue_handler
+    if _listener is None:
+        return
+    _listener.stop()
+    logging.getLogger().removeHandler(_queue_handler)
+    if _queue_handler.dropped:
+        # Очередь уже остановлена, поэтому запись передаётся обработчикам напрямую
+        record = logging.makeLogRecord({
+            "msg": f"Очередь лога переполнялась, пропущено записей: {_queue_handler.dropped}",
+            "levelno": logging.WARNING, "levelname": "WARNING",
+        })
+        for handler in _listener.handlers:
+            handler.handle(record)
+    for handler in _listener.handlers:
+        handler.close()
+    _listener = None
+    _queue_handler = None
+
+def log_event(event: str, message: str, level: int = logging.INFO, sample: bool = False, **fields):
+    """
+    Пишет структурированное событие лога.
+
+    :param event: Имя события, например db.question_started.
+    :param message: Текст для человека.
+    :param level: Уровень лога.
+    :param sample: Частое событие: записывается одно из LOG_SAMPLE_EVERY.
+    :param fields: Поля события (ID пользователя, вопроса и т. п.).
+    """
+    root = logging.getLogger()
+    if not root.isEnabledFor(level):
+        return
+    sample_every = None
+    if sample and LOG_SAMPLE_EVERY > 1:
+        counter = _sample_counters.get(event)
+        if counter is None:
+            counter = _sample_counters.setdefault(event, itertools.count())
+        if next(counter) % LOG_SAMPLE_EVERY:
+            return
+        sample_every = LOG_SAMPLE_EVERY
+    root.log(level, message, extra={"event": event, "fields": fields, "sample_every": sample_every})
+
+def log_action(action: str, user_id: int, details: str = ""):
+    log_event("action", f"ACTION: {action} | USER_ID: {user_id} | DETAILS: {details}",
+              action=action, user_id=user_id, details=details)
@@ -0,0 +1,121 @@
+# Сообщения
+messages = {
+    "start": "🚀 **Добро пожаловать в космический квиз-бот!**\n\n🌌 Здесь вы сможете проверить свои знания о космосе и сразиться за место в топе. Используйте команду /help, чтобы узнать больше о возможностях бота.",
+    "help": "📋 **Доступные команды:**\n\n"
+            "▶️ /start\_quiz - Начать новую викторину (или /start\_quiz <квиз>)\n"
+            "📊 /stats - Посмотреть вашу статистику (или /stats <квиз>)\n"
+            "🎁 /get\_prize - Получить награду за прохождение (или /get\_prize <квиз>)\n"
+            "👨💻 /author - Узнать об авторе бота\n"
+            "🔧 /admin - Админ-панель (только для администраторов)",
+    "prize_success": "🎉 **Поздравляем с завершением квиза!**\n\n"
+                     "🌟 Вы успешно прошли все вопросы! Пока что награда — это ваша гордость и знания, но в будущем вас ждут сюрпризы. Попробуйте улучшить свой результат и занять первое место в топе! 🏆",
+    "prize_failure": "❌ **Не все вопросы пройдены!**\n\n"
+                     "📊 Выполнено: {}/{}\n"
+                     "Продолжайте отвечать на вопросы, чтобы получить награду! 💪",
+    "no_questions": "❌ **Вопросы не найдены!**\n\n"
+                    "⚠️ Обратитесь к администратору за помощью. Контактные данные можно найти в разделе /author.",
+    "author": "👨💻 **Разработчик бота:**\n\n"
+              "• **ФИО:** Горшков Константин Алексеевич\n"
+              "• **Telegram:** [@Kos000113](https://t.me/Kos000113)\n"
+              "• **GitHub:** [kostya2023](https://github.com/kostya2023)\n"
+              "• **Проект:** [space_quiz_bot](https://github.com/kostya2023/telegram_space_quiz_bot)",
+    "stats": "📊 **Ваша статистика:**\n\n"
+             "• Пройдено вопросов: {}\n"
+             "• Общее время: {}\n"
+             "• Место в топе: {}",
+    "correct_answer": "✅ **Правильно!**\n\n"
+                      "🎉 Вы справились! Переходим к следующему вопросу!",
+    "incorrect_answer": "❌ **Неверно!**\n\n"
+                        "😔 Попробуйте ещё раз или переходите к следующему вопросу.",
+    "quiz_completed": "🎉 **Квиз завершён!**\n\n"
+                      "⏱️ Ваше время: {} секунд\n"
+                      "🏆 Ваш результат добавлен в топ!",
+    "quiz_completed_no_record": "🎉 Квиз пройден! У вас есть результат лучше, так что время не обновлено.",
+    "correct_alert": "✅ Верно!\n\n{}",
+    "incorrect_alert": "❌ Неверно!",
+    "hint": "💡 Подсказка:\n\n{}",
+    "choose_quiz": "🧩 **Выберите квиз:**",
+    "unknown_quiz": "❌ Квиз «{}» не найден. Доступные квизы: {}",
+    "quiz_title": "🧩 **{}**\n\n",
+    "stale_button": "⌛ Эта кнопка из прошлого прохождения квиза. Начните заново: /start_quiz",
+    "admin": {
+        "access_denied": "⛔ **Доступ запрещён!**\n\n"
+                         "Эта команда доступна только администраторам.",
+        "panel": "🔧 **Админ-панель:**\n\n"
+                 "Выберите действие:",
+        "questions_list": "📚 **Список вопросов:**\n\n",
+        "users_list": "👥 **Список пользователей:**\n\n",
+        "page": "Страница {} из {} · всего {}",
+        "top_users": "🏆 **Топ-10 пользователей:**\n\n",
+        "question_deleted": "🗑️ **Вопрос успешно удалён!**",
+        "question_added": "📝 **Вопрос успешно добавлен!**",
+        "error": "❌ **Произошла ошибка!**\n\n"
+                 "Пожалуйста, попробуйте ещё раз или свяжитесь с разработчиком.",
+        "invalid_format": "⚠️ **Неверный формат данных!**\n\n"
+                          "Пример правильного формата:\n"
+                          "`Вопрос; вариант1; вариант2; вариант3; вариант4; правильный_ответ`",
+        "add_question_instruction": "📝 **Добавление нового вопроса:**\n\n"
+                                    "Введите вопрос в формате:\n"
+                                    "`Вопрос; вариант1; вариант2; вариант3; вариант4; правильный_ответ`\n\n"
+                                    "Или отправьте файл .jsonl или .csv со столбцами `question_text`, `option1`–`option4`, "
+                                    "`correct_option` и необязательными `question_id`, `image_path`, `hint`, `description`. "
+                                    "В подписи к файлу можно указать квиз: `slug Название` — новые вопросы попадут в него, "
+                                    "а если квиза с таким slug нет, он будет создан",
+        "import_unsupported": "⚠️ Поддерживаются файлы .jsonl и .csv",
+        "invalid_quiz_slug": "⚠️ slug квиза — от 1 до 32 символов: латиница, цифры, «_» и «-»",
+        "import_done": "📥 Импорт вопросов завершён\n\n{}",
+        "broadcast_instruction": "📣 **Рассылка:**\n\n"
+                                 "Отправьте текст сообщения — он уйдёт всем пользователям бота. "
+                                 "Рассылка идёт в фоне и не мешает прохождению квиза.",
+        "broadcast_started": "📣 Рассылка {} запущена. Получателей: {}",
+        "broadcast_cancelling": "⏹ Рассылка будет остановлена после текущей пачки",
+        "broadcast_not_running": "Рассылка уже завершена",
+        "broadcast_finished": "📣 Рассылка {} {}\n\n"
+                              "Отправлено: {}, ошибок: {}, удалено недоступных пользователей: {}",
+        "broadcast_statuses": {"done": "завершена", "cancelled": "остановлена"}
+    }
+}
+
+def format_time(seconds: int) -> str:
+    minutes = seconds // 60
+    seconds = seconds % 60
+    return f"{minutes} мин {seconds} сек"
+
+def format_page(title: str, page, total: int, page_size: int) -> str:
+    pages = max(1, -(-total // page_size))
+    return title + messages["admin"]["page"].format(min(page.number + 1, pages), pages, total)
+
+def format_top(top) -> str:
+    text = messages["admin"]["top_users"]
+    for place, data in top.items():
+        text += f"{place}. {data['Name_user']} — {data['total_time']} сек\n"
+    return text
+
+def format_tops(tops) -> str:
+    """
+    Топ по каждому квизу. Если квиз один, заголовок квиза не выводится.
+
+    :param tops: Пары (квиз, топ квиза).
+    """
+    if len(tops) == 1:
+        return format_top(tops[0][1])
+    text = messages["admin"]["top_users"]
+    for quiz, top in tops:
+        text += f"🧩 {quiz.title}\n"
+        for place, data in top.items():
+            text += f"{place}. {data['Name_user']} — {data['total_time']} сек\n"
+        text += "\n"
+    return text
+
+def format_broadcast(broadcast) -> str:
+    statuses = messages["admin"]["broadcast_statuses"]
+    return messages["admin"]["broadcast_finished"].format(
+        broadcast.broadcast_id, statuses.get(broadcast.status, broadcast.status),
+        broadcast.sent, broadcast.failed, broadcast.pruned
+    )
+
+def quiz_header(quiz, quizzes_count: int) -> str:
+    """
+    Заголовок с названием квиза для ответов /stats и /get_prize. Пока квиз один, не нужен.
+    """
+    return messages["quiz_title"].format(quiz.title) if quizzes_count > 1 else ""
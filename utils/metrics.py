@@ -0,0 +1,390 @@
+import bisect
+import contextvars
+import functools
+import inspect
+import logging
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from utils.config import METRICS
+
+# Границы корзин гистограмм задержки, в секундах
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Границы корзин для количества запросов к базе на одно обновление
+COUNT_BUCKETS = (0, 1, 2, 3, 4, 6, 8, 12, 16, 24, 32)
+
+# Описания метрик: имя -> (тип, описание)
+DESCRIPTIONS = {
+    "bot_handler_seconds": ("histogram", "Время обработки обновления обработчиком"),
+    "bot_handler_errors_total": ("counter", "Исключения в обработчиках"),
+    "bot_db_call_seconds": ("histogram", "Время вызова метода хранилища"),
+    "bot_db_calls_per_update": ("histogram", "Вызовы методов хранилища на одно обновление"),
+    "bot_sql_queries_per_update": ("histogram", "SQL-запросы на одно обновление (только SQLite)"),
+    "bot_telegram_request_seconds": ("histogram", "Время запроса к Telegram API"),
+    "bot_telegram_requests_total": ("counter", "Запросы к Telegram API по методу и результату"),
+    "bot_queue_depth": ("gauge", "Задачи в очередях бота"),
+    "bot_log_dropped_total": ("counter", "Записи лога, отброшенные из-за переполнения очереди"),
+    "bot_startup_seconds": ("gauge", "Время от начала запуска до конца этапа"),
+}
+
+# Метка набора значений: кортеж пар (имя метки, значение)
+Labels = Tuple[Tuple[str, str], ...]
+
+# Счётчики текущего обновления: [вызовы хранилища, SQL-запросы]
+_update: "contextvars.ContextVar[Optional[List[int]]]" = contextvars.ContextVar("metrics_update", default=None)
+
+_lock = threading.Lock()
+_histograms: Dict[Tuple[str, Labels], "Histogram"] = {}
+_counters: Dict[Tuple[str, Labels], "Counter"] = {}
+_api_metrics: Dict[Tuple[str, str], Tuple["Histogram", "Counter"]] = {}
+_gauges: Dict[Tuple[str, Labels], Callable[[], float]] = {}
+
+
+class Histogram:
+    """
+    Гистограмма с фиксированными корзинами, как в Prometheus.
+    """
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect.bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    def snapshot(self) -> Tuple[List[int], float]:
+        """
+        :return: Копия количества значений по корзинам (последняя — выше всех границ) и их сумма.
+        """
+        with self._lock:
+            return list(self.counts), self.sum
+
+
+class Counter:
+    """
+    Монотонно растущий счётчик.
+    """
+
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1):
+        with self._lock:
+            self.value += amount
+
+
+def _labels(labels: Dict[str, Any]) -> Labels:
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+def histogram(name: str, bounds: Tuple[float, ...] = LATENCY_BUCKETS, **labels) -> Histogram:
+    """
+    Возвращает гистограмму с заданными метками, создавая её при первом обращении.
+    """
+    key = (name, _labels(labels))
+    found = _histograms.get(key)
+    if found is None:
+        with _lock:
+            found = _histograms.setdefault(key, Histogram(bounds))
+    return found
+
+def counter(name: str, **labels) -> Counter:
+    """
+    Возвращает счётчик с заданными метками, создавая его при первом обращении.
+    """
+    key = (name, _labels(labels))
+    found = _counters.get(key)
+    if found is None:
+        with _lock:
+            found = _counters.setdefault(key, Counter())
+    return found
+
+def inc(name: str, amount: float = 1, **labels):
+    """
+    Увеличивает счётчик с заданными метками.
+    """
+    if METRICS:
+        counter(name, **labels).inc(amount)
+
+def register_gauge(name: str, func: Callable[[], float], **labels):
+    """
+    Регистрирует показатель, значение которого вычисляется при каждом чтении метрик.
+
+    :param func: Функция без аргументов, например queue_depth очереди.
+    """
+    with _lock:
+        _gauges[(name, _labels(labels))] = func
+
+def count_query(_statement: str = None):
+    """
+    Учитывает SQL-запрос текущего обновления. Подключается через sqlite3 set_trace_callback.
+    """
+    current = _update.get()
+    if current is not None:
+        current[1] += 1
+
+def record_api(method: str, seconds: float, error: Optional[Exception] = None):
+    """
+    Учитывает запрос к Telegram API.
+
+    :param method: Имя метода API.
+    :param seconds: Время запроса.
+    :param error: Исключение, если запрос не удался. Результат — код ошибки Telegram или имя исключения.
+    """
+    if not METRICS:
+        return
+    if error is None:
+        result = "ok"
+    else:
+        result = str(getattr(error, "error_code", None) or type(error).__name__)
+    found = _api_metrics.get((method, result))
+    if found is None:
+        found = _api_metrics.setdefault((method, result), (
+            histogram("bot_telegram_request_seconds", method=method),
+            counter("bot_telegram_requests_total", method=method, result=result),
+        ))
+    found[0].observe(seconds)
+    found[1].inc()
+
+def instrument_handler(func: Callable) -> Callable:
+    """
+    Оборачивает обработчик: время обработки, исключения, вызовы хранилища и SQL-запросы на обновление.
+    Работает и с обычными функциями, и с корутинами.
+    """
+    if not METRICS or getattr(func, "instrumented", False):
+        return func
+
+    name = func.__name__
+    seconds = histogram("bot_handler_seconds", handler=name)
+    db_calls = histogram("bot_db_calls_per_update", COUNT_BUCKETS, handler=name)
+    queries = histogram("bot_sql_queries_per_update", COUNT_BUCKETS, handler=name)
+
+    def finish(started: float, counts: List[int], token: contextvars.Token):
+        seconds.observe(time.perf_counter() - started)
+        _update.reset(token)
+        db_calls.observe(counts[0])
+        queries.observe(counts[1])
+
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            counts = [0, 0]
+            token = _update.set(counts)
+            started = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            except Exception:
+                inc("bot_handler_errors_total", handler=name)
+                raise
+            finally:
+                finish(started, counts, token)
+    else:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            counts = [0, 0]
+            token = _update.set(counts)
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            except Exception:
+                inc("bot_handler_errors_total", handler=name)
+                raise
+            finally:
+                finish(started, counts, token)
+
+    wrapper.instrumented = True
+    return wrapper
+
+def instrument_bot(bot):
+    """
+    Оборачивает все зарегистрированные обработчики бота (TeleBot или AsyncTeleBot).
+    Вызывается после объявления обработчиков.
+    """
+    for attr, handlers in vars(bot).items():
+        if attr.endswith("_handlers") and isinstance(handlers, list):
+            for handler in handlers:
+                if isinstance(handler, dict) and "function" in handler:
+                    handler["function"] = instrument_handler(handler["function"])
+
+def instrument_storage(storage):
+    """
+    Оборачивает методы хранилища: время каждого вызова и количество вызовов на обновление.
+    """
+    if not METRICS:
+        return
+    from utils.storage import Storage
+
+    for name, member in vars(Storage).items():
+        if name.startswith("_") or name in ("open", "close", "queue_depth") or not callable(member):
+            continue
+        setattr(storage, name, _timed_call(name, getattr(storage, name)))
+
+def _timed_call(name: str, method: Callable) -> Callable:
+    seconds = histogram("bot_db_call_seconds", method=name)
+
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        current = _update.get()
+        if current is not None:
+            current[0] += 1
+        started = time.perf_counter()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            seconds.observe(time.perf_counter() - started)
+    return wrapper
+
+def _format_labels(labels: Labels, extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+    pairs = labels + extra
+    if not pairs:
+        return ""
+    escaped = (value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+def render() -> str:
+    """
+    Возвращает все метрики в текстовом формате Prometheus.
+    """
+    with _lock:
+        histograms = list(_histograms.items())
+        counters = list(_counters.items())
+        gauges = list(_gauges.items())
+
+    lines_by_name: Dict[str, List[str]] = {}
+    for (name, labels), hist in histograms:
+        counts, total = hist.snapshot()
+        lines = lines_by_name.setdefault(name, [])
+        cumulative = 0
+        for bound, count in zip(hist.bounds + (float("inf"),), counts):
+            cumulative += count
+            le = "+Inf" if bound == float("inf") else _format_value(bound)
+            lines.append(f"{name}_bucket{_format_labels(labels, (('le', le),))} {cumulative}")
+        lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(total)}")
+        lines.append(f"{name}_count{_format_labels(labels)} {cumulative}")
+    for (name, labels), count in counters:
+        lines_by_name.setdefault(name, []).append(f"{name}{_format_labels(labels)} {_format_value(count.value)}")
+    for (name, labels), func in gauges:
+        try:
+            value = func()
+        except Exception as e:
+            logging.error(f"Ошибка при чтении метрики {name}: {e}")
+            continue
+        lines_by_name.setdefault(name, []).append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+
+    output = []
+    for name in sorted(lines_by_name):
+        kind, description = DESCRIPTIONS.get(name, ("untyped", name))
+        output.append(f"# HELP {name} {description}")
+        output.append(f"# TYPE {name} {kind}")
+        output.extend(lines_by_name[name])
+    return "\n".join(output) + "\n"
+
+def reset():
+    """
+    Обнуляет собранные значения. Зарегистрированные показатели очередей остаются.
+    """
+    with _lock:
+        for hist in _histograms.values():
+            with hist._lock:
+                hist.counts = [0] * len(hist.counts)
+                hist.sum = 0.0
+        for count in _counters.values():
+            with count._lock:
+                count.value = 0
+
+
+class MetricsExporter:
+    """
+    Отдаёт метрики по HTTP (GET /metrics) и/или периодически записывает их в файл.
+
+    Файл перезаписывается атомарно, поэтому его можно читать сборщиком textfile
+    node_exporter или просто смотреть глазами.
+    """
+
+    def __init__(self, port: int = 0, host: str = "0.0.0.0", path: Optional[str] = None, interval: float = 60):
+        """
+        :param port: Порт HTTP-сервера. 0 — сервер не запускается.
+        :param host: Адрес HTTP-сервера.
+        :param path: Файл для периодической записи. None — запись отключена.
+        :param interval: Период записи файла в секундах.
+        """
+        self.port = port
+        self.host = host
+        self.path = path
+        self.interval = interval
+        self._server: Optional[ThreadingHTTPServer] = None
+        self._stopped = threading.Event()
+        self._threads: List[threading.Thread] = []
+
+    def start(self):
+        if self.port:
+            self._server = ThreadingHTTPServer((self.host, self.port), _MetricsHandler)
+            self._server.daemon_threads = True
+            self._threads.append(threading.Thread(target=self._server.serve_forever, name="metrics-server", daemon=True))
+        if self.path:
+            self._threads.append(threading.Thread(target=self._dump_loop, name="metrics-dump", daemon=True))
+        for thread in self._threads:
+            thread.start()
+
+    def dump(self):
+        """
+        Записывает текущие метрики в файл.
+        """
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(render())
+        os.replace(tmp_path, self.path)
+
+    def _dump_loop(self):
+        while not self._stopped.wait(self.interval):
+            try:
+                self.dump()
+            except Exception as e:
+                logging.error(f"Ошибка при записи метрик в {self.path}: {e}")
+
+    def stop(self):
+        """
+        Останавливает сервер и записывает метрики в файл в последний раз.
+        """
+        self._stopped.set()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+        for thread in self._threads:
+            thread.join()
+        self._threads.clear()
+        if self.path:
+            try:
+                self.dump()
+            except Exception as e:
+                logging.error(f"Ошибка при записи метрик в {self.path}: {e}")
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path != "/metrics":
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        body = render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logging.debug("metrics: " + format % args)
@@ -0,0 +1,238 @@
+import secrets
+from dataclasses import dataclass
+from functools import lru_cache
+from itertools import permutations
+from typing import Collection, Optional, Tuple
+
+from utils.quizzes import Quiz
+
+# Все порядки четырёх вариантов ответа: номер порядка -> номера вариантов (с нуля) в порядке показа
+OPTION_ORDERS: Tuple[Tuple[int, ...], ...] = tuple(permutations(range(4)))
+
+_MASK = (1 << 64) - 1
+
+# Раунды сети Фейстеля, которая перемешивает вопросы. Функция раунда — splitmix64
+# от половины блока с ключом раунда
+FEISTEL_ROUNDS = 4
+
+
+def _mix(value: int) -> int:
+    """
+    Перемешивает биты 64-битного числа (splitmix64), чтобы соседние seed и ID вопросов
+    давали несвязанные перестановки.
+    """
+    value = (value + 0x9E3779B97F4A7C15) & _MASK
+    value = ((value ^ (value >> 30)) * 0xBF58476D1CE4E5B9) & _MASK
+    value = ((value ^ (value >> 27)) * 0x94D049BB133111EB) & _MASK
+    return value ^ (value >> 31)
+
+@lru_cache(maxsize=4096)
+def _feistel(seed: int, n: int) -> Tuple[int, int, Tuple[int, ...]]:
+    """
+    :return: Ширина половины блока в битах, её маска и ключи раундов для перестановки n позиций.
+        Кэшируется: в прохождении все вопросы считаются с одними и теми же seed и n.
+    """
+    # Блок — наименьшее чётное число бит, вмещающее n: он меньше 4n, поэтому
+    # обход цикла до позиции меньше n в среднем занимает меньше четырёх шагов
+    half = max(1, ((n - 1).bit_length() + 1) // 2)
+    keys = tuple(_mix(_mix(seed) ^ round_) for round_ in range(FEISTEL_ROUNDS))
+    return half, (1 << half) - 1, keys
+
+def _permute(seed: int, n: int, value: int) -> int:
+    """
+    :return: Образ value (0 <= value < n) в перестановке, заданной seed.
+    """
+    half, mask, keys = _feistel(seed, n)
+    while True:
+        left, right = value >> half, value & mask
+        for key in keys:
+            left, right = right, left ^ (_mix(key ^ right) & mask)
+        value = (left << half) | right
+        # Обход цикла: значения за пределами [0, n) пропускаются, поэтому перестановка блока
+        # сужается до перестановки [0, n)
+        if value < n:
+            return value
+
+def _unpermute(seed: int, n: int, value: int) -> int:
+    """
+    :return: Прообраз value в перестановке _permute.
+    """
+    half, mask, keys = _feistel(seed, n)
+    while True:
+        left, right = value >> half, value & mask
+        for key in reversed(keys):
+            left, right = right ^ (_mix(key ^ left) & mask), left
+        value = (left << half) | right
+        if value < n:
+            return value
+
+def new_seed() -> int:
+    """
+    :return: Случайный seed порядка вопросов для нового прохождения.
+    """
+    return secrets.randbits(48)
+
+
+@dataclass(frozen=True)
+class QuestionOrder:
+    """
+    Порядок вопросов и вариантов ответа в одном прохождении квиза.
+
+    Хранится только seed: вопрос с номером i в прохождении — это вопрос квиза на позиции,
+    в которую i переводит сеть Фейстеля с ключами из seed, суженная обходом цикла до [0, n),
+    где n — число вопросов квиза. Перестановка обратима, поэтому номер текущего вопроса
+    в прохождении и следующий вопрос вычисляются за O(1) без списка вопросов пользователя
+    и без строк в базе, а по нескольким вопросам прохождения остальные не угадываются.
+
+    Вместе с seed хранятся число вопросов и контрольная сумма квиза на момент начала прохождения:
+    перестановка всегда строится для исходного n, поэтому правка квиза не подменяет её другой.
+    Если вопросы квиза изменились, удалённые позиции пропускаются обходом вперёд,
+    добавленные вопросы идут после исходных, а уже пройденные вопросы (их позиции сдвигаются
+    при удалении) пропускаются по списку пройденных, который хранилище читает только в этом случае.
+    """
+    seed: int
+    shuffle_questions: bool = True
+    shuffle_options: bool = True
+    size: Optional[int] = None  # Вопросов в квизе в начале прохождения (None — текущее число)
+    version: Optional[int] = None  # Контрольная сумма квиза в начале прохождения (Quiz.version)
+
+    @classmethod
+    def new(cls, quiz: Optional[Quiz], shuffle_questions: bool = True, shuffle_options: bool = True) -> "QuestionOrder":
+        """
+        :return: Порядок нового прохождения квиза со случайным seed.
+        """
+        if quiz is None:
+            return cls(new_seed(), shuffle_questions, shuffle_options)
+        return cls(new_seed(), shuffle_questions, shuffle_options, len(quiz.question_ids), quiz.version)
+
+    def changed(self, quiz: Quiz) -> bool:
+        """
+        :return: True, если вопросы квиза изменились с начала прохождения. Тогда next_question_id
+            нужен список пройденных вопросов.
+        """
+        return self.size is not None and (self.size != len(quiz.question_ids) or self.version != quiz.version)
+
+    def position(self, index: int, n: int) -> int:
+        """
+        :param n: Число вопросов, для которого построена перестановка.
+        :return: Позиция в квизе вопроса с номером index в прохождении.
+        """
+        if not self.shuffle_questions or index >= n:
+            # Вопросы, добавленные после начала прохождения, идут в конце в порядке квиза
+            return index
+        return _permute(self.seed, n, index)
+
+    def index(self, position: int, n: int) -> int:
+        """
+        :return: Номер в прохождении вопроса с позицией position в квизе.
+        """
+        if not self.shuffle_questions or position >= n:
+            return position
+        return _unpermute(self.seed, n, position)
+
+    def _size(self, quiz: Quiz) -> int:
+        return self.size if self.size is not None else len(quiz.question_ids)
+
+    def _question_at(self, quiz: Quiz, index: int, size: int) -> Optional[int]:
+        position = self.position(index, size)
+        return quiz.question_ids[position] if position < len(quiz.question_ids) else None
+
+    def first_question_id(self, quiz: Quiz) -> Optional[int]:
+        size = self._size(quiz)
+        for index in range(max(size, len(quiz.question_ids))):
+            question_id = self._question_at(quiz, index, size)
+            if question_id is not None:
+                return question_id
+        return None
+
+    def last_question_id(self, quiz: Quiz) -> Optional[int]:
+        size = self._size(quiz)
+        for index in reversed(range(max(size, len(quiz.question_ids)))):
+            question_id = self._question_at(quiz, index, size)
+            if question_id is not None:
+                return question_id
+        return None
+
+    def next_question_id(self, quiz: Quiz, question_id: int, completed: Collection[int] = ()) -> Optional[int]:
+        """
+        :param completed: Пройденные вопросы квиза. Нужны, только если квиз изменился (changed).
+        :return: ID вопроса, который в этом прохождении идёт после указанного,
+            или None, если вопрос последний или не из этого квиза.
+        """
+        position = quiz.positions.get(question_id)
+        if position is None:
+            return None
+        size = self._size(quiz)
+        if not self.changed(quiz):
+            index = self.index(position, size) + 1
+            return quiz.question_ids[self.position(index, size)] if index < size else None
+
+        # Квиз изменился: позиции удалённых вопросов пропускаются, как и уже пройденные вопросы
+        skip = set(completed)
+        skip.add(question_id)
+        for index in range(self.index(position, size) + 1, max(size, len(quiz.question_ids))):
+            next_id = self._question_at(quiz, index, size)
+            if next_id is not None and next_id not in skip:
+                return next_id
+        # Вопросы, которые при удалении сдвинулись на уже пройденные номера, задаются в конце
+        return next((next_id for next_id in quiz.question_ids if next_id not in skip), None)
+
+    def number(self, quiz: Quiz, question_id: int) -> Optional[int]:
+        """
+        :return: Номер вопроса в прохождении (с единицы), или None, если вопрос не из этого квиза.
+        """
+        position = quiz.positions.get(question_id)
+        if position is None:
+            return None
+        # После правки квиза вопросы, заданные в конце, могут иметь номер больше числа вопросов
+        return min(self.index(position, self._size(quiz)) + 1, len(quiz.question_ids))
+
+    def option_order(self, question_id: int) -> Optional[Tuple[int, ...]]:
+        """
+        :return: Номера вариантов ответа (с нуля) в порядке показа, или None, если варианты не перемешиваются.
+        """
+        if not self.shuffle_options:
+            return None
+        return OPTION_ORDERS[_mix(_mix(self.seed) ^ question_id) % len(OPTION_ORDERS)]
+
+
+def first_question_id(quiz: Quiz, order: Optional[QuestionOrder]) -> Optional[int]:
+    return order.first_question_id(quiz) if order is not None else quiz.first_question_id
+
+def last_question_id(quiz: Quiz, order: Optional[QuestionOrder]) -> Optional[int]:
+    return order.last_question_id(quiz) if order is not None else quiz.last_question_id
+
+def next_question_id(quiz: Quiz, question_id: int, order: Optional[QuestionOrder],
+                     completed: Collection[int] = ()) -> Optional[int]:
+    """
+    :param completed: Пройденные вопросы квиза, если order.changed(quiz).
+    :return: Следующий вопрос в порядке прохождения (без order — в порядке квиза).
+    """
+    if order is None:
+        return quiz.next_question_id(question_id)
+    return order.next_question_id(quiz, question_id, completed)
+
+def question_number(quiz: Quiz, question_id: int, order: Optional[QuestionOrder]) -> Optional[int]:
+    """
+    :return: Номер вопроса в прохождении (с единицы) для подписи «Вопрос 3 из 25» (без order — в порядке квиза).
+    """
+    if order is not None:
+        return order.number(quiz, question_id)
+    position = quiz.positions.get(question_id)
+    return position + 1 if position is not None else None
+
+def order_to_session(order: QuestionOrder) -> list:
+    """
+    :return: Порядок в виде, который хранится в сессии квиза (JSON):
+        [seed, вопросы, варианты, число вопросов, контрольная сумма квиза].
+    """
+    return [order.seed, order.shuffle_questions, order.shuffle_options, order.size, order.version]
+
+def order_from_session(session: Optional[dict]) -> Optional[QuestionOrder]:
+    """
+    :return: Порядок прохождения из сессии квиза, или None, если вопросы идут в порядке квиза
+        (перемешивание выключено или сессия начата до его появления). В сессиях, начатых
+        до сохранения числа вопросов, хранятся только первые три значения.
+    """
+    value = session.get("order") if session else None
+    return QuestionOrder(*value) if value else None
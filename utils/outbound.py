@@ -0,0 +1,292 @@
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+from utils import metrics
+
+# Приоритеты исходящих запросов
+HIGH = 0  # answer_callback_query: Telegram ждёт ответа на нажатие кнопки ограниченное время
+NORMAL = 1
+LOW = 2  # Фоновые запросы (рассылка): занимают только свободную ёмкость глобального лимита
+
+# Методы, которые отправляют или меняют сообщения в чате и подпадают под лимит чата
+CHAT_METHODS = {
+    "send_message", "send_photo", "send_document", "send_media_group",
+    "edit_message_text", "edit_message_caption", "edit_message_reply_markup",
+}
+
+# Методы с приоритетом и сроком, после которого запрос бессмыслен (в секундах)
+PRIORITY_METHODS = {"answer_callback_query": (HIGH, 10.0)}
+
+# Методы, которые обёртка отправляет через планировщик
+LIMITED_METHODS = CHAT_METHODS | set(PRIORITY_METHODS) | {"delete_message"}
+
+
+def _file_positions(args: tuple, kwargs: dict) -> list:
+    """
+    :return: Файлы среди аргументов запроса (например, фото для send_photo) и их текущие позиции.
+    """
+    positions = []
+    for value in (*args, *kwargs.values()):
+        seekable = getattr(value, "seekable", None)
+        if seekable is not None and callable(seekable) and seekable():
+            positions.append((value, value.tell()))
+    return positions
+
+def _rewind(positions: list):
+    # Неудачная попытка уже прочитала файл до конца: повтор отправил бы пустой файл
+    for file, position in positions:
+        file.seek(position)
+
+
+def retry_after(error: Exception) -> Optional[float]:
+    """
+    Возвращает паузу из ответа 429 Too Many Requests.
+
+    :param error: Исключение telebot (ApiTelegramException).
+    :return: Пауза в секундах, или None, если это не ошибка лимита.
+    """
+    if getattr(error, "error_code", None) != 429:
+        return None
+    parameters = (getattr(error, "result_json", None) or {}).get("parameters") or {}
+    return float(parameters.get("retry_after", 1))
+
+
+class OutboundScheduler:
+    """
+    Планировщик исходящих запросов к Telegram API.
+
+    Следит за глобальным лимитом бота и лимитом каждого чата по алгоритму GCRA
+    (эквивалент корзины токенов): для каждого запроса вычисляется момент, когда его можно
+    отправить, и вызывающий ждёт до этого момента. Запросы с высоким приоритетом
+    не ждут в общей очереди, но расходуют её ёмкость, поэтому обычные запросы сдвигаются.
+    Фоновые запросы не пользуются запасом для всплесков и встают в очередь после уже
+    зарезервированных, а их темп дополнительно ограничен low_rate: запас остаётся обычным
+    запросам, и рассылка не задерживает ответы пользователям квиза.
+    Ответы 429 продлевают ожидание на retry_after, после чего запрос повторяется.
+    Запрос, который не успевает до своего срока (PRIORITY_METHODS), не отправляется:
+    он учитывается в метриках с результатом expired, а вызывающий получает None.
+    """
+
+    def __init__(self, global_rate: float = 30.0, global_burst: int = 30,
+                 chat_rate: float = 1.0, chat_burst: int = 3, max_retries: int = 3,
+                 low_rate: Optional[float] = None):
+        """
+        :param global_rate: Запросов в секунду на всего бота.
+        :param global_burst: Сколько запросов можно отправить разом сверх равномерного темпа.
+        :param chat_rate: Сообщений в секунду в один чат.
+        :param chat_burst: Сколько сообщений в чат можно отправить разом.
+        :param max_retries: Сколько раз повторять запрос после 429 или ошибки сервера.
+        :param low_rate: Фоновых запросов в секунду (по умолчанию — без отдельного ограничения).
+        """
+        self.global_interval = 1.0 / global_rate
+        self.global_burst = global_burst
+        self.chat_interval = 1.0 / chat_rate
+        self.chat_burst = chat_burst
+        self.max_retries = max_retries
+        self.low_interval = 1.0 / low_rate if low_rate else 0.0
+        self._global_tat = 0.0
+        self._low_tat = 0.0
+        self._chat_tat: Dict[Any, float] = {}
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+        self._reservations = 0
+        self.retries = 0
+        self.throttled = 0
+        self.dropped = 0
+
+    def reserve(self, method: str, chat_id: Any = None, priority: int = NORMAL) -> float:
+        """
+        Резервирует место для запроса.
+
+        :param method: Имя метода API (send_message, answer_callback_query, ...).
+        :param chat_id: ID чата для методов с лимитом чата.
+        :param priority: HIGH, NORMAL или LOW.
+        :return: Сколько секунд подождать перед отправкой.
+        """
+        now = time.monotonic()
+        with self._lock:
+            start = max(now, self._paused_until)
+            if priority == LOW:
+                start = max(start, self._global_tat, self._low_tat)
+                self._low_tat = start + self.low_interval
+            elif priority != HIGH:
+                start = max(start, self._global_tat - self.global_burst * self.global_interval)
+            if chat_id is not None and method in CHAT_METHODS:
+                chat_tat = self._chat_tat.get(chat_id, now)
+                start = max(start, chat_tat - self.chat_burst * self.chat_interval)
+                self._chat_tat[chat_id] = max(chat_tat, start) + self.chat_interval
+            self._global_tat = max(self._global_tat, start) + self.global_interval
+
+            self._reservations += 1
+            if self._reservations % 1024 == 0:
+                # Чаты, которые давно ничего не получали, больше не ограничены
+                self._chat_tat = {chat: tat for chat, tat in self._chat_tat.items() if tat > now}
+            return start - now
+
+    def penalize(self, chat_id: Any, delay: float):
+        """
+        Учитывает ответ 429: следующие запросы в чат (или все запросы, если чат неизвестен)
+        будут отправлены не раньше чем через delay секунд.
+        """
+        until = time.monotonic() + delay
+        with self._lock:
+            self.throttled += 1
+            if chat_id is None:
+                self._paused_until = max(self._paused_until, until)
+            else:
+                self._chat_tat[chat_id] = max(self._chat_tat.get(chat_id, 0.0), until + self.chat_interval)
+
+    def _plan(self, method: str, chat_id: Any, started: float, priority: Optional[int] = None) -> Optional[float]:
+        """
+        :return: Пауза перед отправкой, или None, если запрос не успевает до истечения срока
+            и отброшен: обработчик продолжает работу, как будто запрос выполнен.
+        """
+        default_priority, deadline = PRIORITY_METHODS.get(method, (NORMAL, None))
+        delay = self.reserve(method, chat_id, default_priority if priority is None else priority)
+        if deadline is not None and time.monotonic() + delay - started > deadline:
+            self.dropped += 1
+            metrics.inc("bot_telegram_requests_total", method=method, result="expired")
+            logging.warning(f"{method}: запрос отброшен, он не успевает до истечения срока {deadline} с")
+            return None
+        return delay
+
+    def _on_error(self, error: Exception, method: str, chat_id: Any, attempt: int) -> bool:
+        if attempt >= self.max_retries:
+            return False
+        delay = retry_after(error)
+        if delay is not None:
+            logging.warning(f"{method}: лимит Telegram, повтор через {delay} с")
+            self.penalize(chat_id if method in CHAT_METHODS else None, delay)
+        elif (getattr(error, "error_code", None) or 0) >= 500:
+            self.penalize(None, 0.5 * 2 ** attempt)
+        else:
+            return False
+        self.retries += 1
+        return True
+
+    def call(self, method: str, func: Callable, *args, chat_id: Any = None, priority: Optional[int] = None,
+             **kwargs) -> Any:
+        """
+        Выполняет синхронный запрос с учётом лимитов и повторами после 429.
+        Перед повтором файлы среди аргументов возвращаются к исходной позиции.
+
+        :param method: Имя метода API.
+        :param func: Метод TeleBot.
+        :param chat_id: ID чата для лимита чата.
+        :param priority: Приоритет запроса (по умолчанию — по методу).
+        :return: Результат запроса, или None, если запрос отброшен из-за истечения срока.
+        """
+        started = time.monotonic()
+        attempt = 0
+        files = _file_positions(args, kwargs)
+        while True:
+            delay = self._plan(method, chat_id, started, priority)
+            if delay is None:
+                return None
+            if delay > 0:
+                time.sleep(delay)
+            sent = time.perf_counter()
+            try:
+                result = func(*args, **kwargs)
+            except Exception as e:
+                metrics.record_api(method, time.perf_counter() - sent, e)
+                if not self._on_error(e, method, chat_id, attempt):
+                    raise
+                _rewind(files)
+                attempt += 1
+                continue
+            metrics.record_api(method, time.perf_counter() - sent)
+            return result
+
+    async def acall(self, method: str, func: Callable, *args, chat_id: Any = None, priority: Optional[int] = None,
+                    **kwargs) -> Any:
+        """
+        То же, что call, для методов AsyncTeleBot.
+        """
+        started = time.monotonic()
+        attempt = 0
+        files = _file_positions(args, kwargs)
+        while True:
+            delay = self._plan(method, chat_id, started, priority)
+            if delay is None:
+                return None
+            if delay > 0:
+                # asyncio импортируется только в асинхронном режиме: синхронный бот запускается быстрее
+                import asyncio
+                await asyncio.sleep(delay)
+            sent = time.perf_counter()
+            try:
+                result = await func(*args, **kwargs)
+            except Exception as e:
+                metrics.record_api(method, time.perf_counter() - sent, e)
+                if not self._on_error(e, method, chat_id, attempt):
+                    raise
+                _rewind(files)
+                attempt += 1
+                continue
+            metrics.record_api(method, time.perf_counter() - sent)
+            return result
+
+
+def _chat_id(method: str, args: tuple, kwargs: dict) -> Any:
+    if "chat_id" in kwargs:
+        return kwargs["chat_id"]
+    # У edit_* первым аргументом идёт текст, а chat_id передаётся по имени
+    if method.startswith("send_") or method == "delete_message":
+        return args[0] if args else None
+    return None
+
+
+class RateLimitedBot:
+    """
+    Обёртка над TeleBot, которая отправляет запросы через OutboundScheduler.
+    Остальные атрибуты бота доступны как есть.
+    """
+
+    def __init__(self, bot, scheduler: OutboundScheduler):
+        self._bot = bot
+        self.scheduler = scheduler
+
+    def __getattr__(self, name: str):
+        func = getattr(self._bot, name)
+        if name not in LIMITED_METHODS:
+            return func
+
+        def limited(*args, **kwargs):
+            return self.scheduler.call(name, func, *args, chat_id=_chat_id(name, args, kwargs), **kwargs)
+        return limited
+
+    def background(self, name: str) -> Callable:
+        """
+        Метод бота, запросы которого отправляются с приоритетом LOW (для рассылок).
+        """
+        func = getattr(self._bot, name)
+
+        def limited(*args, **kwargs):
+            return self.scheduler.call(name, func, *args, chat_id=_chat_id(name, args, kwargs), priority=LOW, **kwargs)
+        return limited
+
+
+class AsyncRateLimitedBot(RateLimitedBot):
+    """
+    Обёртка над AsyncTeleBot, которая отправляет запросы через OutboundScheduler.
+    """
+
+    def __getattr__(self, name: str):
+        func = getattr(self._bot, name)
+        if name not in LIMITED_METHODS:
+            return func
+
+        async def limited(*args, **kwargs):
+            return await self.scheduler.acall(name, func, *args, chat_id=_chat_id(name, args, kwargs), **kwargs)
+        return limited
+
+    def background(self, name: str) -> Callable:
+        func = getattr(self._bot, name)
+
+        async def limited(*args, **kwargs):
+            return await self.scheduler.acall(name, func, *args, chat_id=_chat_id(name, args, kwargs),
+                                              priority=LOW, **kwargs)
+        return limited
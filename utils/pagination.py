@@ -0,0 +1,33 @@
+from dataclasses import dataclass
+from typing import Any, List, Sequence
+
+
+@dataclass(frozen=True)
+class Page:
+    """
+    Страница списка, прочитанная по ключу (keyset-пагинация).
+
+    Номер страницы не вычисляется запросом, а передаётся в кнопках листания,
+    поэтому стоимость страницы не зависит от её номера и размера таблицы.
+    """
+    items: List[Any]
+    number: int  # Номер страницы с нуля
+    has_prev: bool
+    has_next: bool
+
+def make_page(rows: Sequence[Any], limit: int, number: int = 0, backward: bool = False) -> Page:
+    """
+    Собирает страницу из результата запроса с limit + 1 строками: лишняя строка
+    показывает, есть ли ещё страница в направлении листания.
+
+    :param rows: Строки по возрастанию ключа.
+    :param limit: Размер страницы.
+    :param number: Номер запрошенной страницы.
+    :param backward: Строки прочитаны перед курсором (листание назад).
+    """
+    rows = list(rows)
+    if backward:
+        has_prev = len(rows) > limit
+        # Если до начала списка строк не хватило, это первая страница
+        return Page(rows[-limit:], number if has_prev else 0, has_prev, True)
+    return Page(rows[:limit], number, number > 0, len(rows) > limit)
@@ -0,0 +1,117 @@
+import json
+import os
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Any, Mapping, Optional, Sequence, Tuple
+
+from utils.callbacks import NONCE_PLACEHOLDER, to_base36
+from utils.keyboards import question_keyboard
+
+# Картинка, которая отправляется, если у вопроса нет изображения или файла нет на диске
+IMAGE_NOT_FOUND = "imgs/photo_not_found.jpg"
+
+
+@dataclass(frozen=True)
+class QuestionPayload:
+    """
+    Готовое к отправке сообщение с вопросом.
+
+    reply_markup хранится уже сериализованным в JSON: telebot передаёт строку как есть,
+    поэтому при отправке клавиатура не собирается и не сериализуется заново.
+    Вместо nonce сессии в кнопках стоит заглушка, её заменяет reply_markup_for.
+    Строки клавиатуры (варианты ответа, затем подсказка) тоже хранятся в JSON, чтобы
+    клавиатура с перемешанными вариантами собиралась склейкой строк.
+    Номер вопроса в подписи зависит от прохождения, поэтому подпись собирает caption_for.
+    """
+    question_id: int
+    text: str
+    reply_markup: str
+    image_path: str
+    parse_mode: str = "Markdown"
+    rows: Tuple[str, ...] = ()
+
+    def caption_for(self, number: Optional[int] = None, total: Optional[int] = None) -> str:
+        """
+        :param number: Номер вопроса в прохождении (с единицы).
+        :param total: Число вопросов квиза.
+        :return: Подпись к картинке, например «❓ Вопрос 3 из 25: текст вопроса».
+        """
+        if number is None:
+            return f"❓ {self.text}"
+        return f"❓ Вопрос {number} из {total}: {self.text}"
+
+    def reply_markup_for(self, nonce: int, option_order: Optional[Sequence[int]] = None) -> str:
+        """
+        :param option_order: Номера вариантов (с нуля) в порядке показа. По умолчанию — порядок вопроса.
+            Кнопка по-прежнему передаёт исходный номер варианта, поэтому проверка ответа не меняется.
+        :return: Клавиатура с nonce сессии квиза в кнопках.
+        """
+        markup = self.reply_markup
+        if option_order is not None and len(option_order) == len(self.rows) - 1:
+            rows = [self.rows[index] for index in option_order]
+            rows.append(self.rows[-1])
+            markup = '{"inline_keyboard": [' + ", ".join(rows) + "]}"
+        return markup.replace(_NONCE_JSON, f'.{to_base36(nonce)}"')
+
+
+# Заглушка nonce в том виде, в котором она попадает в JSON клавиатуры: последний аргумент
+# callback_data. Обратная косая черта в тексте кнопки экранируется, поэтому текст с ней не совпадёт
+_NONCE_JSON = "." + json.dumps(NONCE_PLACEHOLDER)[1:]
+
+# Сообщения текущей версии каталога: (каталог, {ID вопроса: сообщение})
+_cache: Optional[Tuple[Mapping[int, Mapping[str, Any]], Mapping[int, QuestionPayload]]] = None
+
+def build_question_payload(question_id: int, question: Mapping[str, Any]) -> QuestionPayload:
+    """
+    Собирает сообщение с вопросом: текст, клавиатуру с вариантами ответа и путь к картинке.
+    """
+    image_path = question.get("image_path")
+    if not image_path or not os.path.exists(image_path):
+        image_path = IMAGE_NOT_FOUND
+    reply_markup = question_keyboard(question_id, question["options"]).to_json()
+    return QuestionPayload(
+        question_id=question_id,
+        text=question["question_text"],
+        reply_markup=reply_markup,
+        image_path=os.path.normpath(image_path),
+        rows=tuple(json.dumps(row) for row in json.loads(reply_markup)["inline_keyboard"]),
+    )
+
+def build_payloads(catalog: Mapping[int, Mapping[str, Any]]) -> Mapping[int, QuestionPayload]:
+    """
+    Собирает сообщения для всех вопросов каталога.
+    """
+    return MappingProxyType({
+        question_id: build_question_payload(question_id, question) for question_id, question in catalog.items()
+    })
+
+def prewarm(catalog: Mapping[int, Mapping[str, Any]]) -> Mapping[int, QuestionPayload]:
+    """
+    Собирает сообщения для каталога заранее, чтобы первый отправленный вопрос их уже не собирал.
+    """
+    global _cache
+    cache = _cache
+    if cache is None or cache[0] is not catalog:
+        cache = (catalog, build_payloads(catalog))
+        _cache = cache
+    return cache[1]
+
+def question_payload(catalog: Mapping[int, Mapping[str, Any]], question_id: int,
+                     question: Optional[Mapping[str, Any]] = None) -> Optional[QuestionPayload]:
+    """
+    Возвращает готовое сообщение с вопросом.
+
+    Каталог неизменяем и заменяется целиком после каждой правки вопросов администратором,
+    поэтому сообщения собираются один раз на версию каталога и пересобираются, только когда
+    передан другой объект каталога.
+
+    :param catalog: Текущий каталог вопросов (get_question_catalog).
+    :param question_id: ID вопроса.
+    :param question: Вопрос, если он уже получен. Если это вопрос не из текущего каталога
+        (например, прочитанный до правки), сообщение собирается для него отдельно.
+    :return: Сообщение, или None, если вопроса нет.
+    """
+    payloads = prewarm(catalog)
+    if question is not None and catalog.get(question_id) is not question:
+        return build_question_payload(question_id, question)
+    return payloads.get(question_id)
@@ -0,0 +1,312 @@
+"""
+Импорт и экспорт вопросов в JSONL и CSV.
+
+Файл читается построчно, каждая строка проверяется (обязательные поля, номер правильного
+варианта, длина текстов с учётом лимитов Telegram, существование картинки), а корректные
+строки записываются пачками: одна транзакция на пачку. Вопрос с question_id, который уже
+есть в базе, обновляется, без question_id — добавляется. В памяти держится только текущая
+пачка и множество уже встреченных ID, поэтому размер каталога не ограничен памятью.
+Новые вопросы встают в конец выбранного квиза (по умолчанию — основного), вопросы с уже
+известным question_id остаются в своём квизе. Экспорт читает вопросы страницами по первичному ключу.
+
+Столбцы CSV и ключи JSONL: question_id (необязательно), question_text, option1..option4,
+correct_option (1–4), image_path, hint, description (необязательно).
+
+Запуск:
+    python -m utils.question_io import questions.jsonl [--dry-run] [--batch-size 500] [--quiz slug [--quiz-title Название]]
+    python -m utils.question_io export questions.csv
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Any, Dict, IO, Iterator, List, Mapping, Optional, Set, Tuple, Union
+
+from utils.database import QUESTION_COLUMNS
+from utils.messages import messages
+from utils.quizzes import DEFAULT_QUIZ_ID, SLUG_PATTERN, Quiz
+
+FIELDS = ("question_id",) + QUESTION_COLUMNS
+REQUIRED = ("question_text", "option1", "option2", "option3", "option4", "correct_option")
+OPTIONAL = ("image_path", "hint", "description")
+
+# Форматы по расширению файла
+FORMATS = {".jsonl": "jsonl", ".ndjson": "jsonl", ".csv": "csv"}
+
+# Подпись к фото — не больше 1024 символов, из них часть занимает «❓ Вопрос N: »
+MAX_QUESTION_LENGTH = 1000
+# Подсказка и описание показываются во всплывающем окне answer_callback_query — не больше 200 символов
+MAX_ALERT_LENGTH = 200
+
+# Сколько ошибок со строками хранить в отчёте; остальные только считаются
+MAX_REPORTED_ERRORS = 50
+
+
+@dataclass
+class ImportReport:
+    """
+    Итог импорта: сколько строк прочитано и записано, ошибки по строкам.
+    """
+    rows: int = 0
+    written: int = 0
+    failed: int = 0
+    errors: List[Tuple[int, str]] = field(default_factory=list)  # (номер строки, ошибка), первые MAX_REPORTED_ERRORS
+    error_counts: Counter = field(default_factory=Counter)  # ошибка -> количество строк
+
+    def add_error(self, line: int, error: str):
+        self.error_counts[error] += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((line, error))
+
+    def summary(self) -> str:
+        """
+        Текст отчёта: итоги, частые ошибки и первые строки с ошибками.
+        """
+        lines = [f"Строк: {self.rows}, записано: {self.written}, с ошибками: {self.failed}"]
+        if self.error_counts:
+            lines.append("Ошибки:")
+            lines.extend(f"  {error} — {count}" for error, count in self.error_counts.most_common(10))
+            lines.append("Строки:")
+            lines.extend(f"  {line}: {error}" for line, error in self.errors)
+            hidden = self.failed - len({line for line, _ in self.errors})
+            if hidden > 0:
+                lines.append(f"  …и ещё {hidden}")
+        return "\n".join(lines)
+
+
+def detect_format(path: str) -> Optional[str]:
+    """
+    :return: jsonl или csv по расширению файла, или None, если формат не поддерживается.
+    """
+    return FORMATS.get(os.path.splitext(path)[1].lower())
+
+def read_rows(stream: IO[str], fmt: str) -> Iterator[Tuple[int, Union[Dict[str, Any], str]]]:
+    """
+    Читает строки файла по одной.
+
+    :return: Пары (номер строки, словарь полей) или (номер строки, ошибка разбора).
+    :raises ValueError: В заголовке CSV нет обязательных столбцов.
+    """
+    if fmt == "jsonl":
+        for line_number, line in enumerate(stream, 1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as e:
+                yield line_number, f"некорректный JSON: {e.msg}"
+                continue
+            yield line_number, row if isinstance(row, dict) else "строка должна быть объектом JSON"
+        return
+
+    reader = csv.DictReader(stream)
+    missing = [column for column in REQUIRED if column not in (reader.fieldnames or ())]
+    if missing:
+        raise ValueError(f"В заголовке CSV нет столбцов: {', '.join(missing)}")
+    for row in reader:
+        # Номер строки, на которой запись закончилась (значения в кавычках бывают многострочными)
+        if None in row:
+            yield reader.line_num, "лишние значения в строке"
+        else:
+            yield reader.line_num, row
+
+def _text(row: Mapping[str, Any], column: str) -> Optional[str]:
+    value = row.get(column)
+    if value is None:
+        return None
+    value = str(value).strip()
+    return value or None
+
+def validate_row(row: Mapping[str, Any], seen_ids: Set[int]) -> Union[Dict[str, Any], str]:
+    """
+    Проверяет строку и приводит её к виду, который принимает upsert_questions.
+
+    :param seen_ids: ID вопросов из предыдущих строк файла; ID строки добавляется в него.
+    :return: Вопрос, или текст ошибки.
+    """
+    unknown = set(row) - set(FIELDS)
+    if unknown:
+        return f"неизвестные поля: {', '.join(sorted(map(str, unknown)))}"
+
+    question: Dict[str, Any] = {column: _text(row, column) for column in QUESTION_COLUMNS}
+    for column in REQUIRED:
+        if question[column] is None:
+            return f"не заполнено поле {column}"
+
+    try:
+        correct_option = int(question["correct_option"])
+    except ValueError:
+        correct_option = 0
+    if not 1 <= correct_option <= 4:
+        return "correct_option должен быть от 1 до 4"
+    question["correct_option"] = correct_option
+
+    if len(question["question_text"]) > MAX_QUESTION_LENGTH:
+        return f"question_text длиннее {MAX_QUESTION_LENGTH} символов"
+    for column, template in (("hint", messages["hint"]), ("description", messages["correct_alert"])):
+        if question[column] is not None and len(template.format(question[column])) > MAX_ALERT_LENGTH:
+            return f"{column} не помещается во всплывающее окно ({MAX_ALERT_LENGTH} символов)"
+
+    image_path = question["image_path"]
+    if image_path is not None and not os.path.isfile(image_path):
+        return f"картинка не найдена: {image_path}"
+
+    question_id = _text(row, "question_id")
+    if question_id is not None:
+        try:
+            question_id = int(question_id)
+        except ValueError:
+            question_id = 0
+        if question_id <= 0:
+            return "question_id должен быть положительным целым"
+        if question_id in seen_ids:
+            return f"question_id {question_id} повторяется в файле"
+        seen_ids.add(question_id)
+    question["question_id"] = question_id
+    return question
+
+def get_or_create_quiz(storage, slug: str, title: Optional[str] = None) -> Quiz:
+    """
+    Возвращает квиз по slug, создавая его, если его нет.
+
+    :param title: Название нового квиза (по умолчанию — slug).
+    :raises ValueError: Недопустимый slug или квиз не удалось создать.
+    """
+    slug = slug.lower()
+    if not SLUG_PATTERN.fullmatch(slug):
+        raise ValueError(messages["admin"]["invalid_quiz_slug"])
+    quiz = storage.get_quiz_by_slug(slug) or storage.add_quiz(slug, title or slug)
+    if quiz is None:
+        raise ValueError(f"Не удалось создать квиз {slug}")
+    return quiz
+
+def import_questions(storage, stream: IO[str], fmt: str, batch_size: int = 500,
+                     dry_run: bool = False, reload: bool = True, quiz_id: int = DEFAULT_QUIZ_ID) -> ImportReport:
+    """
+    Импортирует вопросы из потока.
+
+    :param storage: Хранилище (utils.storage.Storage).
+    :param fmt: jsonl или csv.
+    :param batch_size: Вопросов в одной транзакции.
+    :param dry_run: Только проверить строки, ничего не записывая.
+    :param reload: Пересобрать каталог вопросов после импорта (нужно в процессе бота).
+    :param quiz_id: Квиз, в конец которого встают новые вопросы.
+    :raises ValueError: В заголовке CSV нет обязательных столбцов.
+    """
+    report = ImportReport()
+    seen_ids: Set[int] = set()
+    batch: List[Dict[str, Any]] = []
+    batch_lines: List[int] = []
+
+    def flush():
+        if not batch:
+            return
+        written = storage.upsert_questions(batch, quiz_id)
+        if written:
+            report.written += written
+        else:
+            report.failed += len(batch)
+            for line in batch_lines:
+                report.add_error(line, "ошибка записи в базу (подробности в логе)")
+        batch.clear()
+        batch_lines.clear()
+
+    for line, row in read_rows(stream, fmt):
+        report.rows += 1
+        question = validate_row(row, seen_ids) if isinstance(row, dict) else row
+        if isinstance(question, str):
+            report.failed += 1
+            report.add_error(line, question)
+            continue
+        if dry_run:
+            continue
+        batch.append(question)
+        batch_lines.append(line)
+        if len(batch) >= batch_size:
+            flush()
+    flush()
+
+    if reload and report.written:
+        storage.load_question_catalog()
+    return report
+
+def export_questions(storage, stream: IO[str], fmt: str, page_size: int = 1000) -> int:
+    """
+    Выгружает все вопросы в поток в порядке ID.
+
+    :param fmt: jsonl или csv.
+    :return: Количество выгруженных вопросов.
+    """
+    writer = None
+    if fmt == "csv":
+        writer = csv.DictWriter(stream, fieldnames=FIELDS)
+        writer.writeheader()
+
+    count = 0
+    after_id = 0
+    while True:
+        page = storage.get_questions_page(after_id, page_size)
+        if not page:
+            return count
+        for question in page:
+            if writer is not None:
+                writer.writerow(question)
+            else:
+                stream.write(json.dumps(question, ensure_ascii=False) + "\n")
+        count += len(page)
+        after_id = page[-1]["question_id"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["import", "export"])
+    parser.add_argument("path", help="файл .jsonl или .csv")
+    parser.add_argument("--format", choices=sorted(set(FORMATS.values())), help="формат, если не подходит расширение")
+    parser.add_argument("--batch-size", type=int, default=500, help="вопросов в одной транзакции")
+    parser.add_argument("--dry-run", action="store_true", help="только проверить файл")
+    parser.add_argument("--quiz", help="slug квиза для новых вопросов (создаётся, если его нет)")
+    parser.add_argument("--quiz-title", help="название нового квиза")
+    args = parser.parse_args()
+
+    fmt = args.format or detect_format(args.path)
+    if fmt is None:
+        parser.error("формат не определяется по расширению, укажите --format")
+
+    from utils.storage import get_storage
+
+    storage = get_storage()
+    storage.ensure_schema()
+    try:
+        if args.command == "export":
+            with open(args.path, "w", encoding="utf-8", newline="") as f:
+                count = export_questions(storage, f, fmt)
+            print(f"Выгружено вопросов: {count}")
+            return
+
+        # utf-8-sig: CSV из Excel начинается с BOM
+        with open(args.path, encoding="utf-8-sig", newline="") as f:
+            try:
+                quiz_id = DEFAULT_QUIZ_ID
+                if args.quiz and not args.dry_run:
+                    # Каталог с квизами нужен, чтобы найти существующий квиз по slug
+                    storage.load_question_catalog()
+                    quiz_id = get_or_create_quiz(storage, args.quiz, args.quiz_title).quiz_id
+                report = import_questions(storage, f, fmt, batch_size=args.batch_size,
+                                          dry_run=args.dry_run, reload=False, quiz_id=quiz_id)
+            except ValueError as e:
+                print(e, file=sys.stderr)
+                sys.exit(2)
+        print(report.summary())
+        if not args.dry_run and report.written:
+            print("Запущенный бот увидит изменения после перезапуска.")
+        if report.failed:
+            sys.exit(1)
+    finally:
+        storage.close()
+
+
+if __name__ == "__main__":
+    main()
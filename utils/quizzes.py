@@ -0,0 +1,116 @@
+import re
+import zlib
+from dataclasses import dataclass, field
+from types import MappingProxyType
+from typing import Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+# Квиз, в который попадают все вопросы базы, созданной до появления нескольких квизов,
+# и вопросы, добавленные без указания квиза
+DEFAULT_QUIZ_ID = 1
+DEFAULT_QUIZ_SLUG = "space"
+DEFAULT_QUIZ_TITLE = "Космический квиз"
+
+# Допустимый slug квиза: латиница, цифры, «_» и «-»
+SLUG_PATTERN = re.compile(r"[a-z0-9_-]{1,32}")
+
+
+@dataclass(frozen=True)
+class Quiz:
+    """
+    Квиз: название и вопросы в порядке прохождения.
+    """
+    quiz_id: int
+    slug: str  # Короткое имя для /start_quiz <slug>
+    title: str
+    question_ids: Tuple[int, ...] = ()
+    # ID вопроса -> номер в question_ids, чтобы следующий вопрос находился без поиска
+    positions: Mapping[int, int] = field(default_factory=dict, repr=False, compare=False)
+    # Контрольная сумма списка вопросов: по ней прохождение замечает, что квиз изменился
+    version: int = field(default=0, repr=False, compare=False)
+
+    @property
+    def first_question_id(self) -> Optional[int]:
+        return self.question_ids[0] if self.question_ids else None
+
+    @property
+    def last_question_id(self) -> Optional[int]:
+        return self.question_ids[-1] if self.question_ids else None
+
+    def next_question_id(self, question_id: int) -> Optional[int]:
+        """
+        :return: ID вопроса после указанного, или None, если вопрос последний или не из этого квиза.
+        """
+        index = self.positions.get(question_id)
+        if index is None or index + 1 >= len(self.question_ids):
+            return None
+        return self.question_ids[index + 1]
+
+
+class QuizIndex:
+    """
+    Неизменяемый указатель квизов: квизы по ID и по slug и квиз каждого вопроса.
+
+    Собирается вместе с каталогом вопросов и подменяется целиком, поэтому поиск квиза
+    и следующего вопроса — это обращения к словарям, и их стоимость не зависит
+    от числа квизов и вопросов в других квизах.
+    """
+
+    def __init__(self, quizzes: Iterable[Quiz] = ()):
+        by_id = {quiz.quiz_id: quiz for quiz in quizzes}
+        self.quizzes: Mapping[int, Quiz] = MappingProxyType(by_id)
+        self._ordered = tuple(sorted(by_id.values(), key=lambda quiz: quiz.quiz_id))
+        self._by_slug = {quiz.slug: quiz for quiz in by_id.values()}
+        self._question_quiz = {
+            question_id: quiz for quiz in by_id.values() for question_id in quiz.question_ids
+        }
+
+    def __len__(self) -> int:
+        return len(self.quizzes)
+
+    def all(self) -> Sequence[Quiz]:
+        """
+        :return: Квизы по возрастанию ID.
+        """
+        return self._ordered
+
+    def get(self, quiz_id: int) -> Optional[Quiz]:
+        return self.quizzes.get(quiz_id)
+
+    def by_slug(self, slug: str) -> Optional[Quiz]:
+        return self._by_slug.get(slug.lower())
+
+    def quiz_of(self, question_id: int) -> Optional[Quiz]:
+        """
+        :return: Квиз, в который входит вопрос, или None, если вопрос не входит ни в один квиз.
+        """
+        return self._question_quiz.get(question_id)
+
+    def next_question_id(self, question_id: int) -> Optional[int]:
+        quiz = self.quiz_of(question_id)
+        return quiz.next_question_id(question_id) if quiz is not None else None
+
+
+def quiz_version(question_ids: Sequence[int]) -> int:
+    """
+    :return: Контрольная сумма списка вопросов квиза. Не зависит от процесса, поэтому её можно хранить в сессии.
+    """
+    return zlib.crc32(",".join(map(str, question_ids)).encode())
+
+def build_quiz_index(quiz_rows: Iterable[Tuple[int, str, str]],
+                     order_rows: Iterable[Tuple[int, int]]) -> QuizIndex:
+    """
+    Собирает указатель квизов из строк Quizzes и QuizQuestions.
+
+    :param quiz_rows: Строки (quiz_id, slug, title).
+    :param order_rows: Строки (quiz_id, question_id), упорядоченные по (quiz_id, position).
+        Вопросы, которых нет в каталоге, отбрасываются заранее.
+    """
+    question_ids: Dict[int, List[int]] = {}
+    for quiz_id, question_id in order_rows:
+        question_ids.setdefault(quiz_id, []).append(question_id)
+    quizzes = []
+    for quiz_id, slug, title in quiz_rows:
+        ids = tuple(question_ids.get(quiz_id, ()))
+        quizzes.append(Quiz(quiz_id, slug, title, ids, MappingProxyType({qid: i for i, qid in enumerate(ids)}),
+                            quiz_version(ids)))
+    return QuizIndex(quizzes)
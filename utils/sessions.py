@@ -0,0 +1,253 @@
+import abc
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from utils.storage import get_storage
+
+# Признак удалённой сессии в очереди записи
+_DELETED = object()
+# Запомненный в памяти ответ базы «сессии нет»
+_MISSING = object()
+# Сессии нет в памяти, нужно читать базу
+_UNKNOWN = object()
+
+def quiz_key(user_id: int) -> str:
+    """Ключ сессии квиза пользователя."""
+    return f"quiz:{user_id}"
+
+def admin_key(user_id: int) -> str:
+    """Ключ состояния админ-диалога."""
+    return f"admin:{user_id}"
+
+
+class SessionStore(abc.ABC):
+    """
+    Хранилище сессий пользователей: начатый квиз, состояние админ-диалога и т. п.
+    Значения должны сериализоваться в JSON.
+    """
+
+    @abc.abstractmethod
+    def get(self, key: str, default: Any = None) -> Any:
+        raise NotImplementedError
+
+    async def aget(self, key: str, default: Any = None) -> Any:
+        """
+        То же, что get, для асинхронного режима: обращение к базе не блокирует цикл событий.
+        """
+        return self.get(key, default)
+
+    @abc.abstractmethod
+    def set(self, key: str, value: Any):
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def delete(self, key: str):
+        raise NotImplementedError
+
+    def flush(self):
+        """
+        Сохраняет отложенные изменения.
+        """
+
+    def close(self):
+        """
+        Сохраняет отложенные изменения и освобождает ресурсы.
+        """
+        self.flush()
+
+
+class MemorySessionStore(SessionStore):
+    """
+    Сессии в памяти процесса с вытеснением по времени жизни.
+
+    Записи хранятся в порядке последнего изменения, поэтому просроченные всегда лежат в начале
+    и удаляются за O(1) на каждую запись без полного обхода словаря.
+    """
+
+    def __init__(self, ttl: float = 86400):
+        """
+        :param ttl: Время жизни сессии в секундах с момента последнего изменения.
+        """
+        self.ttl = ttl
+        self._data: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _evict(self, now: float):
+        while self._data:
+            key, (expires_at, _) = next(iter(self._data.items()))
+            if expires_at > now:
+                break
+            del self._data[key]
+
+    def get(self, key: str, default: Any = None) -> Any:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return default
+            if item[0] <= time.time():
+                del self._data[key]
+                return default
+            return item[1]
+
+    def set(self, key: str, value: Any):
+        now = time.time()
+        with self._lock:
+            self._data[key] = (now + self.ttl, value)
+            self._data.move_to_end(key)
+            self._evict(now)
+
+    def delete(self, key: str):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._evict(time.time())
+            return len(self._data)
+
+
+class SqliteSessionStore(MemorySessionStore):
+    """
+    Сессии в памяти с отложенной записью в таблицу Sessions хранилища.
+
+    Чтение идёт из памяти, а при промахе — из базы, поэтому после перезапуска бота
+    активные квизы продолжаются. Ответ «сессии нет» тоже запоминается, чтобы пользователи
+    без сессии не читали базу на каждом обновлении. Изменения копятся и раз в flush_interval
+    секунд записываются в базу одной транзакцией в фоновом потоке.
+    """
+
+    def __init__(self, ttl: float = 86400, flush_interval: float = 1.0):
+        """
+        :param ttl: Время жизни сессии в секундах с момента последнего изменения.
+        :param flush_interval: Период записи изменений в базу в секундах.
+        """
+        super().__init__(ttl)
+        self.flush_interval = flush_interval
+        self._dirty: Dict[str, Any] = {}
+        self._dirty_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._flush_loop, name="session-flush", daemon=True)
+        self._thread.start()
+
+    def get(self, key: str, default: Any = None) -> Any:
+        value = self._cached(key)
+        if value is _UNKNOWN:
+            value = self._load(key)
+        return default if value is _MISSING else value
+
+    async def aget(self, key: str, default: Any = None) -> Any:
+        value = self._cached(key)
+        if value is _UNKNOWN:
+            from utils.async_database import run_db
+
+            value = await run_db(self._load, key)
+        return default if value is _MISSING else value
+
+    def _cached(self, key: str) -> Any:
+        """
+        :return: Значение из памяти, _MISSING, если известно, что сессии нет, или _UNKNOWN.
+        """
+        value = super().get(key, _UNKNOWN)
+        if value is _UNKNOWN:
+            with self._dirty_lock:
+                if self._dirty.get(key) is _DELETED:
+                    return _MISSING
+        return value
+
+    def _load(self, key: str) -> Any:
+        """
+        Читает сессию из базы и запоминает результат в памяти.
+
+        :return: Значение, или _MISSING, если сессии нет.
+        """
+        now = time.time()
+        stored = get_storage().load_session(key, int(now))
+        value = _MISSING if stored is None else json.loads(stored[0])
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None:
+                # Сессия изменилась, пока читали базу
+                return item[1]
+            self._remember(key, value, stored[1] if stored is not None else now + self.ttl, now)
+        return value
+
+    def _remember(self, key: str, value: Any, expires_at: float, now: float):
+        """
+        Кладёт в память значение из базы, сохраняя порядок записей по сроку жизни (см. _evict).
+        Сессия из базы обычно истекает раньше записей, изменённых после запуска: тогда она встаёт
+        в начало и живёт в памяти не дольше первой записи. После этого она снова прочитается из базы.
+        """
+        if self._data and expires_at < next(reversed(self._data.values()))[0]:
+            self._data[key] = (min(expires_at, next(iter(self._data.values()))[0]), value)
+            self._data.move_to_end(key, last=False)
+        else:
+            self._data[key] = (expires_at, value)
+        self._evict(now)
+
+    def set(self, key: str, value: Any):
+        super().set(key, value)
+        with self._dirty_lock:
+            self._dirty[key] = value
+
+    def delete(self, key: str):
+        # Удалённая сессия запоминается как отсутствующая, чтобы не читать её из базы
+        super().set(key, _MISSING)
+        with self._dirty_lock:
+            self._dirty[key] = _DELETED
+
+    def queue_depth(self) -> int:
+        """
+        :return: Количество изменений, ещё не записанных в базу.
+        """
+        with self._dirty_lock:
+            return len(self._dirty)
+
+    def flush(self):
+        with self._flush_lock:
+            with self._dirty_lock:
+                dirty, self._dirty = self._dirty, {}
+            if not dirty:
+                return
+
+            expires_at = int(time.time() + self.ttl)
+            upserts = [(key, json.dumps(value), expires_at) for key, value in dirty.items() if value is not _DELETED]
+            deletes = [key for key, value in dirty.items() if value is _DELETED]
+            if not get_storage().save_sessions(upserts, deletes):
+                # Не удалось записать: возвращаем изменения в очередь, если их не перезаписали
+                with self._dirty_lock:
+                    for key, value in dirty.items():
+                        self._dirty.setdefault(key, value)
+
+    def _flush_loop(self):
+        while not self._stopped.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                logging.exception(f"Ошибка при записи сессий: {e}")
+
+    def close(self):
+        self._stopped.set()
+        self._thread.join()
+        self.flush()
+        get_storage().delete_expired_sessions(int(time.time()))
+
+
+def create_session_store(kind: str, ttl: float, flush_interval: float = 1.0) -> SessionStore:
+    """
+    Создаёт хранилище сессий.
+
+    :param kind: memory (только в памяти) или sqlite (память с записью в базу).
+    :param ttl: Время жизни сессии в секундах.
+    :param flush_interval: Период записи в базу для sqlite.
+    :return: Хранилище сессий.
+    """
+    if kind == "memory":
+        return MemorySessionStore(ttl)
+    if kind == "sqlite":
+        return SqliteSessionStore(ttl, flush_interval)
+    raise ValueError(f"Неизвестный тип хранилища сессий: {kind}")
@@ -0,0 +1,102 @@
+import logging
+import threading
+import time
+from typing import Dict
+
+# Начало запуска: bot.py импортирует этот модуль раньше остальных, поэтому время импорта
+# telebot и utils входит в этап imports. Сам модуль при импорте загружает только стандартную
+# библиотеку, модули бота импортируются в функциях
+_started = time.perf_counter()
+
+# Этапы запуска: имя -> секунды от начала запуска до конца этапа
+phases: Dict[str, float] = {}
+_phases_lock = threading.Lock()
+
+def mark(phase: str) -> float:
+    """
+    Отмечает конец этапа запуска. Повторная отметка того же этапа не меняет время.
+
+    :return: Секунды от начала запуска.
+    """
+    from utils import metrics
+
+    elapsed = time.perf_counter() - _started
+    with _phases_lock:
+        if phase in phases:
+            return phases[phase]
+        phases[phase] = elapsed
+    metrics.register_gauge("bot_startup_seconds", lambda: elapsed, phase=phase)
+    return elapsed
+
+def report():
+    """
+    Пишет в лог время этапов запуска.
+    """
+    from utils.log import log_event
+
+    with _phases_lock:
+        current = dict(phases)
+    summary = ", ".join(f"{phase} {seconds * 1000:.0f} мс" for phase, seconds in current.items())
+    log_event("startup", f"Запуск: {summary}",
+              **{f"{phase}_ms": round(seconds * 1000, 1) for phase, seconds in current.items()})
+
+def watch_first_update(bot):
+    """
+    Отмечает этап first_update, когда бот закончит обрабатывать первое обновление, и пишет отчёт о запуске.
+    Вызывается до UpdateDispatcher.attach, чтобы учитывалась обработка, а не постановка в очередь.
+    """
+    import inspect
+
+    process_new_updates = bot.process_new_updates
+    done = threading.Event()
+
+    def finish():
+        if not done.is_set():
+            done.set()
+            mark("first_update")
+            report()
+
+    if inspect.iscoroutinefunction(process_new_updates):
+        async def watched(updates):
+            try:
+                return await process_new_updates(updates)
+            finally:
+                finish()
+    else:
+        def watched(updates):
+            try:
+                return process_new_updates(updates)
+            finally:
+                finish()
+
+    bot.process_new_updates = watched
+
+def prewarm(storage) -> threading.Thread:
+    """
+    Прогревает кэши в фоновом потоке, пока бот подключается к Telegram.
+
+    Собираются сообщения с вопросами текущего каталога, готовятся копии картинок для отправки
+    (utils.images: недостающие собираются) и читаются их file_id. Первые обновления после запуска
+    обрабатываются уже с тёплыми кэшами. Каталог должен быть загружен (storage.open).
+
+    :return: Поток прогрева.
+    """
+    from utils.images import prepare_image
+    from utils.payloads import prewarm as prewarm_payloads
+
+    def run():
+        try:
+            payloads = prewarm_payloads(storage.get_question_catalog())
+            for image_path in {payload.image_path for payload in payloads.values()}:
+                try:
+                    storage.get_image_file_id(image_path, prepare_image(image_path).content_hash)
+                except OSError as e:
+                    logging.error(f"Не удалось прогреть картинку {image_path}: {e}")
+        except Exception as e:
+            logging.error(f"Ошибка при прогреве кэшей: {e}")
+        finally:
+            mark("prewarm")
+
+    thread = threading.Thread(target=run, name="prewarm", daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,158 @@
+import hmac
+import json
+import logging
+import queue
+import re
+import secrets
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional
+
+# Заголовок, в котором Telegram передаёт secret_token, указанный в setWebhook
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+# Допустимый secret_token setWebhook: 1–256 символов A-Z, a-z, 0-9, «_» и «-»
+SECRET_PATTERN = re.compile(r"[A-Za-z0-9_-]{1,256}")
+
+# Максимальный размер тела запроса с обновлением
+MAX_BODY_SIZE = 1024 * 1024
+
+
+class _HTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128  # Telegram открывает до 100 одновременных соединений
+
+
+class WebhookServer:
+    """
+    HTTP-сервер для приёма обновлений от Telegram.
+
+    Принятые обновления складываются в ограниченную очередь, которую разбирают потоки-обработчики.
+    Если очередь заполнена, сервер недолго ждёт свободного места, а затем отвечает 503,
+    и Telegram повторит доставку позже. Так всплеск обновлений не раздувает память процесса.
+    """
+
+    def __init__(self, on_update: Callable[[Dict[str, Any]], None], host: str = "0.0.0.0", port: int = 8443,
+                 path: str = "/webhook", secret_token: Optional[str] = None, queue_size: int = 1000,
+                 consumers: int = 1, put_timeout: float = 1.0):
+        """
+        :param on_update: Функция, которая получает обновление в виде словаря.
+        :param host: Адрес, на котором слушает сервер.
+        :param port: Порт сервера.
+        :param path: Путь, на который Telegram отправляет обновления.
+        :param secret_token: Секрет для setWebhook. Запросы без него отклоняются. Если не задан,
+            генерируется случайный: его нужно передать в setWebhook (атрибут secret_token).
+        :raises ValueError: Секрет содержит недопустимые символы.
+        :param queue_size: Максимальное количество обновлений в очереди.
+        :param consumers: Количество потоков, разбирающих очередь.
+        :param put_timeout: Сколько секунд ждать места в очереди перед ответом 503.
+        """
+        self.on_update = on_update
+        self.path = path
+        if secret_token is None:
+            # Без секрета любой, кто достучится до порта, мог бы прислать поддельное обновление
+            # (в том числе от имени администратора), поэтому сервер без проверки не запускается
+            secret_token = secrets.token_urlsafe(32)
+            logging.warning("WEBHOOK_SECRET не задан, используется случайный секрет. "
+                            "Если бот запущен на нескольких узлах, задайте общий WEBHOOK_SECRET")
+        elif not SECRET_PATTERN.fullmatch(secret_token):
+            raise ValueError("WEBHOOK_SECRET: от 1 до 256 символов A-Z, a-z, 0-9, «_» и «-»")
+        self.secret_token = secret_token
+        self.put_timeout = put_timeout
+        self.queue: "queue.Queue[Optional[Dict[str, Any]]]" = queue.Queue(maxsize=queue_size)
+        self.consumers = consumers
+        self.accepted = 0
+        self.rejected = 0
+        self._stats_lock = threading.Lock()
+        self._threads: List[threading.Thread] = []
+        self._server = _HTTPServer((host, port), self._make_handler())
+
+    @property
+    def port(self) -> int:
+        return self._server.server_address[1]
+
+    def _make_handler(self):
+        webhook = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                if self.path != webhook.path:
+                    self._reply(404)
+                    return
+                if not hmac.compare_digest(
+                        self.headers.get(SECRET_HEADER, ""), webhook.secret_token):
+                    self._reply(403)
+                    return
+
+                length = int(self.headers.get("Content-Length") or 0)
+                if length <= 0 or length > MAX_BODY_SIZE:
+                    self._reply(413 if length > MAX_BODY_SIZE else 400)
+                    return
+                try:
+                    update = json.loads(self.rfile.read(length))
+                except ValueError:
+                    self._reply(400)
+                    return
+
+                try:
+                    webhook.queue.put(update, timeout=webhook.put_timeout)
+                except queue.Full:
+                    with webhook._stats_lock:
+                        webhook.rejected += 1
+                    self._reply(503)
+                    return
+                with webhook._stats_lock:
+                    webhook.accepted += 1
+                self._reply(200)
+
+            def _reply(self, status: int):
+                self.send_response(status)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def log_message(self, format, *args):
+                logging.debug("webhook: " + format % args)
+
+        return Handler
+
+    def _consume(self):
+        while True:
+            update = self.queue.get()
+            try:
+                if update is None:
+                    return
+                self.on_update(update)
+            except Exception as e:
+                logging.exception(f"Ошибка при обработке обновления из webhook: {e}")
+            finally:
+                self.queue.task_done()
+
+    def queue_depth(self) -> int:
+        """
+        :return: Количество обновлений, ожидающих обработки.
+        """
+        return self.queue.qsize()
+
+    def start(self):
+        """
+        Запускает сервер и потоки-обработчики в фоне.
+        """
+        for i in range(self.consumers):
+            thread = threading.Thread(target=self._consume, name=f"webhook-consumer-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        thread = threading.Thread(target=self._server.serve_forever, name="webhook-server", daemon=True)
+        thread.start()
+        self._threads.append(thread)
+
+    def stop(self):
+        """
+        Перестаёт принимать запросы и дожидается обработки уже принятых обновлений.
+        """
+        self._server.shutdown()
+        self._server.server_close()
+        for _ in range(self.consumers):
+            self.queue.put(None)
+        for thread in self._threads:
+            thread.join()
+        self._threads.clear()
@@ -0,0 +1,135 @@
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, List
+
+# Пакет записей для применения: {ключ (ID пользователя): [операции по порядку]}
+Batch = Dict[Any, List[tuple]]
+
+
+class WriteBehindQueue:
+    """
+    Очередь отложенной записи с групповой фиксацией.
+
+    Операции копятся по ключам (у каждого пользователя свой список в порядке поступления)
+    и применяются одной транзакцией раз в flush_interval секунд или как только
+    их набирается max_rows. Пока пакет записывается, он остаётся виден через pending(),
+    поэтому чтение поверх базы не теряет записи, которые ещё не зафиксированы.
+    """
+
+    def __init__(self, apply: Callable[[Batch], bool], flush_interval: float = 0.05, max_rows: int = 500):
+        """
+        :param apply: Функция, которая записывает пакет одной транзакцией и возвращает True при успехе.
+        :param flush_interval: Максимальная задержка записи в секундах.
+        :param max_rows: Сколько операций копить до внеочередной записи.
+        """
+        self.apply = apply
+        self.flush_interval = flush_interval
+        self.max_rows = max_rows
+        self._queued: Batch = {}
+        self._inflight: Batch = {}
+        self._rows = 0
+        self._lock = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._stopped = False
+        self.flushes = 0
+        self._thread = threading.Thread(target=self._flush_loop, name="progress-flush", daemon=True)
+        self._thread.start()
+
+    def put(self, key: Any, op: tuple):
+        """
+        Добавляет операцию в очередь.
+        """
+        with self._lock:
+            self._queued.setdefault(key, []).append(op)
+            self._rows += 1
+            if self._rows >= self.max_rows:
+                self._lock.notify()
+
+    def pending(self, key: Any) -> List[tuple]:
+        """
+        Операции ключа, которые ещё не зафиксированы в базе (записываемые и ожидающие).
+        Повторное применение уже зафиксированных операций не меняет результат чтения.
+        """
+        with self._lock:
+            return self._inflight.get(key, []) + self._queued.get(key, [])
+
+    def take(self, key: Any) -> List[tuple]:
+        """
+        Забирает ожидающие операции ключа, чтобы вызывающий записал их сам.
+        Сначала дожидается текущей записи, поэтому забранные операции — всё, что не зафиксировано.
+        """
+        with self._flush_lock, self._lock:
+            ops = self._queued.pop(key, [])
+            self._rows -= len(ops)
+            return ops
+
+    def restore(self, key: Any, ops: List[tuple]):
+        """
+        Возвращает забранные операции в начало очереди ключа, если записать их не удалось.
+        """
+        if not ops:
+            return
+        with self._lock:
+            self._queued[key] = ops + self._queued.get(key, [])
+            self._rows += len(ops)
+
+    def queue_depth(self) -> int:
+        """
+        :return: Количество операций, ещё не записанных в базу.
+        """
+        with self._lock:
+            return self._rows
+
+    def flush(self):
+        """
+        Записывает все ожидающие операции одной транзакцией.
+        """
+        with self._flush_lock:
+            with self._lock:
+                batch, self._queued = self._queued, {}
+                self._inflight = batch
+                self._rows = 0
+            if not batch:
+                return
+            ok = False
+            try:
+                ok = self.apply(batch)
+            finally:
+                with self._lock:
+                    self._inflight = {}
+                    if ok:
+                        self.flushes += 1
+                    else:
+                        # Не удалось записать: возвращаем операции перед поступившими позже
+                        for key, ops in batch.items():
+                            self._queued[key] = ops + self._queued.get(key, [])
+                            self._rows += len(ops)
+
+    def _flush_loop(self):
+        while True:
+            with self._lock:
+                deadline = time.monotonic() + self.flush_interval
+                while not self._stopped and self._rows < self.max_rows:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._lock.wait(remaining)
+                if self._stopped:
+                    return
+            try:
+                self.flush()
+            except Exception as e:
+                logging.exception(f"Ошибка при записи прогресса: {e}")
+
+    def close(self):
+        """
+        Останавливает фоновую запись и записывает всё, что осталось в очереди.
+        """
+        with self._lock:
+            self._stopped = True
+            self._lock.notify()
+        self._thread.join()
+        self.flush()
+        if self.queue_depth():
+            logging.error(f"При остановке не удалось записать {self.queue_depth()} операций прогресса")